@@ -1,45 +1,331 @@
+from __future__ import annotations
+
 import base64
 import binascii
+import contextlib
+import contextvars
+import functools
+import io
 import logging
 import os
+import threading
 import time
-from typing import Optional
+from typing import List, Optional, TYPE_CHECKING
 
-from cassis import load_typesystem, load_cas_from_xmi
 from dotenv import load_dotenv
 from fastapi import FastAPI, File, UploadFile, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
 from pydantic import BaseModel
-from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
-from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
 
-from .. import cas_parser
-from ..build_rdf import ROGraph
+from .. import instrumentation, profiling
+from ..instrumentation import DEFAULT_BUCKETS
+
+if TYPE_CHECKING:
+    # cassis, rdflib and the typesystem are only loaded when needed (or in the background), to start up fast.
+    from .. import cas_parser
+    from ..build_rdf import DocSourceCache, ROGraph
+    from ..statistics import DatasetStatistics
+    from ..write_behind import WriteBehindCommitter
 
 app = FastAPI()
 
+REQUEST_SECONDS = Histogram(
+    "ro_api_request_seconds", "Duration of the requests.", ("path", "method", "status"), buckets=DEFAULT_BUCKETS
+)
+STAGE_SECONDS = Histogram(
+    "ro_api_stage_seconds", "Duration of the stages of processing a CAS.", ("path", "stage"), buckets=DEFAULT_BUCKETS
+)
+IN_PROGRESS = Gauge("ro_api_requests_in_progress", "Requests in progress.", ("path",))
+RO_WRITTEN = Counter("ro_api_reporting_obligations_total", "Number of RO's written.")
+TRIPLES_ADDED = Counter("ro_api_triples_added_total", "Number of triples added.")
+TRIPLES_REMOVED = Counter(
+    "ro_api_triples_removed_total", "Number of triples (patterns) removed when re-ingesting a document."
+)
+WRITE_BEHIND_PENDING = Gauge("ro_api_write_behind_pending", "Uploads in the write-behind journal, not yet committed.")
+WRITE_BEHIND_DEAD_LETTERS = Gauge(
+    "ro_api_write_behind_dead_letters", "Uploads of the write-behind journal that could not be committed."
+)
+# Number, size and duration of the SPARQL queries per provider method, see instrumentation.
+QUERY_METRICS = instrumentation.PrometheusQueryMetrics()
+
+# Path of the route that is being processed, to label the stages with.
+_PATH = contextvars.ContextVar("ro_api_path", default="")
+
 ROOT = os.path.join(os.path.dirname(__file__), "../../..")
 
 load_dotenv(os.path.join(ROOT, "secrets/dgfisma.env"))
 
-SECRET_USER = os.environ["FUSEKI_ADMIN_USERNAME"]
-SECRET_PASS = os.environ["FUSEKI_ADMIN_PASSWORD"]
+SECRET_USER = os.environ.get("FUSEKI_ADMIN_USERNAME")
+SECRET_PASS = os.environ.get("FUSEKI_ADMIN_PASSWORD")
+
+# (Optional) derive the URI's of RO's and entities from their content instead of generating them randomly.
+DETERMINISTIC_URI = os.environ.get("RO_DETERMINISTIC_URI", "").lower() in ("1", "true", "yes")
+# (Optional) store every document in its own named graph, see ROGraph.
+NAMED_GRAPHS = os.environ.get("RO_NAMED_GRAPHS", "").lower() in ("1", "true", "yes")
+# (Optional) path to the journal of the write-behind ingestion, see write_behind. Uploads then return before they are
+# committed to Fuseki.
+WRITE_BEHIND_JOURNAL = os.environ.get("RO_WRITE_BEHIND_JOURNAL") or None
+# (Optional) log the SPARQL queries that take longer than this many seconds, see instrumentation.SlowQueryLogger.
+SLOW_QUERY_SECONDS = float(os.environ["RO_SLOW_QUERY_SECONDS"]) if os.environ.get("RO_SLOW_QUERY_SECONDS") else None
+
+if WRITE_BEHIND_JOURNAL is not None and not (DETERMINISTIC_URI or NAMED_GRAPHS):
+    # The updates are built without reading the RDF, so the URI's have to follow from the content.
+    raise RuntimeError("RO_WRITE_BEHIND_JOURNAL requires RO_DETERMINISTIC_URI (or RO_NAMED_GRAPHS).")
+
+# Installed at start-up, see add_query_hooks.
+_QUERY_HOOKS = [QUERY_METRICS]
+if SLOW_QUERY_SECONDS is not None:
+    _QUERY_HOOKS.append(instrumentation.SlowQueryLogger(threshold=SLOW_QUERY_SECONDS))
+
+# Number of endpoints to cache the dataset statistics of, see get_dataset_statistics.
+MAX_STATS_ENDPOINTS = 16
 
 rel_path_typesystem = "dgfisma_rdf/reporting_obligations/output_reporting_obligations/typesystem_tmp.xml"
 path_typesystem = os.path.join(ROOT, rel_path_typesystem)
-with open(path_typesystem, "rb") as f:
-    TYPESYSTEM = load_typesystem(f)
+
+
+def get_typesystem():
+    """
+    The typesystem of the CAS files. Is only loaded the first time, see typesystem.get_typesystem.
+    """
+    from .. import typesystem
+
+    return typesystem.get_typesystem(path_typesystem)
+
+
+def _get_auth():
+    """
+    Credentials of Fuseki. Missing credentials only fail the requests that need them, not the start-up.
+    """
+    if not (SECRET_USER and SECRET_PASS):
+        raise HTTPException(
+            status_code=500, detail="FUSEKI_ADMIN_USERNAME and FUSEKI_ADMIN_PASSWORD are not configured."
+        )
+
+    return SECRET_USER, SECRET_PASS
+
+
+_WRITE_BEHIND = None
+_WRITE_BEHIND_LOCK = threading.Lock()
+
+
+def get_write_behind() -> Optional[WriteBehindCommitter]:
+    """
+    The committer of the write-behind ingestion, None if it is not enabled. Is started the first time, which also
+    commits the updates that were still pending in the journal.
+    """
+    global _WRITE_BEHIND
+
+    if WRITE_BEHIND_JOURNAL is None:
+        return None
+
+    if _WRITE_BEHIND is None:
+        with _WRITE_BEHIND_LOCK:
+            if _WRITE_BEHIND is None:
+                from .. import write_behind
+
+                journal = write_behind.UpdateJournal(WRITE_BEHIND_JOURNAL)
+                WRITE_BEHIND_PENDING.set_function(lambda: len(journal))
+                WRITE_BEHIND_DEAD_LETTERS.set_function(journal.count_dead_letters)
+
+                committer = write_behind.WriteBehindCommitter(journal, auth=_get_auth())
+                committer.start()
+
+                _WRITE_BEHIND = committer
+
+    return _WRITE_BEHIND
+
+
+def _flush_write_behind():
+    """
+    Commit the pending uploads first, e.g. such that removed documents are not added again afterwards.
+    """
+    committer = get_write_behind()
+    if committer is not None:
+        committer.flush_all()
+
+
+def _warm_up():
+    """
+    Import and load everything that is needed to process a CAS, such that the first upload doesn't have to.
+    """
+    try:
+        t0 = time.perf_counter()
+
+        from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore  # noqa: F401
+        from .. import build_rdf, cas_parser  # noqa: F401
+
+        get_typesystem()
+
+        # Commit what was left in the journal.
+        get_write_behind()
+
+        logging.info(f"Warmed up in {time.perf_counter() - t0:.3f} s")
+
+    except Exception as e:
+        logging.warning(f"Could not warm up: {e}")
 
 
 class CasBase64(BaseModel):
     content: str  # Base64 content as string
 
 
+class DocIds(BaseModel):
+    doc_ids: List[str]
+
+
+class MetricsMiddleware:
+    """
+    Measures the duration and the number of requests in progress per route.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        path = _get_route_path(scope["path"])
+        token = _PATH.set(path)
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_PROGRESS.labels(path=path).inc()
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            REQUEST_SECONDS.labels(path=path, method=scope["method"], status=status).observe(time.perf_counter() - t0)
+            IN_PROGRESS.labels(path=path).dec()
+            _PATH.reset(token)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a request when it has the X-RO-Profile header, see profiling. Only added in the profiling REQUEST mode.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            for k, v in scope["headers"]:
+                if k.decode("latin-1").lower() == profiling.HEADER.lower() and v.decode("latin-1") not in ("", "0"):
+                    with profiling.requested():
+                        return await self.app(scope, receive, send)
+
+        return await self.app(scope, receive, send)
+
+
+app.add_middleware(MetricsMiddleware)
+if profiling.MODE == profiling.REQUEST:
+    app.add_middleware(ProfilingMiddleware)
+
+
+def _get_route_path(path: str) -> str:
+    """
+    Only known routes get their own label, to keep the number of metrics bounded.
+    """
+    for route in app.routes:
+        if getattr(route, "path", None) == path:
+            return path
+
+    return "other"
+
+
+@contextlib.contextmanager
+def measure_stage(stage: str):
+    """
+    Time a stage of processing a CAS, see STAGE_SECONDS.
+    """
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.labels(path=_PATH.get(), stage=stage).observe(time.perf_counter() - t0)
+
+
+@app.on_event("startup")
+def warm_up():
+    threading.Thread(target=_warm_up, name="ro_warm_up", daemon=True).start()
+
+
+@app.on_event("shutdown")
+def stop_write_behind():
+    if _WRITE_BEHIND is not None:
+        _WRITE_BEHIND.stop()
+
+
+@app.on_event("startup")
+def add_query_hooks():
+    for hook in _QUERY_HOOKS:
+        instrumentation.add_hook(hook)
+
+
+@app.on_event("shutdown")
+def remove_query_hooks():
+    for hook in _QUERY_HOOKS:
+        instrumentation.remove_hook(hook)
+
+
 @app.get("/")
 async def root():
     return {"message": "DGFisma reporting obligation RDF connector."}
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Metrics in the Prometheus text format.
+
+    Latency per endpoint and per stage of processing a CAS, requests in progress, the number of RO's and triples
+    that were written and the SPARQL queries per provider method.
+    """
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/stats")
+def get_stats(
+        endpoint: str = Header(...),
+):
+    """Statistics of the dataset, for capacity planning: triples per predicate, RO's per document, entities per type
+    and label lengths, see statistics.compute_statistics.
+
+    They are cached for at most an hour. When documents are added or removed through this API, they are computed again
+    at the next request, but at most once a minute. The counts over the whole dataset are computed once a day,
+    see statistics.DatasetStatistics. Clients can't force them to be computed again, such that this stays cheap.
+
+    Args:
+        endpoint: URL to Fuseki endpoint. e.g. 'http://fuseki_RO:3030/RO/query'
+
+    Returns:
+        The statistics, with the generation they were computed for and when.
+    """
+
+    return JSONResponse(content=get_dataset_statistics(endpoint).get())
+
+
+@functools.lru_cache(maxsize=MAX_STATS_ENDPOINTS)
+def get_dataset_statistics(endpoint: str) -> DatasetStatistics:
+    """
+    Cached statistics of the dataset behind a query endpoint, see DatasetStatistics. The endpoint comes from the
+    request, so only the most recently used ones are kept.
+    """
+    from ..build_rdf import UNION_GRAPH
+    from ..rdf_parser import SPARQLGraphWrapper
+    from ..statistics import DatasetStatistics
+
+    return DatasetStatistics(SPARQLGraphWrapper(endpoint, default_graph=str(UNION_GRAPH) if NAMED_GRAPHS else None))
+
+
 @app.post("/ro_cas/upload")
 async def create_file(
         file: UploadFile = File(...),
@@ -61,22 +347,18 @@ async def create_file(
         None
     """
 
+    with measure_stage("upload_read"):
+        content = file.file.read()
+
     response = create_file_shared(
-        file.file,
+        io.BytesIO(content),
         endpoint,
         updateendpoint,
         docid,
+        source_id=_get_source_id(source_url, source_name),
+        source_name=source_name,
     )
 
-    if (source_name is not None) or (source_url is not None):
-        await add_doc_source(
-            docid,
-            source_url=source_url,
-            source_name=source_name,
-            endpoint=endpoint,
-            updateendpoint=updateendpoint,
-        )
-
     return response
 
 
@@ -103,7 +385,8 @@ async def create_file_base64(
     # Get relevant data of reporting obligations out of the CAS:
 
     try:
-        decoded_cas_content = base64.b64decode(cas_base64.content).decode("utf-8")
+        with measure_stage("base64_decode"):
+            decoded_cas_content = base64.b64decode(cas_base64.content).decode("utf-8")
     except binascii.Error:
         logging.info(f"could not decode the 'cas_content' field. Make sure it is in base64 encoding.")
         end = time.time()
@@ -115,15 +398,9 @@ async def create_file_base64(
         endpoint,
         updateendpoint,
         docid,
+        source_id=_get_source_id(source_url, source_name),
+        source_name=source_name,
     )
-    if (source_name is not None) or (source_url is not None):
-        await add_doc_source(
-            docid,
-            source_url=source_url,
-            source_name=source_name,
-            endpoint=endpoint,
-            updateendpoint=updateendpoint,
-        )
 
     return response
 
@@ -143,14 +420,18 @@ async def init_file_base64(
         None
     """
 
+    from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+    from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
+    from ..build_rdf import ROGraph
+
     sparql_update_store = SPARQLUpdateStore(
         queryEndpoint=endpoint,
         update_endpoint=updateendpoint,
-        auth=(SECRET_USER, SECRET_PASS),  # needed
+        auth=_get_auth(),  # needed
         context_aware=False,
     )
 
-    g = ROGraph(sparql_update_store, DATASET_DEFAULT_GRAPH_ID, include_schema=True)
+    g = ROGraph(sparql_update_store, DATASET_DEFAULT_GRAPH_ID, include_schema=True, named_graphs=NAMED_GRAPHS)
 
     g.commit()
 
@@ -165,31 +446,172 @@ async def add_doc_source(
         endpoint: str = Header(...),
         updateendpoint: str = Header(...),
 ):
-    if source_url is None:
-        # Give same name as source name and convert to URI.
-        source_url = source_name
+    source_id = _get_source_id(source_url, source_name)
+    b_known = get_doc_source_cache().is_known(updateendpoint, source_id, source_name)
 
     g = get_sparql_update_graph(endpoint, updateendpoint)
 
-    g.add_doc_source(doc_id=docid, source_id=source_url, source_name=source_name)
+    g.add_doc_source(doc_id=docid, source_id=source_id, source_name=source_name, b_link_only=b_known)
 
     g.commit()
     g.close(False)
 
+    get_doc_source_cache().add(updateendpoint, source_id, source_name)
+
     return JSONResponse(content={"message": "Document source added successfully."})
 
 
+def _get_source_id(source_url: Optional[str], source_name: Optional[str]) -> Optional[str]:
+    """
+    The URL identifies the document source. Without one, the source name is converted to a URI.
+    """
+    return source_url if source_url is not None else source_name
+
+
+@functools.lru_cache(maxsize=None)
+def get_doc_source_cache() -> DocSourceCache:
+    """
+    Document sources that were added by this process, see DocSourceCache.
+    """
+    from ..build_rdf import DocSourceCache
+
+    return DocSourceCache()
+
+
+@app.post("/doc/delete")
+def delete_docs(
+        doc_ids: DocIds,
+        endpoint: str = Header(...),
+        updateendpoint: str = Header(...),
+        batch_size: Optional[int] = Header(None),
+):
+    """Remove documents with their reporting obligations, entities and links to their document sources.
+
+    Args:
+        doc_ids: ID's of the documents.
+        endpoint: URL to Fuseki endpoint. e.g. 'http://fuseki_RO:3030/RO/query'
+        updateendpoint: URL to the Fuseki update endpoint. e.g. 'http://fuseki_RO:3030/RO/update'
+        batch_size: (Optional) number of documents per update.
+
+    Returns:
+        The number of documents that were removed.
+    """
+
+    _flush_write_behind()
+
+    g = get_sparql_update_graph(endpoint, updateendpoint)
+
+    n_doc = _remove_in_batches(
+        lambda progress: g.remove_documents(doc_ids.doc_ids, progress=progress, **_get_batch_size_kwargs(batch_size)),
+        g,
+    )
+
+    get_dataset_statistics(endpoint).invalidate()
+
+    return JSONResponse(content={"message": "Documents removed successfully.", "n_doc": n_doc})
+
+
+@app.post("/doc_source/purge")
+def purge_doc_source(
+        source_name: Optional[str] = Header(None),
+        source_url: Optional[str] = Header(None),
+        endpoint: str = Header(...),
+        updateendpoint: str = Header(...),
+        batch_size: Optional[int] = Header(None),
+):
+    """Remove all documents of a document source, and the document source itself.
+
+    The documents are removed in batches that are committed one by one. When it fails (or times out) half-way,
+    it can be called again to remove the remaining documents.
+
+    Args:
+        source_name: name of the document source, see /doc_source/add.
+        source_url: (Optional) URL of the document source, is used instead of the name when provided.
+        endpoint: URL to Fuseki endpoint. e.g. 'http://fuseki_RO:3030/RO/query'
+        updateendpoint: URL to the Fuseki update endpoint. e.g. 'http://fuseki_RO:3030/RO/update'
+        batch_size: (Optional) number of documents per update.
+
+    Returns:
+        The number of documents that were removed.
+    """
+
+    source_id = source_url if source_url is not None else source_name
+    if source_id is None:
+        raise HTTPException(status_code=400, detail="Provide the source_url or source_name header.")
+
+    _flush_write_behind()
+
+    g = get_sparql_update_graph(endpoint, updateendpoint)
+
+    n_doc = _remove_in_batches(
+        lambda progress: g.purge_doc_source(source_id, progress=progress, **_get_batch_size_kwargs(batch_size)),
+        g,
+    )
+
+    get_doc_source_cache().discard(updateendpoint, source_id)
+    get_dataset_statistics(endpoint).invalidate()
+
+    return JSONResponse(content={"message": "Document source purged successfully.", "n_doc": n_doc})
+
+
+def _get_batch_size_kwargs(batch_size: Optional[int]) -> dict:
+    if batch_size is None:
+        return {}
+
+    if batch_size < 1:
+        raise HTTPException(status_code=400, detail="batch_size should be positive.")
+
+    return {"batch_size": batch_size}
+
+
+def _remove_in_batches(remove, g: ROGraph) -> int:
+    """Run a removal that commits in batches, see ROGraph.remove_documents.
+
+    When it fails, the batches that were already committed stay removed. This is reported, such that it can be resumed.
+    """
+    n_removed = 0
+
+    def progress(n):
+        nonlocal n_removed
+        n_removed = n
+
+    try:
+        return remove(progress)
+
+    except HTTPException:
+        raise
+
+    except Exception as e:
+        g.rollback()
+
+        raise HTTPException(
+            status_code=500,
+            detail=f"Unable to remove the documents, after removing {n_removed} documents. Call again to resume.\n{e}",
+        )
+
+    finally:
+        g.close(False)
+
+
+@profiling.profiled
 def create_file_shared(
         decoded_cas_content,
         endpoint,
         update_endpoint,
         doc_id,
+        source_id: Optional[str] = None,
+        source_name: Optional[str] = None,
 ):
+    from cassis import load_cas_from_xmi
+    from .. import cas_parser
+
     # Get relevant data of reporting obligations out of the CAS:
-    cas = load_cas_from_xmi(decoded_cas_content, typesystem=TYPESYSTEM)
+    with measure_stage("xmi_load"):
+        cas = load_cas_from_xmi(decoded_cas_content, typesystem=get_typesystem())
 
     try:
-        cas_content = cas_parser.CasContent.from_cassis_cas(cas)
+        with measure_stage("cas_content"):
+            cas_content = cas_parser.CasContent.from_cassis_cas(cas)
     except ValueError as e:
         raise HTTPException(status_code=406, detail=f"CAS does contain expected annotations:\n{e}")
     except Exception as e:
@@ -200,6 +622,8 @@ def create_file_shared(
         endpoint,
         update_endpoint,
         doc_id,
+        source_id=source_id,
+        source_name=source_name,
     )
 
 
@@ -208,38 +632,120 @@ def update_rdf_from_cas_content(
         query_endpoint: str,
         update_endpoint: str,
         doc_id: str,
+        source_id: Optional[str] = None,
+        source_name: Optional[str] = None,
 ) -> cas_parser.CasContent:
-    g = get_sparql_update_graph(query_endpoint, update_endpoint)
+    """Add the cas content to the RDF, together with the document source (if provided) within a single commit.
 
-    try:
+    Document sources that are already known (see get_doc_source_cache) only get the link to the document.
+    """
+    doc_source_cache = get_doc_source_cache()
+    b_source_known = source_id is not None and doc_source_cache.is_known(update_endpoint, source_id, source_name)
 
-        g.add_cas_content(cas_content, doc_id, query_endpoint=query_endpoint)
+    committer = get_write_behind()
+    if committer is not None:
+        _enqueue_cas_content(
+            committer, cas_content, update_endpoint, doc_id, source_id, source_name, b_source_link_only=b_source_known
+        )
 
-    except Exception as e:
+    else:
+        g = get_sparql_update_graph(query_endpoint, update_endpoint)
 
-        g.rollback()
+        try:
+
+            g.add_cas_content(cas_content, doc_id, query_endpoint=query_endpoint)
+
+            if source_id is not None:
+                g.add_doc_source(doc_id, source_id, source_name, b_link_only=b_source_known)
 
+        except Exception as e:
+
+            g.rollback()
+
+            raise HTTPException(status_code=406, detail=f"Unable to add content to RDF.\n{e}")
+
+        else:
+            # Push all updates to fuseki
+            with measure_stage("commit"):
+                g.commit()
+
+            _record_ingestion_stats(g.ingestion_stats)
+
+        g.close(False)  # commit_pending_transaction flag shouldn't matter, but just to be safe
+
+    if source_id is not None:
+        doc_source_cache.add(update_endpoint, source_id, source_name)
+
+    get_dataset_statistics(query_endpoint).invalidate()
+
+    return cas_content
+
+
+def _enqueue_cas_content(
+        committer: WriteBehindCommitter,
+        cas_content: cas_parser.CasContent,
+        update_endpoint: str,
+        doc_id: str,
+        source_id: Optional[str] = None,
+        source_name: Optional[str] = None,
+        b_source_link_only: bool = False,
+) -> cas_parser.CasContent:
+    """
+    Write-behind: the update is built (with deterministic URI's) and saved to the journal, it is committed later on.
+    """
+    from .. import write_behind
+
+    try:
+        q, stats = write_behind.build_update(
+            cas_content,
+            doc_id,
+            update_endpoint,
+            named_graphs=NAMED_GRAPHS,
+            source_id=source_id,
+            source_name=source_name,
+            b_source_link_only=b_source_link_only,
+        )
+    except Exception as e:
         raise HTTPException(status_code=406, detail=f"Unable to add content to RDF.\n{e}")
 
-    else:
-        # Push all updates to fuseki
-        g.commit()
+    if q is not None:
+        with measure_stage("journal"):
+            committer.enqueue(update_endpoint, doc_id, q)
 
-    g.close(False)  # commit_pending_transaction flag shouldn't matter, but just to be safe
+    _record_ingestion_stats(stats)
 
     return cas_content
 
 
-def get_sparql_update_graph(query_endpoint, update_endpoint):
+def _record_ingestion_stats(stats: dict):
+    if stats:
+        STAGE_SECONDS.labels(path=_PATH.get(), stage="reconcile").observe(stats["t_reconcile"])
+        STAGE_SECONDS.labels(path=_PATH.get(), stage="build").observe(stats["t_build"])
+        RO_WRITTEN.inc(stats["n_ro"])
+        TRIPLES_ADDED.inc(stats["n_triples_added"])
+        TRIPLES_REMOVED.inc(stats["n_triples_removed"])
+
+
+def get_sparql_update_graph(query_endpoint, update_endpoint) -> ROGraph:
+    from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+    from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
+    from ..build_rdf import ROGraph
+
     # Context-aware has to be set to false to allow querying from the Graph object
     sparql_update_store = SPARQLUpdateStore(
         queryEndpoint=query_endpoint,
         update_endpoint=update_endpoint,
-        auth=(SECRET_USER, SECRET_PASS),  # needed
+        auth=_get_auth(),  # needed
         context_aware=False,
         autocommit=False,
     )
 
-    g = ROGraph(sparql_update_store, DATASET_DEFAULT_GRAPH_ID, include_schema=False)
+    g = ROGraph(
+        sparql_update_store,
+        DATASET_DEFAULT_GRAPH_ID,
+        include_schema=False,
+        deterministic_uri=DETERMINISTIC_URI,
+        named_graphs=NAMED_GRAPHS,
+    )
 
     return g
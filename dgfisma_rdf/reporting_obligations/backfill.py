@@ -0,0 +1,118 @@
+"""
+Backfill of data that is added at ingestion, for the reporting obligations that were ingested before it existed.
+
+Currently:
+    * sort keys of the entities, see build_rdf.get_sort_key
+    * statistics of the document sources, see ROGraph.rebuild_source_stats. Also after a bulk load.
+
+Usage:
+    python -m dgfisma_rdf.reporting_obligations.backfill <query_endpoint> <update_endpoint> [--batch-size 10000]
+    python -m dgfisma_rdf.reporting_obligations.backfill <query_endpoint> <update_endpoint> --source-stats
+
+The Fuseki credentials are read from FUSEKI_ADMIN_USERNAME and FUSEKI_ADMIN_PASSWORD (or secrets/dgfisma.env).
+"""
+import argparse
+import logging
+import os
+import time
+
+from dotenv import load_dotenv
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
+
+from .build_rdf import ROGraph
+
+ROOT = os.path.join(os.path.dirname(__file__), "../..")
+
+
+def backfill_sort_keys(query_endpoint: str, update_endpoint: str, auth=None, batch_size: int = 10000) -> int:
+    """Add the sort key to all entities in the RDF that don't have one yet.
+
+    Can be run while the API is in use and can be interrupted: the batches are committed one by one.
+
+    Args:
+        query_endpoint: URL to Fuseki endpoint. e.g. 'http://fuseki_RO:3030/RO/query'
+        update_endpoint: URL to the Fuseki update endpoint. e.g. 'http://fuseki_RO:3030/RO/update'
+        auth: (Optional) (username, password)
+        batch_size: number of entities per update.
+
+    Returns:
+        Number of entities that got a sort key.
+    """
+
+    sparql_update_store = SPARQLUpdateStore(
+        queryEndpoint=query_endpoint,
+        update_endpoint=update_endpoint,
+        auth=auth,
+        context_aware=False,
+        autocommit=False,
+    )
+
+    g = ROGraph(sparql_update_store, DATASET_DEFAULT_GRAPH_ID)
+
+    try:
+        n = g.add_sort_keys(batch_size=batch_size)
+    finally:
+        g.close(False)
+
+    return n
+
+
+def backfill_source_stats(query_endpoint: str, update_endpoint: str, auth=None, named_graphs: bool = False) -> None:
+    """(Re)compute the number of documents and reporting obligations of every document source.
+
+    Args:
+        query_endpoint: URL to Fuseki endpoint. e.g. 'http://fuseki_RO:3030/RO/query'
+        update_endpoint: URL to the Fuseki update endpoint. e.g. 'http://fuseki_RO:3030/RO/update'
+        auth: (Optional) (username, password)
+        named_graphs: (Optional) the RDF uses the named graph per document layout.
+
+    Returns:
+        None
+    """
+
+    sparql_update_store = SPARQLUpdateStore(
+        queryEndpoint=query_endpoint,
+        update_endpoint=update_endpoint,
+        auth=auth,
+        context_aware=False,
+        autocommit=False,
+    )
+
+    g = ROGraph(sparql_update_store, DATASET_DEFAULT_GRAPH_ID, named_graphs=named_graphs)
+
+    try:
+        g.rebuild_source_stats()
+    finally:
+        g.close(False)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Backfill the sort keys or the document source statistics of the RDF.")
+    parser.add_argument("query_endpoint", help="URL to the Fuseki query endpoint.")
+    parser.add_argument("update_endpoint", help="URL to the Fuseki update endpoint.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="Number of entities per update.")
+    parser.add_argument("--source-stats", action="store_true", help="Rebuild the document source statistics instead.")
+    parser.add_argument("--named-graphs", action="store_true", help="The RDF has a named graph per document.")
+
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    load_dotenv(os.path.join(ROOT, "secrets/dgfisma.env"))
+    auth = (os.environ["FUSEKI_ADMIN_USERNAME"], os.environ["FUSEKI_ADMIN_PASSWORD"])
+
+    t0 = time.time()
+
+    if args.source_stats:
+        backfill_source_stats(args.query_endpoint, args.update_endpoint, auth=auth, named_graphs=args.named_graphs)
+        print(f"Rebuilt the document source statistics in {time.time() - t0:.1f} s")
+        return
+
+    n = backfill_sort_keys(args.query_endpoint, args.update_endpoint, auth=auth, batch_size=args.batch_size)
+
+    print(f"Added the sort key to {n} entities in {time.time() - t0:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,19 @@
-from SPARQLWrapper import SPARQLWrapper, JSON, GET
-from rdflib import BNode, Namespace, Graph
-from rdflib.namespace import SKOS, RDF, RDFS, OWL, DC
+import collections
+import hashlib
+import logging
+import re
+import threading
+import time
+from typing import Callable, List, TextIO
+
+import rdflib.plugins.serializers.nt  # noqa: F401 Registers the "_rdflib_nt_escape" error handler.
+from rdflib import BNode, ConjunctiveGraph, Namespace, Graph
+from rdflib.namespace import SKOS, RDF, RDFS, OWL, DC, XSD
+from rdflib.plugins.stores.sparqlstore import SPARQLStore
 from rdflib.term import _serial_number_generator, _is_valid_uri, URIRef, Literal
 
-from .cas_parser import CasContent, KEY_CHILDREN, KEY_SENTENCE_FRAG_CLASS, KEY_VALUE
+from . import profiling
+from .cas_parser import CasContent, CompactCasContent, KEY_CHILDREN, KEY_SENTENCE_FRAG_CLASS, KEY_VALUE
 from ..shared.rdf_dgfisma import NS_BASE
 
 RO_BASE = Namespace(NS_BASE + "reporting_obligations/")
@@ -38,6 +48,32 @@ D_ENTITIES = {
 }
 
 PROP_HAS_ENTITY = RO_BASE.hasEntity
+# Normalised label of an entity, to sort the entities without having to compute it at query time. See get_sort_key.
+PROP_SORT_KEY = RO_BASE.sortKey
+
+# Same as the normalisation that used to be done within the SPARQL queries:
+# REPLACE(REPLACE(LCASE(?label), '[^a-zA-Z\s]+', ''), '^[ \t]+|[ \t]+$', '')
+RE_SORT_KEY_SPECIAL = re.compile(r"[^a-zA-Z\s]+", re.ASCII)
+RE_SORT_KEY_STRIP = re.compile(r"^[ \t]+|[ \t]+$")
+
+# Statistics of a document source: the number of its documents with RO's and the number of RO's of those documents.
+# Are kept up to date at ingestion and removal, see info_doc_source of the provider and ROGraph.rebuild_source_stats.
+PROP_N_DOC = RO_BASE.numberOfDocuments
+PROP_N_RO = RO_BASE.numberOfReportingObligations
+# Number of RO's of a document, stored next to its links to document sources. The changes to the statistics of its
+# sources are computed from it, such that the RO's themselves never have to be counted.
+PROP_N_RO_DOC = RO_BASE.numberOfReportingObligationsOfDocument
+
+# Maximum number of RO's to remove within a single SPARQL update.
+REMOVE_BATCH_SIZE = 500
+# Maximum number of documents to remove within a single SPARQL update.
+REMOVE_DOC_BATCH_SIZE = 50
+
+# Named graphs of the ontology and of the document sources, when every document has its own named graph. See ROGraph.
+GRAPH_SCHEMA = RO_BASE["graph/schema"]
+GRAPH_DOC_SOURCES = RO_BASE["graph/doc_sources"]
+# Jena (Fuseki/TDB) name of the union of all named graphs, to use as default graph when querying named graphs.
+UNION_GRAPH = URIRef("urn:x-arq:UnionGraph")
 
 
 class ROGraph(Graph):
@@ -55,17 +91,31 @@ class ROGraph(Graph):
     prop_has_rep_obl = RO_BASE.hasReportingObligation
     prop_has_doc_src = RO_BASE.hasDocumentSource
 
-    def __init__(self, *args, include_schema=False, **kwargs):
+    def __init__(self, *args, include_schema=False, deterministic_uri=False, named_graphs=False, **kwargs):
         """Looks quite clean if implemented with RDFLib https://github.com/RDFLib/rdflib
         Ontology can be visualised with http://www.visualdataweb.de/webvowl/
 
         Args:
             *args:
+            include_schema: (Optional) add the ontology.
+            deterministic_uri: (Optional) when True, the URI's of RO's and entities are derived from their content
+                instead of being randomly generated. Ingesting the same content twice gives the same URI's.
+            named_graphs: (Optional) when True, every catalogue document is stored in its own named graph (named after
+                the document URI), the ontology in GRAPH_SCHEMA and the document sources in GRAPH_DOC_SOURCES.
+                (Re-)ingesting a document replaces its graph (DROP GRAPH + INSERT DATA), which doesn't depend on the
+                size of the RDF. Queries should use the union of the named graphs as default graph, see UNION_GRAPH.
+                URI's are always deterministic in this layout.
             **kwargs:
         """
 
         super(ROGraph, self).__init__(*args, **kwargs)
 
+        self.named_graphs = named_graphs
+        self.deterministic_uri = deterministic_uri or named_graphs
+
+        # Statistics of the last add_cas_content, see _set_ingestion_stats
+        self.ingestion_stats = {}
+
         self.bind("rdf", RDF)
         self.bind("rdfs", RDFS)
         self.bind("skos", SKOS)
@@ -75,7 +125,10 @@ class ROGraph(Graph):
         self.bind("dc", DC)
 
         if include_schema:
-            self._init_schema()
+            if named_graphs:
+                self._replace_graph(GRAPH_SCHEMA, ROGraph(include_schema=True))
+            else:
+                self._init_schema()
 
     def _init_schema(self):
 
@@ -99,6 +152,11 @@ class ROGraph(Graph):
         self._add_property(RDF.value, self.class_doc_src, RDFS.Literal)
 
         self._add_property(PROP_HAS_ENTITY, self.class_rep_obl, SKOS.Concept)
+        self._add_property(PROP_SORT_KEY, SKOS.Concept, RDFS.Literal)
+
+        self._add_property(PROP_N_DOC, self.class_doc_src, XSD.integer)
+        self._add_property(PROP_N_RO, self.class_doc_src, XSD.integer)
+        self._add_property(PROP_N_RO_DOC, self.class_cat_doc, XSD.integer)
 
         for prop, cls in D_ENTITIES.values():
             self._add_property(prop, self.class_rep_obl, cls)
@@ -111,6 +169,7 @@ class ROGraph(Graph):
         self.add((cls, RDF.type, RDFS.Class))
         self.add((cls, RDF.type, OWL.Class))
 
+    @profiling.profiled
     def add_cas_content(self, cas_content: CasContent, doc_id: str, query_endpoint=None):
         """Build the RDF from cas content.
 
@@ -118,99 +177,602 @@ class ROGraph(Graph):
             cas_content:
             doc_id:
             query_endpoint: (Optional) is used to check if RO already exist. If so, the ID is re-used.
-                If an endpoint is provided, all previous RO's will be removed!
+                If an endpoint is provided, the document is reconciled with what is already in the RDF:
+                all previous RO's that are not in the cas content will be removed! See update_cas_content.
 
         Returns:
 
         """
 
-        # Only add (and remove) triples at the end to enable auto-commit/transactions to work.
-        l_add = []
-        l_remove = []
-
-        if query_endpoint:
-            ro_update = ROUpdate(query_endpoint)
+        if query_endpoint or self.named_graphs:
+            return self.update_cas_content(cas_content, doc_id)
 
         # add a document
         cat_doc = self._get_cat_doc_uri(doc_id)
 
         cas_content["id"] = cat_doc.toPython()  # adding ID to cas
 
-        # iterate over reporting obligations (RO's)
-        list_ro = cas_content[KEY_CHILDREN]
-
-        if len(list_ro) == 0:  # No reporting obligations, no need to add to fuseki
+        if len(cas_content[KEY_CHILDREN]) == 0:  # No reporting obligations, no need to add to fuseki
+            self._set_ingestion_stats(cas_content)
             return
 
-        l_add.append((cat_doc, RDF.type, self.class_cat_doc))
+        t0 = time.perf_counter()
 
-        for i, ro_i in enumerate(list_ro):
+        # Only add triples at the end to enable auto-commit/transactions to work.
+        l_add = self._get_triples_cas_content(cas_content, cat_doc)
 
-            value_i = ro_i[KEY_VALUE]
+        self._update_dataset(self._get_q_update_source_stats_doc(cat_doc, len(cas_content[KEY_CHILDREN]), b_add=True))
+
+        for triple in l_add:
+            self.add(triple)
+
+        self._set_ingestion_stats(cas_content, l_add, t_build=time.perf_counter() - t0)
+
+        return cas_content
+
+    def write_compact_cas_content(
+            self, cas_content: CompactCasContent, doc_id: str, f: TextIO, graph_name: URIRef = None
+    ) -> int:
+        """Write the N-Triples (or N-Quads) of compact cas content directly, without adding it to the graph.
+
+        Gives the same lines as add_cas_content followed by serialize(format="nt"), without the intermediate
+        Literal's, triples and graph. Every value is only sliced once from the text, when it is written.
+
+        Args:
+            cas_content: see cas_parser.CompactCasContent.
+            doc_id:
+            f: output buffer, e.g. an open file or io.StringIO.
+            graph_name: (Optional) write N-Quads in this named graph.
+
+        Returns:
+            number of lines written. Lines are not deduplicated.
+        """
+
+        if len(cas_content) == 0:  # No reporting obligations, nothing to write
+            return 0
+
+        cat_doc = self._get_cat_doc_uri(doc_id)
+
+        end = f" {graph_name.n3()} .\n" if graph_name is not None else " .\n"
+
+        s_cat_doc = cat_doc.n3()
+        s_type = RDF.type.n3()
+        s_has_rep_obl = self.prop_has_rep_obl.n3()
+        s_class_rep_obl = self.class_rep_obl.n3()
+        s_value = RDF.value.n3()
+        s_pref_label = SKOS.prefLabel.n3()
+        s_sort_key = PROP_SORT_KEY.n3()
+
+        d_class_n3 = {}
+        for class_ in cas_content.classes:
+            pred, cls = self._get_pred_cls(class_)
+            d_class_n3[class_] = (pred.n3(), cls.n3())
 
-            if query_endpoint:
-                l_ro_uri = ro_update.get_l_ro(value_i, doc_uri=cat_doc)
+        def write(line):
+            f.write(line if line.isascii() else line.encode("ascii", "_rdflib_nt_escape").decode("ascii"))
 
-                if len(l_ro_uri):  # At least one RO's found, keep 1 and remove the rest
-                    rep_obl_i = URIRef(l_ro_uri[0])
-                else:  # RO not found, just make a new one
-                    rep_obl_i = get_UID_node(info="rep_obl_")
+        write(f"{s_cat_doc} {s_type} {self.class_cat_doc.n3()}{end}")
+        n_lines = 1
 
-                for i_ro_uri, ro_uri_i in enumerate(l_ro_uri):
-                    l_remove.extend(
-                        self._get_triples_remove_reporting_obligation(
-                            ro_uri_i,
-                            keep_value=i_ro_uri == 0,
-                        )
-                    )
+        d_value_count = {}
 
+        for i in range(len(cas_content)):
+
+            value_i = cas_content.get_ro_value(i)
+
+            rep_obl_i = self._get_ro_uri(cat_doc, value_i, d_value_count)
+            s_ro = rep_obl_i.n3()
+
+            write(f"{s_ro} {s_type} {s_class_rep_obl}{end}")
+            write(f"{s_cat_doc} {s_has_rep_obl} {s_ro}{end}")
+            write(f"{s_ro} {s_value} {_quote_nt(value_i)}{end}")
+            n_lines += 3
+
+            d_ent_count = {}
+
+            for value_j, class_j in cas_content.iter_fragments(i):
+
+                concept_j = self._get_entity_uri(rep_obl_i, class_j, value_j, d_ent_count)
+                s_pred, s_cls = d_class_n3[class_j]
+                s_concept = concept_j.n3()
+
+                write(f"{s_concept} {s_type} {s_cls}{end}")
+                write(f"{s_concept} {s_pref_label} {_quote_nt(value_j)}@en{end}")
+                write(f"{s_concept} {s_sort_key} {_quote_nt(get_sort_key(value_j))}{end}")
+                write(f"{s_ro} {s_pred} {s_concept}{end}")
+                n_lines += 4
+
+        return n_lines
+
+    def update_cas_content(self, cas_content: CasContent, doc_id: str):
+        """Update the RDF of an already ingested document with new cas content.
+
+        The current content of the document is retrieved with a single query and compared with the cas content.
+        Only the triples that actually changed are removed and added:
+        * RO's are matched on their string representation, entities on their (predicate, label).
+        * Matched RO's and entities keep their URI.
+        * RO's and entities that are no longer in the cas content are removed.
+
+        With deterministic URI's, the URI's are computed locally and nothing has to be read first.
+        Everything that is no longer in the cas content is removed server side and all triples are (re-)added.
+
+        With named graphs, the graph of the document is dropped and replaced by the triples of the cas content.
+
+        Cas content without RO's removes all RO's of the document, together with the document itself. Its links to
+        document sources are kept.
+
+        Args:
+            cas_content:
+            doc_id:
+
+        Returns:
+            cas content with the (re-used) ID's added.
+        """
+
+        cat_doc = self._get_cat_doc_uri(doc_id)
+
+        cas_content["id"] = cat_doc.toPython()  # adding ID to cas
+
+        if len(cas_content[KEY_CHILDREN]) == 0:  # No reporting obligations (anymore), remove the previous ones
+            t0 = time.perf_counter()
+
+            self._update_dataset(self._get_q_update_source_stats_doc(cat_doc, 0))
+            if self.named_graphs:
+                self._replace_graph(cat_doc, [])
             else:
-                rep_obl_i = get_UID_node(info="rep_obl_")
+                self.update(self._get_q_remove_doc_content(cat_doc))
 
-            l_add.append((rep_obl_i, RDF.type, self.class_rep_obl))
-            # link to catalog document + ontology
-            l_add.append((cat_doc, self.prop_has_rep_obl, rep_obl_i))
-            # add whole reporting obligation
-            l_add.append((rep_obl_i, RDF.value, Literal(value_i)))
-            cas_content[KEY_CHILDREN][i]["id"] = rep_obl_i.toPython()  # adding ID to cas
+            self._set_ingestion_stats(cas_content, t_reconcile=time.perf_counter() - t0)
+            return
 
-            # iterate over different entities of RO
-            for j, ent_j in enumerate(ro_i[KEY_CHILDREN]):
+        t0 = time.perf_counter()
 
-                concept_j = get_UID_node(info="entity_")
+        if self.named_graphs:
+            l_add = self._get_triples_cas_content(cas_content, cat_doc)
 
-                t_pred_cls = D_ENTITIES.get(ent_j[KEY_SENTENCE_FRAG_CLASS])
-                if t_pred_cls is None:
-                    # Unknown property/entity class
-                    # TODO how to handle unknown entities?
+            t1 = time.perf_counter()
+            self._update_dataset(self._get_q_update_source_stats_doc(cat_doc, len(cas_content[KEY_CHILDREN])))
+            self._replace_graph(cat_doc, l_add)
 
-                    print(f"Unknown sentence entity class: {ent_j[KEY_SENTENCE_FRAG_CLASS]}")
+            self._set_ingestion_stats(cas_content, l_add, t_build=(t1 - t0) + (time.perf_counter() - t1))
 
-                    pred_i = PROP_HAS_ENTITY
-                    cls = SKOS.Concept
+            return cas_content
 
-                else:
-                    pred_i, cls = t_pred_cls
+        if self.deterministic_uri:
+            l_add = self._get_triples_cas_content(cas_content, cat_doc)
 
-                # type definition
-                l_add.append((concept_j, RDF.type, cls))
-                # Add the string representation
-                value_j = Literal(ent_j[KEY_VALUE], lang="en")
-                l_add.append((concept_j, SKOS.prefLabel, value_j))
+            t1 = time.perf_counter()
+            self.update(self._get_q_update_source_stats_doc(cat_doc, len(cas_content[KEY_CHILDREN])))
+            self.update(self._get_q_remove_outdated(cat_doc, cas_content))
+            t2 = time.perf_counter()
 
-                # connect entity with RO
-                l_add.append((rep_obl_i, pred_i, concept_j))
+            for triple in l_add:
+                self.add(triple)
 
-                cas_content[KEY_CHILDREN][i][KEY_CHILDREN][j]["id"] = concept_j.toPython()  # adding ID to cas
+            self._set_ingestion_stats(
+                cas_content, l_add, t_reconcile=t2 - t1, t_build=(t1 - t0) + (time.perf_counter() - t2)
+            )
+
+            return cas_content
+
+        l_add, l_remove = self._get_triples_update_cas_content(cas_content, cat_doc)
+
+        t1 = time.perf_counter()
+
+        self.update(self._get_q_update_source_stats_doc(cat_doc, len(cas_content[KEY_CHILDREN])))
 
+        # Only add (and remove) triples at the end to enable auto-commit/transactions to work.
         for triple in l_remove:
             self.remove(triple)
 
         for triple in l_add:
             self.add(triple)
 
+        self._set_ingestion_stats(cas_content, l_add, l_remove, t_reconcile=t1 - t0, t_build=time.perf_counter() - t1)
+
         return cas_content
 
+    def _set_ingestion_stats(self, cas_content, l_add=(), l_remove=(), t_reconcile=0.0, t_build=0.0):
+        """
+        Statistics of the last ingested cas content:
+        number of RO's, triples added and triples (patterns) removed,
+        time to reconcile with the RDF and to build the triples (in seconds).
+        Adding and removing within a transaction only queues the update, the commit itself is not included.
+        """
+        self.ingestion_stats = {
+            "n_ro": len(cas_content[KEY_CHILDREN]),
+            "n_triples_added": len(l_add),
+            "n_triples_removed": len(l_remove),
+            "t_reconcile": t_reconcile,
+            "t_build": t_build,
+        }
+
+    def _replace_graph(self, graph_name: URIRef, triples) -> None:
+        """Replace the content of a named graph, within a single SPARQL update.
+
+        Args:
+            graph_name: URI of the named graph.
+            triples: the new content.
+
+        Returns:
+            None
+        """
+
+        if isinstance(self.store, SPARQLStore):
+            self.update(f"DROP SILENT GRAPH {graph_name.n3()} ;\n{self._get_q_insert_data(triples, graph_name)}")
+        else:
+            Graph(self.store, identifier=graph_name).remove((None, None, None))
+            self._insert_data(triples, graph_name)
+
+    def _insert_data(self, triples, graph_name: URIRef) -> None:
+        """Add triples to a named graph.
+
+        Args:
+            triples:
+            graph_name: URI of the named graph.
+
+        Returns:
+            None
+        """
+
+        if isinstance(self.store, SPARQLStore):
+            self.update(self._get_q_insert_data(triples, graph_name))
+        else:
+            # rdflib can't parse large INSERT DATA updates, so the triples are added to the store directly.
+            graph = Graph(self.store, identifier=graph_name)
+            for triple in triples:
+                graph.add(triple)
+
+    @staticmethod
+    def _get_q_insert_data(triples, graph_name: URIRef) -> str:
+        lines = "\n".join(f"{s.n3()} {p.n3()} {o.n3()} ." for s, p, o in triples)
+
+        return f"INSERT DATA {{ GRAPH {graph_name.n3()} {{\n{lines}\n}} }}"
+
+    def _update_dataset(self, q: str) -> None:
+        """
+        SPARQL update that can use named graphs. A SPARQL store sends it as is (within the transaction),
+        for a local store with named graphs it is evaluated by rdflib on the whole store instead of only this graph.
+        """
+        if isinstance(self.store, SPARQLStore) or not self.named_graphs:
+            self.update(q)
+        else:
+            ConjunctiveGraph(self.store).update(q)
+
+    def _query_dataset(self, q: str):
+        """
+        SPARQL query that can use named graphs, see _update_dataset.
+        """
+        if isinstance(self.store, SPARQLStore) or not self.named_graphs:
+            return self.query(q)
+        else:
+            return ConjunctiveGraph(self.store).query(q)
+
+    def _get_triples_cas_content(self, cas_content: CasContent, cat_doc: URIRef):
+        """All triples of the cas content. The ID's of the RO's and entities are added to the cas content.
+
+        Args:
+            cas_content:
+            cat_doc: URI of the catalogue document.
+
+        Returns:
+            List of triples to add.
+        """
+
+        l_add = [(cat_doc, RDF.type, self.class_cat_doc)]
+
+        d_value_count = {}
+
+        # iterate over reporting obligations (RO's)
+        for i, ro_i in enumerate(cas_content[KEY_CHILDREN]):
+
+            value_i = ro_i[KEY_VALUE]
+
+            rep_obl_i = self._get_ro_uri(cat_doc, value_i, d_value_count)
+
+            l_add.extend(self._get_triples_reporting_obligation(cat_doc, rep_obl_i, value_i))
+            cas_content[KEY_CHILDREN][i]["id"] = rep_obl_i.toPython()  # adding ID to cas
+
+            d_ent_count = {}
+
+            # iterate over different entities of RO
+            for j, ent_j in enumerate(ro_i[KEY_CHILDREN]):
+
+                concept_j = self._get_entity_uri(
+                    rep_obl_i, ent_j[KEY_SENTENCE_FRAG_CLASS], ent_j[KEY_VALUE], d_ent_count
+                )
+                pred_j, cls_j = self._get_pred_cls(ent_j[KEY_SENTENCE_FRAG_CLASS])
+
+                l_add.extend(self._get_triples_entity(rep_obl_i, pred_j, concept_j, cls_j, ent_j[KEY_VALUE]))
+
+                cas_content[KEY_CHILDREN][i][KEY_CHILDREN][j]["id"] = concept_j.toPython()  # adding ID to cas
+
+        return l_add
+
+    def _get_triples_update_cas_content(self, cas_content: CasContent, cat_doc: URIRef):
+        """Diff between the cas content and the current content of the document.
+
+        The ID's of the RO's and entities are added to the cas content.
+
+        Args:
+            cas_content:
+            cat_doc: URI of the catalogue document.
+
+        Returns:
+            Tuple with the list of triples to add and the list of triples (patterns) to remove.
+        """
+
+        l_add = []
+        l_remove = []
+
+        b_doc_exists, d_ro_current = self._get_doc_subgraph(cat_doc)
+
+        if not b_doc_exists:
+            l_add.append((cat_doc, RDF.type, self.class_cat_doc))
+
+        # RO's with the same string representation are re-used in a fixed order.
+        d_value_ro = {}
+        for ro_uri, (value, _) in sorted(d_ro_current.items()):
+            d_value_ro.setdefault(value, []).append(ro_uri)
+
+        d_value_count = {}
+
+        for i, ro_i in enumerate(cas_content[KEY_CHILDREN]):
+
+            value_i = ro_i[KEY_VALUE]
+
+            rep_obl_new_i = self._get_ro_uri(cat_doc, value_i, d_value_count)
+
+            l_ro_uri = d_value_ro.get(value_i)
+            if l_ro_uri:
+                rep_obl_i = l_ro_uri.pop(0)
+                _, l_ent_current = d_ro_current.pop(rep_obl_i)
+            else:  # RO not found, just make a new one
+                rep_obl_i = rep_obl_new_i
+                l_ent_current = []
+
+                l_add.extend(self._get_triples_reporting_obligation(cat_doc, rep_obl_i, value_i))
+
+            cas_content[KEY_CHILDREN][i]["id"] = rep_obl_i.toPython()  # adding ID to cas
+
+            d_pred_label_ent = {}
+            for pred, label, ent in sorted(l_ent_current):
+                d_pred_label_ent.setdefault((pred, label), []).append(ent)
+
+            d_ent_count = {}
+
+            for j, ent_j in enumerate(ro_i[KEY_CHILDREN]):
+
+                pred_j, cls_j = self._get_pred_cls(ent_j[KEY_SENTENCE_FRAG_CLASS])
+                concept_new_j = self._get_entity_uri(
+                    rep_obl_i, ent_j[KEY_SENTENCE_FRAG_CLASS], ent_j[KEY_VALUE], d_ent_count
+                )
+
+                l_ent = d_pred_label_ent.get((pred_j, ent_j[KEY_VALUE]))
+                if l_ent:
+                    concept_j = l_ent.pop(0)
+                else:
+                    concept_j = concept_new_j
+
+                    l_add.extend(self._get_triples_entity(rep_obl_i, pred_j, concept_j, cls_j, ent_j[KEY_VALUE]))
+
+                cas_content[KEY_CHILDREN][i][KEY_CHILDREN][j]["id"] = concept_j.toPython()  # adding ID to cas
+
+            # Entities that disappeared from the RO
+            for (pred, _), l_ent in d_pred_label_ent.items():
+                for ent in l_ent:
+                    l_remove.append((rep_obl_i, pred, ent))
+                    l_remove.append((ent, None, None))
+
+        # RO's that disappeared from the document
+        for ro_uri, (_, l_ent_current) in d_ro_current.items():
+            for _, _, ent in l_ent_current:
+                l_remove.append((ent, None, None))
+
+            l_remove.append((ro_uri, None, None))
+            l_remove.append((None, None, ro_uri))
+
+        return l_add, l_remove
+
+    def _get_q_remove_outdated(self, cat_doc: URIRef, cas_content: CasContent) -> str:
+        """SPARQL update that removes all RO's and entities of the document that are not in the cas content.
+
+        Args:
+            cat_doc: URI of the catalogue document.
+            cas_content: cas content with ID's.
+
+        Returns:
+            SPARQL update string
+        """
+
+        l_ro = [URIRef(ro_i["id"]) for ro_i in cas_content[KEY_CHILDREN]]
+        l_ent = [URIRef(ent_j["id"]) for ro_i in cas_content[KEY_CHILDREN] for ent_j in ro_i[KEY_CHILDREN]]
+
+        q = f"""
+            PREFIX skos: {SKOS.uri.n3()}
+
+            DELETE {{
+                ?ro ?has_ent ?ent .
+                ?ent ?p ?o .
+            }}
+            WHERE {{
+                {cat_doc.n3()} {self.prop_has_rep_obl.n3()} ?ro .
+                ?ro ?has_ent ?ent .
+                ?ent skos:prefLabel ?label ;
+                    ?p ?o .
+
+                FILTER (?ent NOT IN ({', '.join(map(lambda x: x.n3(), l_ent))}))
+            }} ;
+
+            DELETE {{
+                ?s_ro ?p_ro2 ?ro .
+                ?ro ?p_ro ?o_ro .
+            }}
+            WHERE {{
+                {cat_doc.n3()} {self.prop_has_rep_obl.n3()} ?ro .
+                ?ro ?p_ro ?o_ro .
+                ?s_ro ?p_ro2 ?ro .
+
+                FILTER (?ro NOT IN ({', '.join(map(lambda x: x.n3(), l_ro))}))
+            }}
+        """
+
+        return q
+
+    def _get_q_remove_doc_content(self, cat_doc: URIRef) -> str:
+        """SPARQL update that removes all RO's and entities of the document and the document itself, but not its links
+        to document sources.
+
+        Args:
+            cat_doc: URI of the catalogue document.
+
+        Returns:
+            SPARQL update string
+        """
+
+        q_ro = self._get_q_delete_ro(
+            f"VALUES ?doc_id {{ {cat_doc.n3()} }} ?doc_id {self.prop_has_rep_obl.n3()} ?ro_uri ."
+        )
+
+        return f"""
+            {q_ro} ;
+
+            DELETE DATA {{
+                {cat_doc.n3()} {RDF.type.n3()} {self.class_cat_doc.n3()} .
+            }}
+        """
+
+    def _get_ro_uri(self, cat_doc: URIRef, value: str, d_value_count: dict) -> URIRef:
+        """New URI for a reporting obligation.
+
+        Args:
+            cat_doc: URI of the catalogue document.
+            value: string representation of the RO.
+            d_value_count: number of times each value already occurred within the document. Is updated.
+
+        Returns:
+            URI
+        """
+
+        i_occurrence = d_value_count.get(value, 0)
+        d_value_count[value] = i_occurrence + 1
+
+        if self.deterministic_uri:
+            return get_UID_node(info="rep_obl_", key=(cat_doc, value, i_occurrence))
+
+        return get_UID_node(info="rep_obl_")
+
+    def _get_entity_uri(self, rep_obl: URIRef, sentence_frag_class: str, value: str, d_ent_count: dict) -> URIRef:
+        """New URI for an entity of a reporting obligation.
+
+        Args:
+            rep_obl: URI of the reporting obligation.
+            sentence_frag_class: class of the sentence fragment.
+            value: string representation of the sentence fragment.
+            d_ent_count: number of times each (class, value) already occurred within the RO. Is updated.
+
+        Returns:
+            URI
+        """
+
+        k = (sentence_frag_class, value)
+        i_occurrence = d_ent_count.get(k, 0)
+        d_ent_count[k] = i_occurrence + 1
+
+        if self.deterministic_uri:
+            return get_UID_node(info="entity_", key=(rep_obl,) + k + (i_occurrence,))
+
+        return get_UID_node(info="entity_")
+
+    def _get_doc_subgraph(self, cat_doc: URIRef):
+        """Retrieve all RO's and their entities of a document within a single query.
+
+        Args:
+            cat_doc: URI of the catalogue document.
+
+        Returns:
+            Tuple (b_doc_exists, d_ro) with
+            b_doc_exists: True if the catalogue document is already in the RDF.
+            d_ro: {RO URI: (RO value, [(predicate, entity label, entity URI), ...])}
+        """
+
+        q = f"""
+            PREFIX skos: {SKOS.uri.n3()}
+            PREFIX rdf: {RDF.uri.n3()}
+
+            SELECT ?ro ?ro_value ?pred ?ent ?label
+
+            WHERE {{
+                {{
+                    {cat_doc.n3()} a {self.class_cat_doc.n3()} .
+                }}
+                UNION
+                {{
+                    {cat_doc.n3()} {self.prop_has_rep_obl.n3()} ?ro .
+                    ?ro a {self.class_rep_obl.n3()} ;
+                        rdf:value ?ro_value .
+
+                    OPTIONAL {{
+                        ?ro ?pred ?ent .
+                        ?ent skos:prefLabel ?label .
+                    }}
+                }}
+            }}
+        """
+
+        b_doc_exists = False
+        d_ro = {}
+        for row in self.query(q):
+            ro, ro_value, pred, ent, label = row
+
+            if ro is None:
+                b_doc_exists = True
+                continue
+
+            _, l_ent = d_ro.setdefault(URIRef(ro), (str(ro_value), []))
+
+            if ent is not None:
+                l_ent.append((URIRef(pred), str(label), URIRef(ent)))
+
+        if d_ro:
+            b_doc_exists = True
+
+        return b_doc_exists, d_ro
+
+    def _get_triples_reporting_obligation(self, cat_doc: URIRef, rep_obl: URIRef, value: str):
+        return [
+            (rep_obl, RDF.type, self.class_rep_obl),
+            # link to catalog document + ontology
+            (cat_doc, self.prop_has_rep_obl, rep_obl),
+            # add whole reporting obligation
+            (rep_obl, RDF.value, Literal(value)),
+        ]
+
+    @staticmethod
+    def _get_triples_entity(rep_obl: URIRef, pred: URIRef, concept: URIRef, cls: URIRef, value: str):
+        return [
+            # type definition
+            (concept, RDF.type, cls),
+            # Add the string representation
+            (concept, SKOS.prefLabel, Literal(value, lang="en")),
+            (concept, PROP_SORT_KEY, Literal(get_sort_key(value))),
+            # connect entity with RO
+            (rep_obl, pred, concept),
+        ]
+
+    @staticmethod
+    def _get_pred_cls(sentence_frag_class: str):
+        t_pred_cls = D_ENTITIES.get(sentence_frag_class)
+        if t_pred_cls is None:
+            # Unknown property/entity class
+            # TODO how to handle unknown entities?
+
+            print(f"Unknown sentence entity class: {sentence_frag_class}")
+
+            return PROP_HAS_ENTITY, SKOS.Concept
+
+        return t_pred_cls
+
     def get_doc_source(self, doc_id: str):
         # TODO
         return
@@ -220,12 +782,15 @@ class ROGraph(Graph):
             doc_id: str,
             source_id: str,
             source_name: str = None,
+            b_link_only: bool = False,
     ) -> None:
         """
 
         :param doc_id: id that refers to the document (From Django)
         :param source_id: document/website source id, ideally the URL
         :param source_name: (Optional) label of the document source
+        :param b_link_only: (Optional) only add the link between the document and the source,
+            e.g. when the source is already in the RDF, see DocSourceCache.
         :return: None
         """
 
@@ -233,22 +798,28 @@ class ROGraph(Graph):
 
         cat_doc = self._get_cat_doc_uri(doc_id)
 
-        # Check if uri like, else convert to one.
+        source_uri = self._get_source_uri(source_id)
 
-        def _get_source_uri(source_id):
+        l_add.append((cat_doc, self.prop_has_doc_src, source_uri))
 
-            if _is_valid_uri(source_id):
-                return URIRef(source_id)
-            else:
-                return RO_BASE["doc_src/" + source_id.strip().replace(" ", "_")]
+        self._update_dataset(
+            self._get_q_update_source_stats(
+                f"VALUES (?doc_id ?src) {{ ({cat_doc.n3()} {source_uri.n3()}) }}",
+                d_ro="?n_ro",
+                d_doc="IF(?n_ro > 0, 1, 0)",
+                b_new_link=True,
+            )
+        )
 
-        source_uri = _get_source_uri(source_id)
+        if not b_link_only:
+            l_add.append((source_uri, RDF.type, self.class_doc_src))
 
-        l_add.append((cat_doc, self.prop_has_doc_src, source_uri))
-        l_add.append((source_uri, RDF.type, self.class_doc_src))
+            if source_name:
+                l_add.append((source_uri, RDF.value, Literal(source_name, lang="en")))
 
-        if source_name:
-            l_add.append((source_uri, RDF.value, Literal(source_name, lang="en")))
+        if self.named_graphs:
+            self._insert_data(l_add, GRAPH_DOC_SOURCES)
+            return
 
         for triple in l_add:
             self.add(triple)
@@ -263,61 +834,68 @@ class ROGraph(Graph):
         :return:
         """
 
-        cat_doc = self._get_cat_doc_uri(doc_id)
+        l_cat_doc = [self._get_cat_doc_uri(doc_id)]
+
+        self._update_dataset(
+            f"{self._get_q_update_source_stats_removed(l_cat_doc, b_link_only=True)} ;\n"
+            f"{self._get_q_remove_doc_sources(l_cat_doc, b_link_only=b_link_only)}"
+        )
+
+        return
+
+    def _get_q_remove_doc_sources(self, l_cat_doc: List[URIRef], b_link_only: bool = True) -> str:
+        """SPARQL update that removes the document source information of documents, see remove_doc_source.
+
+        Args:
+            l_cat_doc: URI's of the catalogue documents.
+            b_link_only: (Optional) only remove the link between the documents and their sources.
+
+        Returns:
+            SPARQL update string
+        """
 
         # Same doc sources are shared, so you probably don't want to remove it's value
         q_delete_doc_src = (
             ""
             if b_link_only
             else f"""
-            BIND (rdf:value as ?val)
-            
             OPTIONAL {{
                 ?doc_src_id a ?doc_src .
             }}
-            
+
             OPTIONAL {{ # Not every doc source has a name associated with it.
-               ?doc_src_id ?val ?src_name .
+               ?doc_src_id rdf:value ?src_name .
             }}
         """
         )
 
-        q_construct_delete_doc_src = (
+        q_template_delete_doc_src = (
             ""
             if b_link_only
             else f"""
-        	?doc_src_id a ?doc_src .
+                ?doc_src_id a ?doc_src .
+                ?doc_src_id rdf:value ?src_name .
         """
         )
 
-        q_construct = f"""
-            PREFIX dgfisma: {RO_BASE[''].n3()}
+        q = f"""
             PREFIX rdf: {RDF.uri.n3()}
-            # For testing, replace DELETE with SELECT 
-            CONSTRUCT {{
-                ?doc_id ?hasdocsrc ?doc_src_id .
-                ?doc_src_id  ?val ?src_name .
-                {q_construct_delete_doc_src}
-                
+
+            {f"WITH {GRAPH_DOC_SOURCES.n3()}" if self.named_graphs else ""}
+            DELETE {{
+                ?doc_id {self.prop_has_doc_src.n3()} ?doc_src_id .
+                {q_template_delete_doc_src}
             }}
             WHERE {{
-                BIND ({cat_doc.n3()} as ?doc_id)
-                BIND (dgfisma:hasDocumentSource as ?hasdocsrc)
+                VALUES ?doc_id {{ {" ".join(cat_doc.n3() for cat_doc in l_cat_doc)} }}
+
+                ?doc_id {self.prop_has_doc_src.n3()} ?doc_src_id .
 
-                ?doc_id ?hasdocsrc ?doc_src_id .
-                
                 {q_delete_doc_src}
             }}
         """
 
-        a = self.query(q_construct)
-
-        l_remove = []
-        l_remove.extend(a)
-        for triple in l_remove:
-            self.remove(triple)
-
-        return
+        return q
 
     def _add_property(self, prop: URIRef, domain: URIRef, ran: URIRef) -> None:
         """shared function to build all necessary triples for a property in the ontology.
@@ -337,87 +915,608 @@ class ROGraph(Graph):
     def _add_sub_class(self, child_cls: URIRef, parent_cls: URIRef) -> None:
         self.add((child_cls, RDFS.subClassOf, parent_cls))
 
-    def _get_triples_remove_reporting_obligation(self, ro_i: URIRef, keep_value=True):
+    def remove_reporting_obligations(
+            self, l_ro_uri: List[URIRef], keep_value: bool = False, batch_size: int = REMOVE_BATCH_SIZE
+    ) -> None:
+        """Remove reporting obligations with their entities.
+
+        Is done with SPARQL updates, such that nothing has to be retrieved first: with a SPARQL store, every batch of
+        RO's is a single request (within the transaction), for a local graph it is evaluated by rdflib.
+
+        Args:
+            l_ro_uri: URI's of the reporting obligations.
+            keep_value: (Optional) if True, the triple (RO URI, rdf:value, string) is kept.
+            batch_size: (Optional) maximum number of RO's per update.
+
+        Returns:
+            None
         """
-        The reporting obligation (with it's entities should be deleted)
+
+        l_ro_uri = [URIRef(ro_uri) for ro_uri in l_ro_uri]
+
+        for i in range(0, len(l_ro_uri), batch_size):
+            self._update_dataset(
+                self._get_q_remove_reporting_obligations(l_ro_uri[i : i + batch_size], keep_value=keep_value)
+            )
+
+    def _get_q_remove_reporting_obligations(self, l_ro_uri: List[URIRef], keep_value: bool = False) -> str:
+        """SPARQL update that removes reporting obligations with their entities, see remove_reporting_obligations.
 
         Args:
-            ro_i:
-            keep_value: Boolean, if keep_value, then a single triple stays with (RO URI, value, string)
+            l_ro_uri: URI's of the reporting obligations.
+            keep_value: (Optional) keep the triple (RO URI, rdf:value, string).
 
         Returns:
+            SPARQL update string
+        """
+
+        values = f"VALUES ?ro_uri {{ {' '.join(ro_uri.n3() for ro_uri in l_ro_uri)} }}"
+
+        values_doc = f"{values} {self._in_graph(f'?doc_id {self.prop_has_rep_obl.n3()} ?ro_uri .', '?doc_id')}"
+
+        q_stats = self._get_q_update_source_stats(
+            values_doc,
+            d_ro="-?n_ro_removed",
+            d_doc="IF(?n_ro > 0 && ?n_ro_removed >= ?n_ro, -1, 0)",
+        )
+        q_stats_doc = self._get_q_update_doc_stats(values_doc, "?n_ro - ?n_ro_removed")
+
+        return f"{q_stats} ;\n{q_stats_doc} ;\n{self._get_q_delete_ro(values, keep_value=keep_value)}"
+
+    def _get_q_delete_ro(self, values: str, keep_value: bool = False) -> str:
+        """
+        SPARQL update that removes the reporting obligations that are bound to ?ro_uri by the graph pattern values.
+        With named graphs, everything is matched and removed within the graph of the document.
+        """
+
+        graph_open, graph_close = ("GRAPH ?g {", "}") if self.named_graphs else ("", "")
+
+        q = f"""
+            PREFIX rdf: {RDF.uri.n3()}
 
+            DELETE {{ {graph_open}
+                ?ent ?p ?o .
+            {graph_close} }}
+            WHERE {{ {graph_open}
+                {values}
+
+                ?ro_uri a {self.class_rep_obl.n3()} ;
+                    ?has_ent ?ent .
+                ?ent ?p ?o .
+
+                FILTER (?has_ent != rdf:type)
+            {graph_close} }} ;
+
+            DELETE {{ {graph_open}
+                ?ro_uri ?p_ro ?o_ro .
+                ?s_ro ?p_ro2 ?ro_uri .
+            {graph_close} }}
+            WHERE {{ {graph_open}
+                {values}
+
+                {{
+                    ?ro_uri ?p_ro ?o_ro .
+                    {"FILTER (?p_ro != rdf:value)" if keep_value else ""}
+                }}
+                UNION
+                {{
+                    ?s_ro ?p_ro2 ?ro_uri .
+                }}
+            {graph_close} }}
         """
 
-        q_ent_construct = f"""
-        PREFIX dgfisma: <http://dgfisma.com/reporting_obligations/>
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        return q
 
-        # For testing, replace DELETE with SELECT 
-        CONSTRUCT {{
-            ?ent ?p ?o .
-        }}
-        WHERE {{
-        VALUES ?ro_uri {{ {URIRef(ro_i).n3()} }}
+    def remove_documents(
+            self, l_doc_id: List[str], batch_size: int = REMOVE_DOC_BATCH_SIZE, progress: Callable = None
+    ) -> int:
+        """Remove documents with their reporting obligations, entities and links to their document sources.
 
-        ?ro_uri a dgfisma:ReportingObligation ;
-            ?hasEnt ?ent .
+        Every batch of documents is a single SPARQL update, that is committed before the next one, such that a large
+        removal never locks the RDF for long and can be interrupted and resumed.
 
-        ?ent ?p ?o
+        Args:
+            l_doc_id: ID's of the documents.
+            batch_size: (Optional) maximum number of documents per update.
+            progress: (Optional) is called after every batch with the number of documents removed so far.
 
-        FILTER (?hasEnt != rdf:type)
-        }}
+        Returns:
+            Number of documents removed.
         """
 
-        q_ro_construct = f"""
-        PREFIX dgfisma: <http://dgfisma.com/reporting_obligations/>
-        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        l_cat_doc = [self._get_cat_doc_uri(doc_id) for doc_id in l_doc_id]
 
-        # For testing, replace DELETE with SELECT 
-        CONSTRUCT {{
-            ?s_ro ?p_ro2 ?ro_uri.
-            ?ro_uri ?p_ro ?o_ro .
-        }}
-        WHERE {{
-        VALUES ?ro_uri {{ {URIRef(ro_i).n3()} }}
-            ?ro_uri ?p_ro ?o_ro .
-            ?s_ro ?p_ro2 ?ro_uri .
+        for i in range(0, len(l_cat_doc), batch_size):
+            l_cat_doc_i = l_cat_doc[i : i + batch_size]
 
-        {
-        "FILTER(?p_ro2 != rdf:value)" if keep_value else ""
-        }
+            self._update_dataset(self._get_q_remove_documents(l_cat_doc_i))
+            self.commit()
+
+            n = i + len(l_cat_doc_i)
+            logging.info(f"Removed {n}/{len(l_cat_doc)} documents")
+            if progress is not None:
+                progress(n)
+
+        return len(l_cat_doc)
+
+    def purge_doc_source(
+            self,
+            source_id: str,
+            batch_size: int = REMOVE_DOC_BATCH_SIZE,
+            progress: Callable = None,
+            b_remove_source: bool = True,
+    ) -> int:
+        """Remove all documents of a document source, see remove_documents.
+
+        The documents are retrieved and removed batch by batch. As every batch is committed, a purge that was
+        interrupted is simply resumed by calling it again.
 
-        }}
+        Args:
+            source_id: document/website source id, see add_doc_source.
+            batch_size: (Optional) maximum number of documents per update.
+            progress: (Optional) is called after every batch with the number of documents removed so far.
+            b_remove_source: (Optional) remove the document source itself at the end as well.
+
+        Returns:
+            Number of documents removed.
         """
 
-        l_remove = []
+        source_uri = self._get_source_uri(source_id)
+
+        graph_open, graph_close = (f"GRAPH {GRAPH_DOC_SOURCES.n3()} {{", "}") if self.named_graphs else ("", "")
+
+        q = f"""
+            SELECT ?doc
+
+            WHERE {{ {graph_open}
+                ?doc {self.prop_has_doc_src.n3()} {source_uri.n3()} .
+            {graph_close} }}
+            LIMIT {int(batch_size)}
+        """
+
+        n = 0
+        while True:
+            l_cat_doc = [URIRef(doc) for doc, in self._query_dataset(q) if doc is not None]
+            if not l_cat_doc:
+                break
+
+            self._update_dataset(self._get_q_remove_documents(l_cat_doc))
+            self.commit()
+
+            n += len(l_cat_doc)
+            logging.info(f"Removed {n} documents of {source_uri}")
+            if progress is not None:
+                progress(n)
+
+            if len(l_cat_doc) < batch_size:
+                break
+
+        if b_remove_source:
+            if self.named_graphs:
+                triple = f"{source_uri.n3()} ?p ?o"
+                self._update_dataset(f"WITH {GRAPH_DOC_SOURCES.n3()} DELETE {{ {triple} }} WHERE {{ {triple} }}")
+            else:
+                self.remove((source_uri, None, None))
+            self.commit()
+
+        return n
+
+    def _get_q_remove_documents(self, l_cat_doc: List[URIRef]) -> str:
+        """SPARQL update that removes documents with their RO's, entities and links to document sources.
+
+        Args:
+            l_cat_doc: URI's of the catalogue documents.
+
+        Returns:
+            SPARQL update string
+        """
+
+        values = f"VALUES ?doc_id {{ {' '.join(cat_doc.n3() for cat_doc in l_cat_doc)} }}"
+
+        q_stats = self._get_q_update_source_stats_removed(l_cat_doc)
+
+        if self.named_graphs:
+            # Everything of a document is within its own graph, only the links to the document sources are not.
+            q_drop = " ;\n".join(f"DROP SILENT GRAPH {cat_doc.n3()}" for cat_doc in l_cat_doc)
+
+            return f"""
+                {q_stats} ;
+
+                {q_drop} ;
+
+                WITH {GRAPH_DOC_SOURCES.n3()}
+                DELETE {{
+                    ?doc_id {self.prop_has_doc_src.n3()} ?doc_src_id .
+                }}
+                WHERE {{
+                    {values}
+
+                    ?doc_id {self.prop_has_doc_src.n3()} ?doc_src_id .
+                }}
+            """
+
+        q_ro = self._get_q_delete_ro(f"{values} ?doc_id {self.prop_has_rep_obl.n3()} ?ro_uri .")
 
-        # CONSTRUCT
-        a = self.query(q_ent_construct)
-        l_remove.extend(a)
+        q = f"""
+            {q_stats} ;
+
+            {q_ro} ;
+
+            DELETE {{
+                ?doc_id ?p_doc ?o_doc .
+                ?s_doc ?p_doc2 ?doc_id .
+            }}
+            WHERE {{
+                {values}
+
+                {{
+                    ?doc_id ?p_doc ?o_doc .
+                }}
+                UNION
+                {{
+                    ?s_doc ?p_doc2 ?doc_id .
+                }}
+            }}
+        """
+
+        return q
+
+    def rebuild_source_stats(self) -> None:
+        """Recompute the statistics of all document sources and documents from scratch, e.g. after a bulk load or to
+        repair drift.
+
+        Returns:
+            None
+        """
+
+        pattern_stats = self._in_graph(
+            f"?src {PROP_N_DOC.n3()} ?n_doc_src . ?src {PROP_N_RO.n3()} ?n_ro_src .", GRAPH_DOC_SOURCES.n3()
+        )
+        pattern_stats_new = self._in_graph(
+            f"?src {PROP_N_DOC.n3()} ?n_doc . ?src {PROP_N_RO.n3()} ?n_ro .", GRAPH_DOC_SOURCES.n3()
+        )
+        pattern_stats_doc = self._in_graph(f"?doc_id {PROP_N_RO_DOC.n3()} ?n_ro_doc .", GRAPH_DOC_SOURCES.n3())
+        pattern_stats_doc_new = self._in_graph(f"?doc_id {PROP_N_RO_DOC.n3()} ?n_ro .", GRAPH_DOC_SOURCES.n3())
+
+        pattern_ro = self._in_graph(
+            f"?doc_id {self.prop_has_rep_obl.n3()} ?ro . ?ro a {self.class_rep_obl.n3()} .", "?doc_id"
+        )
+
+        self._update_dataset(
+            f"""
+            DELETE {{ {pattern_stats} }}
+            WHERE {{ {pattern_stats} }} ;
 
-        a = self.query(q_ro_construct)
-        l_remove.extend(a)
+            DELETE {{ {pattern_stats_doc} }}
+            WHERE {{ {pattern_stats_doc} }} ;
+
+            INSERT {{ {pattern_stats_new} }}
+            WHERE {{
+                SELECT ?src (COUNT(DISTINCT ?ro) AS ?n_ro) (COUNT(DISTINCT ?doc_id) AS ?n_doc)
+                WHERE {{
+                    {self._in_graph(f"?doc_id {self.prop_has_doc_src.n3()} ?src .", GRAPH_DOC_SOURCES.n3())}
+                    {pattern_ro}
+                }}
+                GROUP BY ?src
+            }} ;
+
+            INSERT {{ {pattern_stats_doc_new} }}
+            WHERE {{
+                SELECT ?doc_id (COUNT(DISTINCT ?ro) AS ?n_ro)
+                WHERE {{ {pattern_ro} }}
+                GROUP BY ?doc_id
+            }}
+            """
+        )
+        self.commit()
+
+    def _get_q_update_source_stats_doc(self, cat_doc: URIRef, n_ro: int, b_add: bool = False) -> str:
+        """SPARQL update that updates the statistics of a document that is (re-)ingested and of its document sources.
+        Has to be run before its RO's are changed.
+
+        Args:
+            cat_doc: URI of the catalogue document.
+            n_ro: number of RO's that are ingested.
+            b_add: (Optional) the RO's are added to the current ones of the document, instead of replacing them.
+
+        Returns:
+            SPARQL update string
+        """
 
-        return l_remove
+        if b_add:
+            d_ro, d_doc, n_ro_doc = f"{n_ro}", f"IF(?n_ro > 0, 0, {int(n_ro > 0)})", f"?n_ro + {n_ro}"
+        else:
+            d_ro, d_doc, n_ro_doc = f"{n_ro} - ?n_ro", f"{int(n_ro > 0)} - IF(?n_ro > 0, 1, 0)", f"{n_ro}"
+
+        values = f"VALUES ?doc_id {{ {cat_doc.n3()} }}"
+
+        return (
+            f"{self._get_q_update_source_stats(values, d_ro=d_ro, d_doc=d_doc)} ;\n"
+            f"{self._get_q_update_doc_stats(values, n_ro_doc)}"
+        )
+
+    def _get_q_update_source_stats_removed(self, l_cat_doc: List[URIRef], b_link_only: bool = False) -> str:
+        """SPARQL update that updates the statistics of the document sources, for documents that are removed from them.
+
+        Args:
+            l_cat_doc: URI's of the catalogue documents.
+            b_link_only: (Optional) only the links to their document sources are removed, not the documents.
+
+        Returns:
+            SPARQL update string
+        """
+
+        values = f"VALUES ?doc_id {{ {' '.join(cat_doc.n3() for cat_doc in l_cat_doc)} }}"
+
+        q = self._get_q_update_source_stats(values, d_ro="-?n_ro", d_doc="-IF(?n_ro > 0, 1, 0)")
+        if b_link_only:
+            return q
+
+        return f"{q} ;\n{self._get_q_update_doc_stats(values, '0')}"
+
+    def _get_q_select_doc_stats(self, values: str, group_by: str) -> str:
+        """
+        Sub query with the stored number of RO's of the documents bound to ?doc_id by the graph pattern values,
+        as ?n_ro, and the number of them that is bound to ?ro_uri as ?n_ro_removed, grouped by the variables group_by.
+        """
+
+        select_removed = "(COUNT(DISTINCT ?ro_uri) AS ?n_ro_removed)" if "?ro_uri" in values else ""
+
+        return f"""
+            SELECT {group_by} (MAX(COALESCE(?n_ro_doc, 0)) AS ?n_ro) {select_removed}
+            WHERE {{
+                {values}
+
+                OPTIONAL {{
+                    {self._in_graph(f"?doc_id {PROP_N_RO_DOC.n3()} ?n_ro_doc .", GRAPH_DOC_SOURCES.n3())}
+                }}
+            }}
+            GROUP BY {group_by}
+        """
+
+    def _get_q_update_source_stats(self, values: str, d_ro: str, d_doc: str, b_new_link: bool = False) -> str:
+        """SPARQL update that changes the statistics of the document sources of the documents bound to ?doc_id by
+        the graph pattern values. A document source without documents has no statistics.
+
+        Only the stored number of RO's of the documents is read, see PROP_N_RO_DOC, their RO's are never counted.
+
+        Args:
+            values: graph pattern that binds ?doc_id and optionally ?ro_uri, the RO's that are removed.
+            d_ro: SPARQL expression with the change in number of RO's per document. Can use ?n_ro, the current number
+                of RO's of the document, and ?n_ro_removed, the number of them that is bound to ?ro_uri.
+            d_doc: SPARQL expression with the change in number of documents per document (-1, 0 or 1).
+            b_new_link: (Optional) values also binds ?src, for a link to a document source that is about to be added.
+
+        Returns:
+            SPARQL update string
+        """
+
+        pattern_link = self._in_graph(f"?doc_id {self.prop_has_doc_src.n3()} ?src .", GRAPH_DOC_SOURCES.n3())
+        if b_new_link:
+            pattern_link = f"FILTER NOT EXISTS {{ {pattern_link} }}"
+
+        q = f"""
+            DELETE {{
+                {self._in_graph(f"?src {PROP_N_RO.n3()} ?n_ro_src . ?src {PROP_N_DOC.n3()} ?n_doc_src .",
+                                GRAPH_DOC_SOURCES.n3())}
+            }}
+            INSERT {{
+                {self._in_graph(f"?src {PROP_N_RO.n3()} ?n_ro_src_new . ?src {PROP_N_DOC.n3()} ?n_doc_src_new .",
+                                GRAPH_DOC_SOURCES.n3())}
+            }}
+            WHERE {{
+                {{
+                    {{
+                        SELECT ?src (SUM({d_ro}) AS ?d_ro_src) (SUM({d_doc}) AS ?d_doc_src)
+                        WHERE {{
+                            {{ {self._get_q_select_doc_stats(f"{values} {pattern_link}", "?src ?doc_id")} }}
+                            # Aggregating no documents at all, still gives a (unbound) result with rdflib.
+                            FILTER (BOUND(?src))
+                        }}
+                        GROUP BY ?src
+                    }}
+                    # Same for the sum, filtered within its own group before ?src is bound by the statistics below.
+                    FILTER (BOUND(?src))
+                }}
+
+                OPTIONAL {{ {self._in_graph(f"?src {PROP_N_RO.n3()} ?n_ro_src .", GRAPH_DOC_SOURCES.n3())} }}
+                OPTIONAL {{ {self._in_graph(f"?src {PROP_N_DOC.n3()} ?n_doc_src .", GRAPH_DOC_SOURCES.n3())} }}
+
+                BIND (COALESCE(?n_doc_src, 0) + ?d_doc_src AS ?n_doc_total)
+                # ?none is never bound, such that nothing is inserted.
+                BIND (IF(?n_doc_total > 0, ?n_doc_total, ?none) AS ?n_doc_src_new)
+                BIND (IF(?n_doc_total > 0, COALESCE(?n_ro_src, 0) + ?d_ro_src, ?none) AS ?n_ro_src_new)
+            }}
+        """
+
+        return q
+
+    def _get_q_update_doc_stats(self, values: str, n_ro_doc: str) -> str:
+        """SPARQL update that changes the stored number of RO's of the documents bound to ?doc_id by the graph pattern
+        values, see PROP_N_RO_DOC. Has to be run after _get_q_update_source_stats, which reads the current number.
+
+        Args:
+            values: graph pattern that binds ?doc_id and optionally ?ro_uri, the RO's that are removed.
+            n_ro_doc: SPARQL expression with the new number of RO's of the document, can use ?n_ro and ?n_ro_removed,
+                see _get_q_update_source_stats. A document without RO's has no number stored.
+
+        Returns:
+            SPARQL update string
+        """
+
+        return f"""
+            DELETE {{ {self._in_graph(f"?doc_id {PROP_N_RO_DOC.n3()} ?n_ro_doc .", GRAPH_DOC_SOURCES.n3())} }}
+            INSERT {{ {self._in_graph(f"?doc_id {PROP_N_RO_DOC.n3()} ?n_ro_doc_new .", GRAPH_DOC_SOURCES.n3())} }}
+            WHERE {{
+                {{ {self._get_q_select_doc_stats(values, "?doc_id")} }}
+                FILTER (BOUND(?doc_id))
+
+                OPTIONAL {{ {self._in_graph(f"?doc_id {PROP_N_RO_DOC.n3()} ?n_ro_doc .", GRAPH_DOC_SOURCES.n3())} }}
+
+                BIND ({n_ro_doc} AS ?n_ro_doc_total)
+                BIND (IF(?n_ro_doc_total > 0, ?n_ro_doc_total, ?none) AS ?n_ro_doc_new)
+            }}
+        """
+
+    def _in_graph(self, pattern: str, graph: str) -> str:
+        """
+        Graph pattern within a named graph (a URI or variable in SPARQL syntax), when every document has its own graph.
+        """
+        return f"GRAPH {graph} {{ {pattern} }}" if self.named_graphs else pattern
+
+    def add_sort_keys(self, batch_size: int = 10000) -> int:
+        """Add the sort key to all entities that don't have one yet, e.g. those ingested before it existed.
+
+        Is done in batches, that are committed one by one, such that it can be interrupted and resumed.
+        With named graphs, documents always have been ingested with sort keys, so there is nothing to do.
+
+        Args:
+            batch_size: number of entities per batch.
+
+        Returns:
+            Number of entities that got a sort key.
+        """
+
+        if self.named_graphs:
+            return 0
+
+        q = f"""
+            PREFIX skos: {SKOS.uri.n3()}
+
+            SELECT ?ent (SAMPLE(?label) AS ?label_ent)
+
+            WHERE {{
+                ?ro a {self.class_rep_obl.n3()} ;
+                    ?has_ent ?ent .
+                ?ent skos:prefLabel ?label .
+
+                FILTER NOT EXISTS {{ ?ent {PROP_SORT_KEY.n3()} ?sort_key . }}
+            }}
+            GROUP BY ?ent
+            LIMIT {int(batch_size)}
+        """
+
+        n = 0
+        while True:
+            l_ent = [(ent, label) for ent, label in self.query(q) if ent is not None]
+            if not l_ent:
+                break
+
+            for ent, label in l_ent:
+                self.add((ent, PROP_SORT_KEY, Literal(get_sort_key(str(label)))))
+
+            self.commit()
+
+            n += len(l_ent)
+
+            if len(l_ent) < batch_size:
+                break
+
+        return n
 
     @staticmethod
     def _get_cat_doc_uri(doc_id):
         return RO_BASE["cat_doc/" + doc_id.strip().replace(" ", "_")]
 
+    @staticmethod
+    def _get_source_uri(source_id):
+        # Check if uri like, else convert to one.
+        if _is_valid_uri(source_id):
+            return URIRef(source_id)
+        else:
+            return RO_BASE["doc_src/" + source_id.strip().replace(" ", "_")]
+
+
+class DocSourceCache:
+    """
+    Document sources that are known to be in the RDF, with their labels, such that their triples are only added once
+    instead of for every document. Is shared between threads and keeps the most recently used sources per dataset.
+
+    Only add a source after it is committed, and discard it when it is removed from the RDF.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+
+        # (dataset, source URI) -> labels
+        self._d = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_known(self, dataset: str, source_id: str, source_name: str = None) -> bool:
+        """Check if the document source (and its label) are already in the RDF.
+
+        Args:
+            dataset: e.g. the update endpoint.
+            source_id: document/website source id, see ROGraph.add_doc_source.
+            source_name: (Optional) label of the document source.
+
+        Returns:
+            True if only the link between a document and the source has to be added.
+        """
+        key = (dataset, ROGraph._get_source_uri(source_id))
+
+        with self._lock:
+            labels = self._d.get(key)
+            if labels is None:
+                return False
 
-def get_UID_node(base=RO_BASE, info=None):
+            self._d.move_to_end(key)
+
+            return not source_name or source_name in labels
+
+    def add(self, dataset: str, source_id: str, source_name: str = None) -> None:
+        key = (dataset, ROGraph._get_source_uri(source_id))
+
+        with self._lock:
+            labels = self._d.setdefault(key, set())
+            if source_name:
+                labels.add(source_name)
+
+            self._d.move_to_end(key)
+            while len(self._d) > self.maxsize:
+                self._d.popitem(last=False)
+
+    def discard(self, dataset: str, source_id: str) -> None:
+        with self._lock:
+            self._d.pop((dataset, ROGraph._get_source_uri(source_id)), None)
+
+
+def get_sort_key(label: str) -> str:
+    """Normalised label to sort entities on: lowercase, without special characters or digits.
+
+    Args:
+        label: label of the entity.
+
+    Returns:
+        sort key. Can be empty, e.g. for labels that only contain digits.
+    """
+    return RE_SORT_KEY_STRIP.sub("", RE_SORT_KEY_SPECIAL.sub("", label.lower()))
+
+
+def _quote_nt(value: str) -> str:
+    """
+    N-Triples string, escaped the same way as rdflib's N-Triples serializer.
+    """
+    return '"%s"' % value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"').replace("\r", "\\r")
+
+
+def get_UID_node(base=RO_BASE, info=None, key=None):
     """Shared function to generate nodes that need a unique ID.
-    ID is randomly generated.
+    ID is randomly generated, unless a key is provided.
 
     Args:
         base: used namespace
         info: info to add to the ID.
+        key: (Optional) tuple of values that identify the node, e.g. (document, RO text, position).
+            The ID is then a hash of the key: the same key always gives the same node.
 
     Returns:
         a URI or BNode
     """
-    if 1:
+    if key is not None:
+        h = hashlib.sha256("\x1f".join(map(str, key)).encode("utf-8"))
+        node = base[info + h.hexdigest()[:32]]
+    elif 1:
         node = base[info + _serial_number_generator()()]
     elif 0:  # blank nodes
         node = BNode()
@@ -425,35 +1524,3 @@ def get_UID_node(base=RO_BASE, info=None):
         node = BNode().skolemize()
 
     return node
-
-
-class ROUpdate:
-    def __init__(
-            self,
-            endpoint,
-    ):
-        self.sparql = SPARQLWrapper(endpoint)
-        self.sparql.setReturnFormat(JSON)
-
-    def get_l_ro(self, value: str, doc_uri=None):
-        RO_URI = "ro_uri"
-        q = f"""
-            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-            PREFIX dgfisma: <http://dgfisma.com/reporting_obligations/>
-
-            SELECT ?{RO_URI}
-
-            WHERE {{
-                {URIRef(doc_uri).n3() if doc_uri else "?cat_doc_uri"} dgfisma:hasReportingObligation ?{RO_URI} .
-                ?{RO_URI} a dgfisma:ReportingObligation ;
-                rdf:value ?o 
-            FILTER(?o = {Literal(value).n3()})
-            }}
-        """
-        self.sparql.setQuery(q)
-        self.sparql.setMethod(GET)
-
-        results = self.sparql.query().convert()["results"]["bindings"]
-        l_ro_uri = [res[RO_URI]["value"] for res in results]
-
-        return l_ro_uri
@@ -0,0 +1,248 @@
+"""
+Offline build of the reporting obligations RDF from a directory of CAS files.
+
+The triples are written as sorted N-Triples (or N-Quads) shards that can be loaded directly with Fuseki's TDB bulk
+loader, e.g. `tdb2.tdbloader --loc <DB> <output>/*.nt.gz`, instead of uploading every CAS through the API.
+
+Usage:
+    python -m dgfisma_rdf.reporting_obligations.bulk_build <folder_cas> <folder_output> [--workers 8] [--gzip]
+"""
+import argparse
+import gzip
+import io
+import logging
+import multiprocessing
+import os
+import time
+from typing import Iterator, List, Tuple
+
+from cassis import load_cas_from_xmi
+
+from .build_rdf import GRAPH_SCHEMA, ROGraph
+from .cas_parser import CompactCasContent
+from .typesystem import get_typesystem
+
+NT = "nt"
+NQ = "nq"
+
+EXTENSIONS_CAS = (".xml", ".xmi")
+
+PATH_TYPESYSTEM = os.path.join(os.path.dirname(__file__), "output_reporting_obligations/typesystem_tmp.xml")
+
+# Typesystem of the worker process, see _init_worker
+_TYPESYSTEM = None
+
+
+def get_cas_paths(folder_cas: str) -> Iterator[str]:
+    """Walk through a folder (recursively) and yield all CAS files in a fixed order.
+
+    Args:
+        folder_cas: folder with XMI files.
+
+    Returns:
+        Iterator with paths
+    """
+    for root, dirs, files in os.walk(folder_cas):
+        dirs.sort()
+        for filename in sorted(files):
+            if filename.lower().endswith(EXTENSIONS_CAS):
+                yield os.path.join(root, filename)
+
+
+def get_doc_id(path_cas: str) -> str:
+    """Document ID that is used for a CAS file: its filename without extension.
+
+    Args:
+        path_cas:
+
+    Returns:
+        document ID
+    """
+    return os.path.splitext(os.path.basename(path_cas))[0]
+
+
+def build(
+        folder_cas: str,
+        folder_output: str,
+        path_typesystem: str = PATH_TYPESYSTEM,
+        n_workers: int = None,
+        fmt: str = NT,
+        b_gzip: bool = False,
+        shard_size: int = 1000000,
+        include_schema: bool = True,
+) -> dict:
+    """Build the RDF of all CAS files within a folder and save it as sorted shards.
+
+    RO's and entities get deterministic URI's (see ROGraph), so building the same folder twice gives the same output.
+
+    Args:
+        folder_cas: folder with XMI files.
+        folder_output: folder to save the shards to.
+        path_typesystem: path to the typesystem of the CAS files.
+        n_workers: (Optional) number of processes. By default the number of CPU's.
+        fmt: NT for N-Triples or NQ for N-Quads with a named graph per catalogue document.
+        b_gzip: compress the shards.
+        shard_size: maximum number of lines per shard.
+        include_schema: write the ontology to a separate shard.
+
+    Returns:
+        statistics of the build: number of documents, failed documents, RO's and triples, duration and throughput.
+    """
+
+    if fmt not in (NT, NQ):
+        raise ValueError(f"Unknown format: {fmt}. Expected {NT} or {NQ}.")
+
+    os.makedirs(folder_output, exist_ok=True)
+
+    l_path_cas = list(get_cas_paths(folder_cas))
+
+    stats = {"n_doc": 0, "n_failed": 0, "n_ro": 0, "n_triples": 0, "n_shards": 0}
+
+    t0 = time.time()
+
+    if include_schema:
+        g_schema = ROGraph(include_schema=True)
+        graph_name = GRAPH_SCHEMA if fmt == NQ else None
+        _write_shard(_get_lines(g_schema, graph_name, fmt), _get_shard_path(folder_output, "schema", fmt, b_gzip))
+
+    l_lines = []
+
+    def flush():
+        if l_lines:
+            path_shard = _get_shard_path(folder_output, f"ro_{stats['n_shards']:05d}", fmt, b_gzip)
+            stats["n_triples"] += _write_shard(l_lines, path_shard)
+            stats["n_shards"] += 1
+            l_lines.clear()
+
+    with multiprocessing.Pool(n_workers, initializer=_init_worker, initargs=(path_typesystem,)) as pool:
+        # In order, such that the documents end up in the same shards every time.
+        for path_cas, n_ro, lines in pool.imap(_build_doc, [(p, fmt) for p in l_path_cas], chunksize=4):
+
+            if lines is None:
+                logging.warning(f"Could not build the RDF of {path_cas}")
+                stats["n_failed"] += 1
+                continue
+
+            stats["n_doc"] += 1
+            stats["n_ro"] += n_ro
+
+            l_lines.extend(lines)
+            if len(l_lines) >= shard_size:
+                flush()
+                logging.info(_get_throughput(stats, time.time() - t0))
+
+        flush()
+
+    stats["duration"] = time.time() - t0
+    logging.info(_get_throughput(stats, stats["duration"]))
+
+    return stats
+
+
+def _init_worker(path_typesystem):
+    global _TYPESYSTEM
+
+    _TYPESYSTEM = get_typesystem(path_typesystem)
+
+
+def _build_doc(args: Tuple[str, str]) -> Tuple[str, int, List[str]]:
+    """Build the N-Triples/N-Quads lines of a single CAS file. Is run within a worker process.
+
+    Returns:
+        (path, number of RO's, lines). Lines is None if the CAS could not be processed.
+    """
+    path_cas, fmt = args
+
+    try:
+        with open(path_cas, "rb") as f:
+            cas = load_cas_from_xmi(f, typesystem=_TYPESYSTEM)
+
+        cas_content = CompactCasContent.from_cassis_cas(cas)
+
+        g = ROGraph(deterministic_uri=True)
+
+        graph_name = g._get_cat_doc_uri(get_doc_id(path_cas)) if fmt == NQ else None
+
+        # The values are written straight from the text of the CAS, without building the graph first.
+        buffer = io.StringIO()
+        g.write_compact_cas_content(cas_content, get_doc_id(path_cas), buffer, graph_name=graph_name)
+
+        return path_cas, len(cas_content), buffer.getvalue().splitlines()
+
+    except Exception as e:
+        logging.warning(e)
+
+        return path_cas, 0, None
+
+
+def _get_lines(g: ROGraph, graph_name, fmt: str) -> List[str]:
+    lines = g.serialize(format="nt").decode("utf-8").splitlines()
+    lines = [line for line in lines if line]
+
+    if fmt == NQ:
+        # N-Triples lines end with " ."
+        lines = [f"{line[:-2]} {graph_name.n3()} ." if graph_name is not None else line for line in lines]
+
+    return lines
+
+
+def _get_shard_path(folder_output, name, fmt, b_gzip) -> str:
+    return os.path.join(folder_output, f"{name}.{fmt}{'.gz' if b_gzip else ''}")
+
+
+def _write_shard(lines: List[str], path_shard: str) -> int:
+    """Sort, deduplicate and save the lines
+
+    Returns:
+        number of lines written
+    """
+    lines = sorted(set(lines))
+
+    open_shard = gzip.open if path_shard.endswith(".gz") else open
+    with open_shard(path_shard, "wt", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+    return len(lines)
+
+
+def _get_throughput(stats: dict, delta_t: float) -> str:
+    delta_t = max(delta_t, 1e-6)
+    return (
+        f"{stats['n_doc']} documents ({stats['n_failed']} failed), {stats['n_ro']} RO's, "
+        f"{stats['n_triples']} triples in {delta_t:.1f} s: "
+        f"{stats['n_doc'] / delta_t:.1f} doc/s, {stats['n_triples'] / delta_t:.0f} triples/s"
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Build the reporting obligations RDF from a folder of CAS files.")
+    parser.add_argument("folder_cas", help="Folder with the CAS (XMI) files.")
+    parser.add_argument("folder_output", help="Folder to save the N-Triples/N-Quads shards to.")
+    parser.add_argument("--typesystem", default=PATH_TYPESYSTEM, help="Path to the typesystem.")
+    parser.add_argument("--workers", type=int, default=None, help="Number of processes. Default: number of CPU's.")
+    parser.add_argument("--format", choices=(NT, NQ), default=NT, help="N-Triples or N-Quads (graph per document).")
+    parser.add_argument("--gzip", action="store_true", help="Compress the shards.")
+    parser.add_argument("--shard-size", type=int, default=1000000, help="Maximum number of triples per shard.")
+    parser.add_argument("--no-schema", action="store_true", help="Don't write the ontology.")
+
+    args = parser.parse_args(args)
+
+    logging.basicConfig(level=logging.INFO)
+
+    stats = build(
+        args.folder_cas,
+        args.folder_output,
+        path_typesystem=args.typesystem,
+        n_workers=args.workers,
+        fmt=args.format,
+        b_gzip=args.gzip,
+        shard_size=args.shard_size,
+        include_schema=not args.no_schema,
+    )
+
+    print(_get_throughput(stats, stats["duration"]))
+
+
+if __name__ == "__main__":
+    main()
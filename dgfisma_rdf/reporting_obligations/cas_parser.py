@@ -1,7 +1,16 @@
+import functools
+import multiprocessing
 import os
+import re
+from array import array
+from types import MappingProxyType
+from typing import Iterable, Iterator, List, Mapping, Tuple
 
 import cassis
-from cassis import load_typesystem, load_cas_from_xmi
+from cassis import load_cas_from_xmi
+
+from . import profiling
+from .typesystem import get_typesystem
 
 KEY_CHILDREN = "children"
 KEY_VALUE = "value"
@@ -10,6 +19,10 @@ KEY_SENTENCE_FRAG_CLASS = "class"
 SOFA_ID_HTML2TEXT = "html2textView"
 VALUE_BETWEEN_TAG_TYPE_CLASS = "com.crosslang.uimahtmltotext.uima.type.ValueBetweenTagType"
 
+ATTRIBUTE_CLASS = "class"
+# name='value' or name="value"
+RE_ATTRIBUTE = re.compile(r"""([^\s=]+)\s*=\s*(?:'([^']*)'|"([^"]*)")""")
+
 
 class CasContent(dict):
     """
@@ -17,6 +30,8 @@ class CasContent(dict):
     https://stackoverflow.com/questions/4045161/should-i-use-a-class-or-dictionary
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_list(cls, list_ro, meta=None):
         """
@@ -31,6 +46,7 @@ class CasContent(dict):
         return cls(d)
 
     @classmethod
+    @profiling.profiled
     def from_cassis_cas(cls, cas: cassis.Cas, name_view=SOFA_ID_HTML2TEXT):
         """
 
@@ -42,53 +58,207 @@ class CasContent(dict):
 
         """
 
+        cas_content = CompactCasContent.from_cassis_cas(cas, name_view=name_view).to_cas_content()
+
+        return cas_content if cls is CasContent else cls(cas_content)
+
+    @classmethod
+    def from_cas_file(cls, path_cas, path_typesystem):
+        """Build up CasContent from file directly
+
+        Args:
+            path_cas:
+            path_typesystem: The typesystem is only loaded once, see typesystem.get_typesystem.
+
+        Returns:
+            a list
+        """
+        typesystem = get_typesystem(path_typesystem)
+
+        with open(path_cas, "rb") as f:
+            cas = load_cas_from_xmi(f, typesystem=typesystem)
+
+        return cls.from_cassis_cas(cas)
+
+    @classmethod
+    def from_cas_files(
+            cls, l_path_cas: Iterable[str], path_typesystem, n_workers: int = None, compact: bool = False
+    ) -> List["CasContent"]:
+        """Build up the CasContent of many CAS files with the same typesystem.
+
+        Args:
+            l_path_cas: paths to the CAS files.
+            path_typesystem: typesystem of all the CAS files.
+            n_workers: (Optional) number of processes to load the CAS files with.
+                By default, they are loaded one by one in this process.
+            compact: (Optional) return CompactCasContent's instead, which take a lot less memory for large batches.
+
+        Returns:
+            list with the CasContent of every CAS file, in the same order.
+        """
+        load = CompactCasContent.from_cas_file if compact else cls.from_cas_file
+
+        l_args = [(path_cas, path_typesystem) for path_cas in l_path_cas]
+
+        if not n_workers or n_workers <= 1:
+            return [load(*args) for args in l_args]
+
+        with multiprocessing.Pool(n_workers) as pool:
+            l_cas_content = pool.starmap(load, l_args, chunksize=4)
+
+        return l_cas_content
+
+
+class CompactCasContent:
+    """
+    Compact representation of the content of a CAS, for batch processing.
+
+    The text of the view is kept as the single string of the CAS itself. Reporting obligations and their sentence
+    fragments are (begin, end) offsets into it, in arrays, and the classes of the fragments are codes into a table.
+    Strings are only sliced when needed, e.g. by to_cas_content, which converts it to the CasContent with the same
+    dict/JSON shape.
+    """
+
+    __slots__ = (
+        "text",
+        "meta",
+        "ro_begin",
+        "ro_end",
+        "ro_children",
+        "frag_begin",
+        "frag_end",
+        "frag_class",
+        "classes",
+        "_class_codes",
+    )
+
+    def __init__(self, text: str, meta=None):
+        self.text = text
+        self.meta = meta
+
+        self.ro_begin = array("l")
+        self.ro_end = array("l")
+        # The fragments of the i'th reporting obligation are ro_children[i]:ro_children[i + 1]
+        self.ro_children = array("l", [0])
+
+        self.frag_begin = array("l")
+        self.frag_end = array("l")
+        self.frag_class = array("H")
+
+        self.classes = []
+        self._class_codes = {}
+
+    @classmethod
+    def from_cassis_cas(cls, cas: cassis.Cas, name_view=SOFA_ID_HTML2TEXT) -> "CompactCasContent":
+        """See CasContent.from_cassis_cas"""
+
         view_text_html = cas.get_view(name_view)
 
-        l_ro = []
+        cas_content = cls(view_text_html.sofa_string)
 
         for annot_p in view_text_html.select(VALUE_BETWEEN_TAG_TYPE_CLASS):
             if annot_p.tagName == "p":
 
-                ro_i = {KEY_VALUE: annot_p.get_covered_text(), KEY_CHILDREN: []}  # string representation
+                cas_content.add_ro(annot_p.begin, annot_p.end)
 
                 for annot_span in view_text_html.select_covered(VALUE_BETWEEN_TAG_TYPE_CLASS, annot_p):
                     if annot_span.tagName == "span":
-                        str_attr = annot_span.value("attributes")
+                        class_atr = get_span_class(annot_span.value("attributes"))
 
-                        # First split inner arguments with values.
-                        # Then only take the values
-                        # We expect the class to be the first value
-                        l_str_attr = str_attr.split("'")
-                        attributes, values = l_str_attr[::2], l_str_attr[1::2]
+                        cas_content.add_fragment(annot_span.begin, annot_span.end, class_atr)
 
-                        class_atr = values[attributes.index("class=")]
+        return cas_content
 
-                        ro_i[KEY_CHILDREN].append(
-                            {KEY_SENTENCE_FRAG_CLASS: class_atr, KEY_VALUE: annot_span.get_covered_text()}
-                        )
+    @classmethod
+    def from_cas_file(cls, path_cas, path_typesystem) -> "CompactCasContent":
+        """See CasContent.from_cas_file"""
 
-                l_ro.append(ro_i)
+        typesystem = get_typesystem(path_typesystem)
 
-        return cls.from_list(l_ro)
+        with open(path_cas, "rb") as f:
+            cas = load_cas_from_xmi(f, typesystem=typesystem)
 
-    @classmethod
-    def from_cas_file(cls, path_cas, path_typesystem):
-        """Build up CasContent from file directly
+        return cls.from_cassis_cas(cas)
 
-        Args:
-            path_cas:
-            path_typesystem:
+    def add_ro(self, begin: int, end: int) -> None:
+        self.ro_begin.append(begin)
+        self.ro_end.append(end)
+        self.ro_children.append(self.ro_children[-1])
 
-        Returns:
-            a list
+    def add_fragment(self, begin: int, end: int, class_: str) -> None:
         """
-        with open(path_typesystem, "rb") as f:
-            typesystem = load_typesystem(f)
+        Add a sentence fragment to the last reporting obligation.
+        """
+        code = self._class_codes.get(class_)
+        if code is None:
+            code = self._class_codes[class_] = len(self.classes)
+            self.classes.append(class_)
 
-        with open(path_cas, "rb") as f:
-            cas = load_cas_from_xmi(f, typesystem=typesystem)
+        self.frag_begin.append(begin)
+        self.frag_end.append(end)
+        self.frag_class.append(code)
+        self.ro_children[-1] += 1
 
-        return cls.from_cassis_cas(cas)
+    def __len__(self):
+        """
+        Number of reporting obligations.
+        """
+        return len(self.ro_begin)
+
+    def get_ro_value(self, i: int) -> str:
+        return self.text[self.ro_begin[i] : self.ro_end[i]]
+
+    def iter_fragments(self, i: int) -> Iterator[Tuple[str, str]]:
+        """
+        The (value, class) of the sentence fragments of the i'th reporting obligation.
+        """
+        text, classes = self.text, self.classes
+
+        for j in range(self.ro_children[i], self.ro_children[i + 1]):
+            yield text[self.frag_begin[j] : self.frag_end[j]], classes[self.frag_class[j]]
+
+    def to_cas_content(self) -> "CasContent":
+        l_ro = []
+        for i in range(len(self)):
+            l_frag = [SentenceFragment({KEY_SENTENCE_FRAG_CLASS: c, KEY_VALUE: v}) for v, c in self.iter_fragments(i)]
+
+            l_ro.append(ROContent({KEY_VALUE: self.get_ro_value(i), KEY_CHILDREN: l_frag}))
+
+        return CasContent({KEY_CHILDREN: l_ro, "meta": self.meta})
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_attributes(str_attr: str) -> Mapping[str, str]:
+    """Parse the HTML attributes of a span, e.g. "class='ARG0' id='ro_1' confidence='0.9'".
+
+    The attribute strings are very repetitive, so they are only parsed once.
+
+    Args:
+        str_attr: attributes of a ValueBetweenTagType annotation.
+
+    Returns:
+        read-only mapping from the attribute names to their values.
+    """
+    d_attr = {}
+    for m in RE_ATTRIBUTE.finditer(str_attr):
+        name, value_single, value_double = m.groups()
+        d_attr[name] = value_single if value_double is None else value_double
+
+    return MappingProxyType(d_attr)
+
+
+@functools.lru_cache(maxsize=4096)
+def get_span_class(str_attr: str) -> str:
+    """Class of a span, from its attributes, see parse_attributes.
+
+    Raises:
+        ValueError: the span has no class.
+    """
+    class_atr = parse_attributes(str_attr).get(ATTRIBUTE_CLASS)
+    if class_atr is None:
+        raise ValueError(f"No class in the attributes of the span: {str_attr!r}")
+
+    return class_atr
 
 
 class ROContent(dict):
@@ -96,6 +266,8 @@ class ROContent(dict):
     List of reporting obligations
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_list(cls, list_sentence_fragments):
         l = []
@@ -110,6 +282,8 @@ class SentenceFragment(dict):
     Dictionary for sentence fragments
     """
 
+    __slots__ = ()
+
     @classmethod
     def from_value_class(cls, v: str, c: str):
         return cls({KEY_SENTENCE_FRAG_CLASS: str(c), KEY_VALUE: str(v)})
@@ -0,0 +1,274 @@
+"""
+Deadlines of the provider methods, and cancellation of calls that are no longer needed.
+
+A provider method can get a deadline, either by default for every method of the provider or per call:
+
+    prov = SPARQLReportingObligationProvider(graph_wrapper, timeout=10.0)
+
+    with deadlines.deadline(2.0):
+        prov.get_filter_entities_from_type_lazy_loading(type_uri, str_match="rep")
+
+Every query gets the time that is left: Fuseki gets it as its `timeout` parameter, such that it stops executing the
+query, and the client as socket timeout. QueryTimeout is raised when the deadline has passed.
+
+Autocomplete calls that are superseded by a newer one, e.g. because the user typed another character, are cancelled:
+
+    superseder = deadlines.Superseder()
+
+    with superseder.latest(f"{session_id}/{type_uri}"):
+        prov.get_filter_entities_from_type_lazy_loading(type_uri, str_match=value)
+
+The older call raises QueryCancelled instead of sending its next query. A query that is already running is aborted by
+the asynchronous client (AsyncSPARQLGraphWrapper closes the connection), the synchronous client can't interrupt it
+and it keeps running until its Fuseki timeout at most.
+"""
+import contextlib
+import contextvars
+import functools
+import math
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# Extra time in seconds for the client, such that the timeout response of Fuseki still arrives.
+CLIENT_TIMEOUT_MARGIN = 1.0
+
+# Deadline of the provider method that is currently running
+_DEADLINE = contextvars.ContextVar("ro_deadline", default=None)
+
+
+class QueryTimeout(TimeoutError):
+    """
+    The deadline of the call has passed.
+    """
+
+
+class QueryCancelled(Exception):
+    """
+    The call was cancelled, e.g. because it was superseded by a newer one.
+    """
+
+
+class Deadline:
+    """
+    Point in time before which a call has to be finished, and whether it was cancelled. Can be shared between threads.
+    """
+
+    def __init__(self, timeout: float = None, parent: "Deadline" = None):
+        """
+
+        Args:
+            timeout: (Optional) time in seconds from now. By default there is no time limit.
+            parent: (Optional) deadline of the surrounding call. Its time limit applies too, and cancelling it
+                cancels this one as well.
+        """
+        self.parent = parent
+
+        self.t_end = math.inf if timeout is None else time.monotonic() + timeout
+        if parent is not None:
+            self.t_end = min(self.t_end, parent.t_end)
+
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+
+    def remaining(self) -> Optional[float]:
+        """
+        Returns:
+            Time left in seconds, None if there is no time limit.
+        """
+        if self.t_end == math.inf:
+            return None
+
+        return max(self.t_end - time.monotonic(), 0.0)
+
+    def is_cancelled(self) -> bool:
+        return self._cancelled.is_set() or (self.parent is not None and self.parent.is_cancelled())
+
+    def check(self) -> None:
+        """Raise if the call shouldn't continue.
+
+        Raises:
+            QueryCancelled: the call was cancelled.
+            QueryTimeout: the deadline has passed.
+        """
+        if self.is_cancelled():
+            raise QueryCancelled()
+
+        if self.remaining() == 0.0:
+            raise QueryTimeout()
+
+    def cancel(self) -> None:
+        """
+        Cancel the call, the callbacks of the queries that are running are called.
+        """
+        with self._lock:
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+
+        for callback in callbacks:
+            callback()
+
+    def add_cancel_callback(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Call a function when the call is cancelled, e.g. to abort a query that is running.
+        Is called right away if it is already cancelled.
+
+        Args:
+            callback: function without arguments. Can be called from another thread.
+
+        Returns:
+            Function to remove the callback again.
+        """
+        l_remove = [] if self.parent is None else [self.parent.add_cancel_callback(callback)]
+
+        with self._lock:
+            b_cancelled = self._cancelled.is_set()
+            if not b_cancelled:
+                self._callbacks.append(callback)
+
+        if b_cancelled:
+            callback()
+
+        def remove():
+            with self._lock:
+                if callback in self._callbacks:
+                    self._callbacks.remove(callback)
+
+            for remove_parent in l_remove:
+                remove_parent()
+
+        return remove
+
+
+def get_current_deadline() -> Optional[Deadline]:
+    """
+    The deadline of the call that is currently running, if any.
+    To be passed to set_current_deadline when its queries are sent from another thread or task.
+    """
+    return _DEADLINE.get()
+
+
+def set_current_deadline(d: Optional[Deadline]) -> None:
+    _DEADLINE.set(d)
+
+
+def get_query_timeouts() -> Optional[Tuple[float, float]]:
+    """Check the current deadline before sending a query, and get its timeouts.
+
+    Returns:
+        (timeout for Fuseki, timeout for the client) in seconds, or None if there is no time limit.
+
+    Raises:
+        QueryCancelled, QueryTimeout: see Deadline.check.
+    """
+    d = get_current_deadline()
+    if d is None:
+        return None
+
+    d.check()
+
+    timeout = d.remaining()
+    if timeout is None:
+        return None
+
+    return timeout, timeout + CLIENT_TIMEOUT_MARGIN
+
+
+@contextlib.contextmanager
+def deadline(timeout: float = None):
+    """Run the calls within the context with a deadline. Within another deadline, the earliest one applies.
+
+    Args:
+        timeout: (Optional) time in seconds. None to only be able to cancel the calls.
+
+    Returns:
+        Context manager with the Deadline.
+    """
+    d = Deadline(timeout, parent=get_current_deadline())
+
+    token = _DEADLINE.set(d)
+    try:
+        yield d
+    finally:
+        _DEADLINE.reset(token)
+
+
+def with_deadline(method):
+    """
+    Decorator for the provider methods, such that they run with the default timeout of the provider (self.timeout).
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        timeout = getattr(self, "timeout", None)
+        if timeout is None:
+            return method(self, *args, **kwargs)
+
+        with deadline(timeout):
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def with_deadline_async(method):
+    """
+    Same as with_deadline, for coroutine functions, e.g. those of the asynchronous provider.
+    """
+
+    @functools.wraps(method)
+    async def wrapper(self, *args, **kwargs):
+        timeout = getattr(self, "timeout", None)
+        if timeout is None:
+            return await method(self, *args, **kwargs)
+
+        with deadline(timeout):
+            return await method(self, *args, **kwargs)
+
+    return wrapper
+
+
+def deadline_methods(cls):
+    """Class decorator that gives all public methods of a class a deadline, see with_deadline."""
+
+    for name, attr in list(vars(cls).items()):
+        if not name.startswith("_") and callable(attr):
+            setattr(cls, name, with_deadline(attr))
+
+    return cls
+
+
+class Superseder:
+    """
+    Keeps track of the latest call per key, e.g. per user and dropdown. Starting a newer call cancels the older one.
+    Can be shared between threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latest: Dict[str, Deadline] = {}
+
+    @contextlib.contextmanager
+    def latest(self, key: str, timeout: float = None):
+        """Run the calls within the context as the latest ones of the key, the older ones are cancelled.
+
+        Args:
+            key: identifies which calls supersede each other.
+            timeout: (Optional) deadline in seconds, see deadline.
+
+        Returns:
+            Context manager with the Deadline.
+        """
+        with deadline(timeout) as d:
+            with self._lock:
+                d_previous = self._latest.get(key)
+                self._latest[key] = d
+
+            if d_previous is not None:
+                d_previous.cancel()
+
+            try:
+                yield d
+            finally:
+                with self._lock:
+                    if self._latest.get(key) is d:
+                        del self._latest[key]
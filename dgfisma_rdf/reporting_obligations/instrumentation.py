@@ -0,0 +1,298 @@
+"""
+Instrumentation of the queries to the RDF.
+
+Every query of a GraphWrapper is recorded as a QueryRecord: the provider method that sent it, a hash of the query,
+the number of rows and bytes, and the time spent on the network, on decoding the response and on post-processing
+by the provider method. Records are passed to the hooks that are installed, e.g.:
+
+    instrumentation.add_hook(instrumentation.SlowQueryLogger(threshold=1.0))
+    instrumentation.add_hook(instrumentation.PrometheusQueryMetrics())
+
+Without hooks, nothing is recorded.
+"""
+import abc
+import contextlib
+import contextvars
+import functools
+import hashlib
+import logging
+import re
+import time
+from typing import List
+
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram
+
+# Buckets of the duration histograms in seconds, up to a minute.
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+logger = logging.getLogger(__name__)
+
+# Installed hooks, see add_hook
+_HOOKS = []
+
+# Provider method that is currently running
+_CALL = contextvars.ContextVar("ro_instrumented_call", default=None)
+
+
+class QueryRecord:
+    """
+    Statistics of a single query. Times are in seconds.
+    """
+
+    __slots__ = ("method", "query", "query_hash", "n_rows", "n_bytes", "t_network", "t_decode", "t_post")
+
+    def __init__(self, method, query, n_rows, n_bytes, t_network, t_decode, t_post=0.0):
+        self.method = method
+        self.query = query
+        self.query_hash = get_query_hash(query)
+        self.n_rows = n_rows
+        self.n_bytes = n_bytes
+        self.t_network = t_network
+        self.t_decode = t_decode
+        self.t_post = t_post
+
+    @property
+    def t_total(self) -> float:
+        return self.t_network + self.t_decode + self.t_post
+
+    def __repr__(self):
+        return (
+            f"QueryRecord(method={self.method}, query_hash={self.query_hash}, n_rows={self.n_rows}, "
+            f"n_bytes={self.n_bytes}, t_network={self.t_network:.4f}, t_decode={self.t_decode:.4f}, "
+            f"t_post={self.t_post:.4f})"
+        )
+
+
+class QueryHook(abc.ABC):
+    """
+    Receives the statistics of every query.
+    """
+
+    @abc.abstractmethod
+    def on_query(self, record: QueryRecord) -> None:
+        pass
+
+
+class SlowQueryLogger(QueryHook):
+    """
+    Logs the queries that take longer than a threshold, together with the query itself.
+    """
+
+    def __init__(self, threshold: float = 1.0, logger: logging.Logger = logger, level=logging.WARNING):
+        """
+
+        Args:
+            threshold: in seconds.
+            logger: (Optional) logger to log to.
+            level: (Optional) log level.
+        """
+        self.threshold = threshold
+        self.logger = logger
+        self.level = level
+
+    def on_query(self, record: QueryRecord) -> None:
+        if record.t_total < self.threshold:
+            return
+
+        self.logger.log(
+            self.level,
+            f"Slow query {record.query_hash} from {record.method}: {record.t_total:.3f} s "
+            f"(network {record.t_network:.3f} s, decode {record.t_decode:.3f} s, post {record.t_post:.3f} s), "
+            f"{record.n_rows} rows, {record.n_bytes} bytes\n{record.query}",
+        )
+
+
+class PrometheusQueryMetrics(QueryHook):
+    """
+    Prometheus counters and histograms per provider method, see prometheus_client.generate_latest to expose them.
+    Is created once per registry, the metrics can't be registered twice.
+    """
+
+    STAGES = ("network", "decode", "post")
+
+    def __init__(self, registry: CollectorRegistry = REGISTRY, buckets=DEFAULT_BUCKETS):
+        self.queries = Counter("ro_sparql_queries_total", "Number of SPARQL queries.", ("method",), registry=registry)
+        self.rows = Counter("ro_sparql_rows_total", "Number of rows returned.", ("method",), registry=registry)
+        self.bytes = Counter("ro_sparql_response_bytes_total", "Size of the responses.", ("method",), registry=registry)
+        self.duration = Histogram(
+            "ro_sparql_query_seconds",
+            "Duration of the SPARQL queries.",
+            ("method",),
+            registry=registry,
+            buckets=buckets,
+        )
+        self.duration_stage = Histogram(
+            "ro_sparql_query_stage_seconds",
+            "Duration per stage of the SPARQL queries.",
+            ("method", "stage"),
+            registry=registry,
+            buckets=buckets,
+        )
+
+    def on_query(self, record: QueryRecord) -> None:
+        method = record.method or ""
+
+        self.queries.labels(method=method).inc()
+        self.rows.labels(method=method).inc(record.n_rows)
+        self.bytes.labels(method=method).inc(record.n_bytes)
+        self.duration.labels(method=method).observe(record.t_total)
+
+        for stage, t in zip(self.STAGES, (record.t_network, record.t_decode, record.t_post)):
+            self.duration_stage.labels(method=method, stage=stage).observe(t)
+
+
+def add_hook(hook: QueryHook) -> QueryHook:
+    """Start passing the query records to a hook.
+
+    Returns:
+        the hook, to be able to remove it again.
+    """
+    _HOOKS.append(hook)
+    return hook
+
+
+def remove_hook(hook: QueryHook) -> None:
+    _HOOKS.remove(hook)
+
+
+def is_enabled() -> bool:
+    return bool(_HOOKS)
+
+
+def get_query_hash(q: str) -> str:
+    """
+    Short hash of a query, that ignores differences in whitespace.
+    """
+    return hashlib.sha1(re.sub(r"\s+", " ", q).strip().encode("utf-8")).hexdigest()[:12]
+
+
+def record_query(q: str, n_rows: int, n_bytes: int, t_network: float, t_decode: float) -> None:
+    """To be called by the GraphWrappers after every query.
+
+    Args:
+        q: query.
+        n_rows: number of rows returned.
+        n_bytes: size of the response.
+        t_network: time until the response was received.
+        t_decode: time to decode the response into rows.
+
+    Returns:
+        None
+    """
+    if not _HOOKS:
+        return
+
+    call = _CALL.get()
+
+    record = QueryRecord(call.name if call else None, q, n_rows, n_bytes, t_network, t_decode)
+
+    if call is None:
+        _emit([record])
+    else:
+        call.records.append(record)
+
+
+class _Call:
+    __slots__ = ("name", "records", "t_nested")
+
+    def __init__(self, name):
+        self.name = name
+        self.records = []
+        self.t_nested = 0.0
+
+
+def traced(method):
+    """Decorator for the provider methods, such that their queries are recorded with the name of the method.
+
+    The time of the method that is not spent on its queries (or on other traced methods) is the post-processing time.
+    When a method sends more than one query, it is divided equally over them.
+    """
+
+    name = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if not _HOOKS:
+            return method(*args, **kwargs)
+
+        with _trace(name):
+            return method(*args, **kwargs)
+
+    return wrapper
+
+
+def traced_async(method):
+    """
+    Same as traced, for coroutine functions, e.g. those of the asynchronous provider.
+    """
+
+    name = method.__name__
+
+    @functools.wraps(method)
+    async def wrapper(*args, **kwargs):
+        if not _HOOKS:
+            return await method(*args, **kwargs)
+
+        with _trace(name):
+            return await method(*args, **kwargs)
+
+    return wrapper
+
+
+@contextlib.contextmanager
+def _trace(name):
+    """
+    Record the queries within the context with the method name, see traced.
+    """
+    parent = _CALL.get()
+    call = _Call(name)
+    token = _CALL.set(call)
+
+    t0 = time.perf_counter()
+    try:
+        yield call
+    finally:
+        t_total = time.perf_counter() - t0
+        _CALL.reset(token)
+
+        if parent is not None:
+            parent.t_nested += t_total
+
+        if call.records:
+            t_queries = sum(r.t_network + r.t_decode for r in call.records)
+            t_post = max(t_total - t_queries - call.t_nested, 0.0) / len(call.records)
+            for record in call.records:
+                record.t_post = t_post
+
+            _emit(call.records)
+
+
+def instrument_methods(cls):
+    """Class decorator that traces all public methods of a class, see traced."""
+
+    for name, attr in list(vars(cls).items()):
+        if not name.startswith("_") and callable(attr):
+            setattr(cls, name, traced(attr))
+
+    return cls
+
+
+def get_current_call():
+    """
+    The traced method that is currently running, if any.
+    To be passed to set_current_call when its queries are sent from another thread or task.
+    """
+    return _CALL.get()
+
+
+def set_current_call(call) -> None:
+    _CALL.set(call)
+
+
+def _emit(records: List[QueryRecord]) -> None:
+    for hook in list(_HOOKS):
+        for record in records:
+            try:
+                hook.on_query(record)
+            except Exception as e:
+                logger.warning(f"Query hook {hook} failed: {e}")
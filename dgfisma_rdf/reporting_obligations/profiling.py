@@ -0,0 +1,130 @@
+"""
+Opt-in profiling of the hot paths with cProfile.
+
+Is configured with environment variables, that are read at import:
+    RO_PROFILE:
+        ""/"0" (default): off. The profiled functions are left untouched, so there is no overhead at all.
+        "request": only when requested, e.g. per request to the API with the X-RO-Profile header, see requested.
+        "all"/"1": every call of a profiled function.
+    RO_PROFILE_DIR: directory to save the profiles to. Default: <tmp>/ro_profiles
+
+Every profiled call is saved as a .prof file (pstats), that can be turned into a flamegraph with e.g.
+`flameprof <file>.prof > flamegraph.svg` or inspected with `snakeviz <file>.prof`.
+When profiled functions call each other, only the outermost call is saved.
+"""
+import contextlib
+import contextvars
+import cProfile
+import functools
+import itertools
+import logging
+import os
+import tempfile
+import time
+
+OFF = "off"
+REQUEST = "request"
+ALL = "all"
+
+HEADER = "X-RO-Profile"
+
+logger = logging.getLogger(__name__)
+
+
+def _get_mode(value: str) -> str:
+    value = (value or "").strip().lower()
+
+    if value in ("", "0", "false", "no", OFF):
+        return OFF
+    if value == REQUEST:
+        return REQUEST
+    if value in ("1", "true", "yes", ALL):
+        return ALL
+
+    logger.warning(f"Unknown value for RO_PROFILE: {value}. Profiling is turned off.")
+    return OFF
+
+
+MODE = _get_mode(os.environ.get("RO_PROFILE"))
+PROFILE_DIR = os.environ.get("RO_PROFILE_DIR") or os.path.join(tempfile.gettempdir(), "ro_profiles")
+
+# Profiling is requested for the current request/context.
+_REQUESTED = contextvars.ContextVar("ro_profile_requested", default=False)
+# A profiled function is already running (and being profiled).
+_RUNNING = contextvars.ContextVar("ro_profile_running", default=False)
+
+_COUNTER = itertools.count()
+
+
+@contextlib.contextmanager
+def requested():
+    """
+    Profile the profiled functions that are called within this context. Only has effect in the REQUEST mode.
+    """
+    token = _REQUESTED.set(True)
+    try:
+        yield
+    finally:
+        _REQUESTED.reset(token)
+
+
+def profiled(func=None, *, name: str = None):
+    """Decorator to profile a function, see the module documentation.
+
+    Args:
+        func: function to profile.
+        name: (Optional) name to use in the filename. By default the qualified name of the function.
+
+    Returns:
+        the function itself when profiling is off, else a wrapper.
+    """
+    if func is None:
+        return functools.partial(profiled, name=name)
+
+    if MODE == OFF:
+        return func
+
+    name = name or func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _RUNNING.get() or not (MODE == ALL or _REQUESTED.get()):
+            return func(*args, **kwargs)
+
+        token = _RUNNING.set(True)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(func, *args, **kwargs)
+        finally:
+            _RUNNING.reset(token)
+            _save(profile, name)
+
+    return wrapper
+
+
+def profile_methods(cls):
+    """Class decorator that profiles all public methods of a class, see profiled."""
+
+    if MODE == OFF:
+        return cls
+
+    for name, attr in list(vars(cls).items()):
+        if not name.startswith("_") and callable(attr):
+            setattr(cls, name, profiled(attr, name=f"{cls.__name__}.{name}"))
+
+    return cls
+
+
+def _save(profile: cProfile.Profile, name: str) -> None:
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}_{os.getpid()}_{next(_COUNTER):06d}_{name}.prof"
+        path = os.path.join(PROFILE_DIR, filename)
+
+        profile.dump_stats(path)
+
+        logger.info(f"Profile of {name} saved to {path}")
+
+    except Exception as e:
+        logger.warning(f"Could not save the profile of {name}: {e}")
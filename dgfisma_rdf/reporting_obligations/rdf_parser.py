@@ -1,15 +1,21 @@
 import abc
+import contextvars
+import json
 import logging
+import math
+import socket
+import threading
+import time
+import urllib.error
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable, List, Tuple, Dict, Union
 
 import rdflib
 from SPARQLWrapper import SPARQLWrapper, JSON
 from rdflib import Literal, BNode, URIRef
 
-from . import build_rdf
-
-B_LOG_QUERIES = False
+from . import build_rdf, deadlines, instrumentation, profiling, statistics
 
 CONTAINS = "contains"
 STARTS_WITH = "starts with"
@@ -20,6 +26,33 @@ PRED = "pred"
 COUNT = "count"
 QUERY = "query"
 URIS = "uris"
+# Keys of the details of a reporting obligation, see get_ro_details
+RO_ID = "ro_id"
+RO_VALUE = "value"
+DOC = "doc"
+DOC_SRC = "doc_src"
+ENTITIES = "entities"
+
+# Maximum number of queries that are sent to the endpoint at the same time, by all providers of the process together.
+MAX_CONCURRENT_QUERIES = 8
+
+# Shared by all providers, see get_query_executor.
+_query_executor = None
+_query_executor_lock = threading.Lock()
+
+
+def get_query_executor() -> ThreadPoolExecutor:
+    """
+    Worker threads to send concurrent queries with, e.g. see get_filter_entities_from_types.
+    Is shared by all callers, such that the endpoint never gets more than MAX_CONCURRENT_QUERIES of them at once.
+    """
+    global _query_executor
+
+    with _query_executor_lock:
+        if _query_executor is None:
+            _query_executor = ThreadPoolExecutor(MAX_CONCURRENT_QUERIES, thread_name_prefix="ro_query")
+
+        return _query_executor
 
 
 class GraphWrapper(abc.ABC):
@@ -59,18 +92,25 @@ class GraphWrapper(abc.ABC):
 class RDFLibGraphWrapper(GraphWrapper):
     def __init__(self, path_rdf):
         super(RDFLibGraphWrapper, self).__init__()
-        g = rdflib.Graph()
-        g.parse(path_rdf)
+
+        fmt = rdflib.util.guess_format(path_rdf) if isinstance(path_rdf, str) else None
+        # With named graphs (e.g. a graph per document), the default graph is the union of all graphs.
+        g = rdflib.ConjunctiveGraph() if fmt in ("nquads", "trig") else rdflib.Graph()
+        g.parse(path_rdf, format=fmt)
 
         self.g = g
 
+        # Parsing of SPARQL queries by RDFLib is not thread-safe.
+        self._lock = threading.Lock()
+
     def query(self, q) -> List[Dict[str, Union[Literal, URIRef, BNode]]]:
 
         # TODO Order by not working when using group
         if ("group by" in q.lower()) or ("groupby" in q.lower()):
             # This removes the sorting part, hacky fix, but it works.
-            i_order_by = max(q.lower().find("order by"), q.lower().find("orderby"))
-            if i_order_by > 0:
+            # Only the final ORDER BY, the ones within subqueries are followed by a closing bracket.
+            i_order_by = max(q.lower().rfind("order by"), q.lower().rfind("orderby"))
+            if i_order_by > 0 and "}" not in q[i_order_by:]:
                 q = q[:i_order_by]
 
         def get_identifier_dict(v):
@@ -88,32 +128,100 @@ class RDFLibGraphWrapper(GraphWrapper):
             except AttributeError as e:
                 pass
             else:
-                d_i["xml:lang"] = lang
+                if lang:
+                    d["xml:lang"] = lang
 
             return d
 
-        qres = self.g.query(q)
+        t0 = time.perf_counter()
+
+        with self._lock:
+            qres = self.g.query(q)
+            rows = list(qres)
+
+        t1 = time.perf_counter()
 
         l = []
-        for l_i in qres:
+        for l_i in rows:
             d_i = {}
             for k, v in zip(qres.vars, l_i):
                 d_i[str(k)] = get_identifier_dict(v) if v else None
 
             l.append(d_i)
 
+        instrumentation.record_query(q, len(l), 0, t1 - t0, time.perf_counter() - t1)
+
         return l
 
 
 class SPARQLGraphWrapper(GraphWrapper):
-    def __init__(self, endpoint):
-        self.sparql = SPARQLWrapper(endpoint)
-        self.sparql.setReturnFormat(JSON)
+    def __init__(self, endpoint, default_graph: str = None):
+        """
+
+        Args:
+            endpoint: URL to the (Fuseki) SPARQL query endpoint.
+            default_graph: (Optional) URI of the graph to query, e.g. build_rdf.UNION_GRAPH when every document has its
+                own named graph. By default the default graph of the endpoint.
+        """
+        self.endpoint = endpoint
+        self.default_graph = default_graph
+
+        self._local = threading.local()
+
+    @property
+    def sparql(self) -> SPARQLWrapper:
+        """
+        SPARQLWrapper keeps the query as state, so every thread gets its own.
+        """
+        try:
+            return self._local.sparql
+        except AttributeError:
+            sparql = SPARQLWrapper(self.endpoint)
+            sparql.setReturnFormat(JSON)
+            if self.default_graph:
+                sparql.addDefaultGraph(self.default_graph)
+
+            self._local.sparql = sparql
+
+            return sparql
 
     def query(self, q: str) -> Iterable[Dict[str, Dict[str, str]]]:
-        self.sparql.setQuery(q)
-        ret = self.sparql.query()
-        results = ret.convert()
+        # Time left for the query, see deadlines.
+        timeouts = deadlines.get_query_timeouts()
+
+        t0 = time.perf_counter()
+
+        sparql = self.sparql
+        sparql.setQuery(q)
+
+        sparql.clearParameter("timeout")
+        if timeouts is None:
+            sparql.timeout = None
+        else:
+            timeout_fuseki, timeout_client = timeouts
+            sparql.addParameter("timeout", f"{timeout_fuseki:.3f}")
+            # Can only be whole seconds.
+            sparql.setTimeout(math.ceil(timeout_client))
+
+        try:
+            ret = sparql.query()
+            content = ret.response.read()
+        except socket.timeout as e:
+            raise deadlines.QueryTimeout(f"No response from {self.endpoint} in time.") from e
+        except urllib.error.HTTPError as e:
+            # Fuseki answers 503 when the query timed out.
+            if timeouts is not None and e.code == 503:
+                raise deadlines.QueryTimeout(f"Query timed out on {self.endpoint}.") from e
+            raise
+        except urllib.error.URLError as e:
+            if isinstance(e.reason, socket.timeout):
+                raise deadlines.QueryTimeout(f"No response from {self.endpoint} in time.") from e
+            raise
+
+        t1 = time.perf_counter()
+
+        # Same as ret.convert(), but we need the size of the response.
+        results = json.loads(content.decode("utf-8"))
 
         vars = results["head"]["vars"]
 
@@ -128,14 +236,38 @@ class SPARQLGraphWrapper(GraphWrapper):
             l_i = {k_j: binding_i.get(k_j, None) for k_j in vars}
             l.append(l_i)
 
+        instrumentation.record_query(q, len(l), len(content), t1 - t0, time.perf_counter() - t1)
+
         return l
 
 
+@profiling.profile_methods
+@instrumentation.instrument_methods
+@deadlines.deadline_methods
 class SPARQLReportingObligationProvider:
-    def __init__(self, graph_wrapper: GraphWrapper):
+    def __init__(self, graph_wrapper: GraphWrapper, timeout: float = None):
+        """
+
+        Args:
+            graph_wrapper: RDF to query.
+            timeout: (Optional) deadline in seconds of every method call, see deadlines. By default there is none.
+        """
         self.graph_wrapper = graph_wrapper
+        self.timeout = timeout
+
+        # Cached, see get_dataset_statistics.
+        self.dataset_statistics = statistics.DatasetStatistics(graph_wrapper)
 
     def get_different_entity_types(self):
+        q, parse = self._get_q_different_entity_types()
+
+        return parse(list(self.graph_wrapper.query(q)))
+
+    def _get_q_different_entity_types(self):
+        """Query of get_different_entity_types and the function that processes its results.
+        Shared with the asynchronous provider, which sends the query itself, see rdf_parser_async.
+        """
+
         q = f"""
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
             PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
@@ -153,18 +285,19 @@ class SPARQLReportingObligationProvider:
             }}
         """
 
-        l = list(self.graph_wrapper.query(q))
+        def parse(l):
+            if len(l) == 0:
+                raise ValueError(
+                    "No entity types were found.\n"
+                    "RDF has not been initialized yet.\n"
+                    "See technical documentation for more information"
+                )
 
-        if len(l) == 0:
-            raise ValueError(
-                "No entity types were found.\n"
-                "RDF has not been initialized yet.\n"
-                "See technical documentation for more information"
-            )
+            l_entity_predicates = self.graph_wrapper.get_column(l, "pred")
 
-        l_entity_predicates = self.graph_wrapper.get_column(l, "pred")
+            return l_entity_predicates
 
-        return l_entity_predicates
+        return q, parse
 
     def get_all_from_type(self, type_uri, distinct=True) -> List[str]:
         """
@@ -191,7 +324,7 @@ class SPARQLReportingObligationProvider:
                 ?ent skos:prefLabel ?{VALUE}
     
                 BIND (LCASE(?{VALUE}) AS ?value_ent_lower)
-                BIND (REPLACE(REPLACE(?value_ent_lower,'[^a-zA-Z\\\\s]+', ''), '^[ \\t]+|[ \\t]+$','') AS ?special_sort)          
+                {self._get_q_sort_key()}
 
             }}
           
@@ -316,9 +449,6 @@ class SPARQLReportingObligationProvider:
             }}
         """
 
-        if B_LOG_QUERIES:
-            logging.info(q)
-
         l = self.graph_wrapper.query(q)
 
         l_ro = self.graph_wrapper.get_column(l, "value")
@@ -397,9 +527,6 @@ class SPARQLReportingObligationProvider:
         if offset:
             q += f"""OFFSET {offset}"""
 
-        if B_LOG_QUERIES:
-            logging.info(q)
-
         l = self.graph_wrapper.query(q)
 
         l_ro_id = self.graph_wrapper.get_column(l, "ro_id")
@@ -408,6 +535,83 @@ class SPARQLReportingObligationProvider:
 
         return r
 
+    def get_ro_details(self, l_ro_uri: List[str]) -> List[Dict[str, Union[str, List[Dict[str, str]]]]]:
+        """Retrieve everything that is shown about a page of reporting obligations, within a single query.
+
+        Args:
+            l_ro_uri: URI's of the reporting obligations, e.g. from get_filter_ro_id_multiple.
+
+        Returns:
+            List with the details of each reporting obligation, in the same order as l_ro_uri:
+            {RO_ID: URI,
+             RO_VALUE: text of the reporting obligation,
+             DOC: URI of the catalogue document or None,
+             DOC_SRC: URI of the document source or None,
+             ENTITIES: [{PRED: <hasEntity> predicate URI, VALUE: label}, ...]}
+            Unknown URI's are left out.
+        """
+
+        if not l_ro_uri:
+            return []
+
+        LABEL = "label"
+        ENT = "ent"
+
+        # The document and the entities are retrieved in separate branches of a UNION,
+        # to not get all combinations of document sources and entities.
+        q = f"""
+            PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+
+            SELECT ?{RO_ID} ?{RO_VALUE} ?{DOC} ?{DOC_SRC} ?{PRED} ?{LABEL}
+
+            WHERE {{
+                VALUES ?{RO_ID} {{ {' '.join(map(lambda s: URIRef(s).n3(), l_ro_uri))} }}
+
+                ?{RO_ID} rdf:type {build_rdf.ROGraph.class_rep_obl.n3()} ;
+                    rdf:value ?{RO_VALUE} .
+
+                {{
+                    ?{DOC} {build_rdf.ROGraph.prop_has_rep_obl.n3()} ?{RO_ID} .
+
+                    OPTIONAL {{
+                        ?{DOC} {build_rdf.ROGraph.prop_has_doc_src.n3()} ?{DOC_SRC} .
+                    }}
+                }}
+                UNION
+                {{
+                    ?{RO_ID} ?{PRED} ?{ENT} .
+                    ?{ENT} skos:prefLabel ?{LABEL} .
+                }}
+            }}
+        """
+
+        def get_val(row, k):
+            v = row.get(k)
+            return None if v is None else v.get("value")
+
+        d_ro = {}
+        for row in self.graph_wrapper.query(q):
+            ro_id = get_val(row, RO_ID)
+
+            d_ro_i = d_ro.setdefault(
+                ro_id, {RO_ID: ro_id, RO_VALUE: get_val(row, RO_VALUE), DOC: None, DOC_SRC: None, ENTITIES: []}
+            )
+
+            if row.get(DOC) is not None:
+                d_ro_i[DOC] = d_ro_i[DOC] or get_val(row, DOC)
+                d_ro_i[DOC_SRC] = d_ro_i[DOC_SRC] or get_val(row, DOC_SRC)
+
+            if row.get(LABEL) is not None:
+                d_ent = {PRED: get_val(row, PRED), VALUE: get_val(row, LABEL)}
+                if d_ent not in d_ro_i[ENTITIES]:
+                    d_ro_i[ENTITIES].append(d_ent)
+
+        for d_ro_i in d_ro.values():
+            d_ro_i[ENTITIES].sort(key=lambda d_ent: (d_ent[PRED], d_ent[VALUE]))
+
+        return [d_ro[str(ro_uri)] for ro_uri in l_ro_uri if str(ro_uri) in d_ro]
+
     def get_entities(self, distinct=True):
         """Trying to speed up get_filter_entities without filters.
 
@@ -466,6 +670,16 @@ class SPARQLReportingObligationProvider:
 
         """
 
+        q, parse = self._get_q_filter_entities(list_pred_value, distinct=distinct, exact_match=exact_match)
+
+        return parse(list(self.graph_wrapper.query(q)))
+
+    def _get_q_filter_entities(self, list_pred_value: List[Tuple[str]] = [], distinct=True, exact_match: bool = False):
+        """
+        Query of get_filter_entities and the function that processes its results,
+        see _get_q_different_entity_types.
+        """
+
         VALUE = "value_ent"
         PRED = "pred"
         COUNT = "count"
@@ -501,17 +715,171 @@ class SPARQLReportingObligationProvider:
 
         """
 
-        l = list(self.graph_wrapper.query(q))
+        def parse(l):
+            d_filtered_ents = {}
+            for l_i in l:
+                ent_i = l_i.get(PRED).get("value")
 
-        d_filtered_ents = {}
-        for l_i in l:
-            ent_i = l_i.get(PRED).get("value")
+                d_filtered_ents.setdefault(ent_i, []).append(
+                    {VALUE: l_i.get(VALUE).get("value"), COUNT: l_i.get(COUNT).get("value")}
+                )
 
-            d_filtered_ents.setdefault(ent_i, []).append(
-                {VALUE: l_i.get(VALUE).get("value"), COUNT: l_i.get(COUNT).get("value")}
-            )
+            return d_filtered_ents
 
-        return d_filtered_ents
+        return q, parse
+
+    def get_filter_entities_top(
+            self,
+            limit: int = 50,
+            d_limit: Dict[str, int] = None,
+            str_match: str = "",
+            type_match=STARTS_WITH,
+            list_pred_value: List[Tuple[str]] = [],
+            exact_match: bool = False,
+            order_by=COUNT,
+    ) -> Dict[str, List[Dict[str, str]]]:
+        """Same as get_filter_entities, but only the top entities per type are returned, in a single query.
+
+        Each entity type gets its own subquery with a LIMIT, such that the endpoint only returns what is displayed.
+
+        Args:
+            limit: maximum number of entities per type.
+            d_limit: (Optional) limit per <hasEntity> predicate URI, overrides limit. Types with a limit of 0 are skipped.
+            str_match: (Optional) the string the entities have to match with.
+            type_match: rdf_parser.CONTAINS or rdf_parser.STARTS_WITH
+            list_pred_value: Filters to apply similar to get_filter_ro_id_multiple.
+            exact_match: exact match for the list_pred_value filters.
+            order_by: rdf_parser.COUNT for the most common entities first, rdf_parser.VALUE for alphabetical.
+
+        Returns:
+            Dictionary with per <hasEntity> predicate URI a list of {VALUE: label, COUNT: number of RO's}
+        """
+
+        q, parse = self._get_q_filter_entities_top(
+            limit=limit,
+            d_limit=d_limit,
+            str_match=str_match,
+            type_match=type_match,
+            list_pred_value=list_pred_value,
+            exact_match=exact_match,
+            order_by=order_by,
+        )
+        if q is None:
+            return parse([])
+
+        return parse(list(self.graph_wrapper.query(q)))
+
+    def _get_q_filter_entities_top(
+            self,
+            limit: int = 50,
+            d_limit: Dict[str, int] = None,
+            str_match: str = "",
+            type_match=STARTS_WITH,
+            list_pred_value: List[Tuple[str]] = [],
+            exact_match: bool = False,
+            order_by=COUNT,
+    ):
+        """
+        Query of get_filter_entities_top and the function that processes its results,
+        see _get_q_different_entity_types.
+        """
+
+        if order_by not in (COUNT, VALUE):
+            raise ValueError(f"Unknown value for order_by: {order_by}. Expected {COUNT} or {VALUE}.")
+
+        starts_with_options = [CONTAINS, STARTS_WITH]
+
+        str_match = str_match.strip()
+
+        if str_match == "":
+            q_filter_entity = ""
+        elif type_match == CONTAINS:
+            q_filter_entity = f"FILTER CONTAINS(LCASE(?{VALUE}), LCASE({Literal(str_match).n3()}))"
+        elif type_match == STARTS_WITH:
+            q_filter_entity = f"FILTER STRSTARTS(LCASE(?{VALUE}), LCASE({Literal(str_match).n3()}))"
+        else:
+            raise ValueError(f"Unknown value for {type_match}. Expected a value from {starts_with_options}).")
+
+        q_filter = self._get_q_filter(list_pred_value, exact_match=exact_match)
+
+        # Same order of the values as the dropdowns, see _get_q_filter_entities_from_type_lazy_loading.
+        q_order_value = f"ASC(str(?sort_key) = '') (?sort_key) LCASE(?{VALUE})"
+        q_order = f"DESC(?{COUNT}) {q_order_value}" if order_by == COUNT else f"{q_order_value} DESC(?{COUNT})"
+
+        d_limit = {} if d_limit is None else {str(k): v for k, v in d_limit.items()}
+
+        d_limit_has = {}
+        for has_i, _ in build_rdf.D_ENTITIES.values():
+            limit_i = d_limit.get(str(has_i), limit)
+            if limit_i:
+                d_limit_has[has_i] = limit_i
+
+        if not d_limit_has:
+            return None, lambda l: {}
+
+        def get_q_sub(has_i, limit_i):
+            return f"""
+            {{
+                {{
+                    SELECT ?{VALUE} (count(?ro_id) as ?{COUNT}) (MIN(?special_sort) as ?sort_key)
+                    WHERE {{
+                        ?ro_id rdf:type {build_rdf.ROGraph.class_rep_obl.n3()} ;
+                            {has_i.n3()} ?ent .
+                        ?ent skos:prefLabel ?{VALUE} .
+
+                        BIND (LCASE(?{VALUE}) AS ?value_ent_lower)
+                        {self._get_q_sort_key()}
+
+                        {q_filter_entity}
+
+                        {q_filter}
+                    }}
+                    GROUP BY ?{VALUE}
+                    ORDER BY {q_order} (?{VALUE})
+                    LIMIT {int(limit_i)}
+                }}
+                BIND ({has_i.n3()} AS ?{PRED})
+            }}
+            """
+
+        q = f"""
+            PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+            PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+
+            SELECT ?{PRED} ?{VALUE} ?{COUNT} ?sort_key
+
+            WHERE {{
+                {' UNION '.join(get_q_sub(has_i, limit_i) for has_i, limit_i in d_limit_has.items())}
+            }}
+        """
+
+        def parse(l):
+            d_sorted = {}
+            for l_i in l:
+                # Some endpoints return a single empty row for a type without matches.
+                if l_i.get(VALUE) is None:
+                    continue
+
+                has_type_i = l_i.get(PRED).get("value")
+                value_i = l_i.get(VALUE).get("value")
+                count_i = int(l_i.get(COUNT).get("value"))
+                sort_key_i = (l_i.get("sort_key") or {}).get("value", "")
+
+                # Same order as the query, see q_order.
+                key_value = (sort_key_i == "", sort_key_i, value_i.lower())
+                key = (-count_i,) + key_value if order_by == COUNT else key_value + (-count_i,)
+
+                d_sorted.setdefault(has_type_i, []).append(
+                    (key + (value_i,), {VALUE: value_i, COUNT: l_i.get(COUNT).get("value")})
+                )
+
+            # The order of a UNION is not guaranteed, so sort again per type.
+            return {
+                has_type_i: [d_ent for _, d_ent in sorted(l_ent, key=lambda x: x[0])]
+                for has_type_i, l_ent in d_sorted.items()
+            }
+
+        return q, parse
 
     def get_filter_entities_from_type(
             self, type_uri, list_pred_value: List[Tuple[str]] = [], distinct=True, exact_match: bool = False
@@ -527,6 +895,20 @@ class SPARQLReportingObligationProvider:
 
         """
 
+        q, parse = self._get_q_filter_entities_from_type(
+            type_uri, list_pred_value, distinct=distinct, exact_match=exact_match
+        )
+
+        return parse(list(self.graph_wrapper.query(q)))
+
+    def _get_q_filter_entities_from_type(
+            self, type_uri, list_pred_value: List[Tuple[str]] = [], distinct=True, exact_match: bool = False
+    ):
+        """
+        Query of get_filter_entities_from_type and the function that processes its results,
+        see _get_q_different_entity_types.
+        """
+
         VALUE = "value_ent"
 
         q_filter = self._get_q_filter(list_pred_value, exact_match=exact_match)
@@ -552,10 +934,12 @@ class SPARQLReportingObligationProvider:
 
           """
 
-        l = list(self.graph_wrapper.query(q))
-        l_values = self.graph_wrapper.get_column(l, VALUE)
+        def parse(l):
+            l_values = self.graph_wrapper.get_column(l, VALUE)
 
-        return l_values
+            return l_values
+
+        return q, parse
 
     def get_filter_entities_from_type_lazy_loading(
             self,
@@ -581,6 +965,35 @@ class SPARQLReportingObligationProvider:
             List of strings with the labels of the entities.
         """
 
+        q, parse = self._get_q_filter_entities_from_type_lazy_loading(
+            uri_type_has,
+            str_match=str_match,
+            type_match=type_match,
+            list_pred_value=list_pred_value,
+            l_doc_uri=l_doc_uri,
+            doc_src=doc_src,
+            exact_match=exact_match,
+            limit=limit,
+        )
+
+        return parse(list(self.graph_wrapper.query(q)))
+
+    def _get_q_filter_entities_from_type_lazy_loading(
+            self,
+            uri_type_has,
+            str_match: str = "",
+            type_match=CONTAINS,
+            list_pred_value: List[Tuple[str]] = [],
+            l_doc_uri: List[str] = None,
+            doc_src: str = None,
+            exact_match=False,
+            limit: int = 0,
+    ):
+        """
+        Query of get_filter_entities_from_type_lazy_loading and the function that processes its results,
+        see _get_q_different_entity_types.
+        """
+
         VALUE = "value_ent"
         RO = "RO"
 
@@ -641,7 +1054,7 @@ class SPARQLReportingObligationProvider:
             ?ent skos:prefLabel ?{VALUE} .
             
             BIND (LCASE(?{VALUE}) AS ?value_ent_lower)
-            BIND (REPLACE(REPLACE(?value_ent_lower,'[^a-zA-Z\\\\s]+', ''), '^[ \\t]+|[ \\t]+$','') AS ?special_sort)          
+            {self._get_q_sort_key()}
 
             {q_filter}
         
@@ -663,10 +1076,52 @@ class SPARQLReportingObligationProvider:
         if 0:
             print(q)
 
-        l = list(self.graph_wrapper.query(q))
-        l_values = self.graph_wrapper.get_column(l, VALUE)
+        def parse(l):
+            l_values = self.graph_wrapper.get_column(l, VALUE)
 
-        return l_values
+            return l_values
+
+        return q, parse
+
+    def get_filter_entities_from_types(
+            self,
+            l_type_uri: List[str] = None,
+            max_concurrent: int = MAX_CONCURRENT_QUERIES,
+            **kwargs,
+    ) -> Dict[str, List[str]]:
+        """Filter the entities for several entity types at once, e.g. to refresh all dropdowns.
+
+        The queries per entity type are sent concurrently, so the total time is close to that of the slowest type.
+        They share the worker threads of get_query_executor with all other calls.
+
+        Args:
+            l_type_uri: The URI's of the <hasEntity> predicate types. By default all entity types.
+            max_concurrent: maximum number of queries of this call that are sent to the endpoint at the same time.
+                All calls together never send more than MAX_CONCURRENT_QUERIES.
+            **kwargs: filters, see get_filter_entities_from_type_lazy_loading
+
+        Returns:
+            Dictionary with per entity type the list of strings with the labels of the entities.
+        """
+
+        if l_type_uri is None:
+            l_type_uri = self.get_different_entity_types()
+
+        executor = get_query_executor()
+        semaphore = threading.Semaphore(max_concurrent)
+
+        l_futures = []
+        for type_uri in l_type_uri:
+            semaphore.acquire()
+
+            # The worker threads continue within the context of this call, e.g. with its deadline.
+            context = contextvars.copy_context()
+
+            future = executor.submit(context.run, self.get_filter_entities_from_type_lazy_loading, type_uri, **kwargs)
+            future.add_done_callback(lambda _: semaphore.release())
+            l_futures.append(future)
+
+        return {type_uri: future.result() for type_uri, future in zip(l_type_uri, l_futures)}
 
     def get_document_and_source_pairs(self) -> List[Tuple[str, str]]:
         """
@@ -698,6 +1153,23 @@ class SPARQLReportingObligationProvider:
 
         return list(zip(l_doc, l_src))
 
+    @staticmethod
+    def _get_q_sort_key(ent="ent", value_lower="value_ent_lower", sort_key="special_sort"):
+        """
+        Sort key of an entity, see build_rdf.get_sort_key.
+        It is stored with the entity, only for entities ingested before that, it's computed within the query.
+        """
+
+        q = f"""
+        OPTIONAL {{ ?{ent} {build_rdf.PROP_SORT_KEY.n3()} ?{sort_key}_stored . }}
+        BIND (COALESCE(
+            ?{sort_key}_stored,
+            REPLACE(REPLACE(?{value_lower},'[^a-zA-Z\\\\s]+', ''), '^[ \\t]+|[ \\t]+$','')
+        ) AS ?{sort_key})
+        """
+
+        return q
+
     @staticmethod
     def _get_q_filter(list_pred_value: List[Tuple[str]] = [], ro="ro_id", exact_match: bool = False):
         """
@@ -780,6 +1252,9 @@ class SPARQLReportingObligationProvider:
     def info_doc_source(self):
         """
         Retrieves a summary # documents and # reporting obligations per source.
+        The counts are stored with the document sources and kept up to date when ingesting and removing documents
+        (see build_rdf.ROGraph), such that they are only looked up. Sources of which they are missing, e.g. after a
+        bulk load, are counted instead. They can be recomputed with ROGraph.rebuild_source_stats.
         :return:
         """
 
@@ -789,21 +1264,16 @@ class SPARQLReportingObligationProvider:
         N_RO = "n_RO"
 
         q = f"""
-            PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
-            PREFIX dgfro: <http://dgfisma.com/reporting_obligations/>
             PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
-            SELECT ?{SRC} ?{SRC_NAME} (count(DISTINCT ?ro_id) as ?{N_RO}) (count(DISTINCT ?doc_id) as ?{N_DOC})
+            SELECT ?{SRC} ?{SRC_NAME} ?{N_RO} ?{N_DOC}
             WHERE {{
-            
-              ?doc_id <http://dgfisma.com/reporting_obligations/hasDocumentSource> ?{SRC} .
-              ?{SRC} rdf:value ?{SRC_NAME} .
-            
-                ?doc_id <http://dgfisma.com/reporting_obligations/hasReportingObligation> ?ro_id .
-                ?ro_id a <http://dgfisma.com/reporting_obligations/ReportingObligation> .
-            
+                ?{SRC} a {build_rdf.ROGraph.class_doc_src.n3()} ;
+                    rdf:value ?{SRC_NAME} .
+                OPTIONAL {{
+                    ?{SRC} {build_rdf.PROP_N_DOC.n3()} ?{N_DOC} ;
+                        {build_rdf.PROP_N_RO.n3()} ?{N_RO} .
+                }}
             }}
-    
-            GROUP BY ?{SRC} ?{SRC_NAME}
             ORDER BY ?{SRC} ?{SRC_NAME}
         """
 
@@ -813,4 +1283,70 @@ class SPARQLReportingObligationProvider:
         l_n_doc = self.graph_wrapper.get_column(l, N_DOC)
         l_n_ro = self.graph_wrapper.get_column(l, N_RO)
 
-        return list(zip(l_src, l_src_name, l_n_doc, l_n_ro))
+        l_src_missing = [src for src, n_doc in zip(l_src, l_n_doc) if n_doc is None]
+        d_count = self._count_doc_sources(l_src_missing) if l_src_missing else {}
+
+        # Sources without documents have no statistics either.
+        if d_count:
+            logging.warning(
+                f"No statistics stored for {len(d_count)} document sources, they are counted instead. "
+                "Rebuild them with backfill --source-stats."
+            )
+
+        l_info = []
+        for src, src_name, n_doc, n_ro in zip(l_src, l_src_name, l_n_doc, l_n_ro):
+            if n_doc is None:
+                if src not in d_count:
+                    # No documents (anymore).
+                    continue
+
+                n_doc, n_ro = d_count[src]
+
+            l_info.append((src, src_name, n_doc, n_ro))
+
+        return l_info
+
+    def _count_doc_sources(self, l_src) -> dict:
+        """Count the documents with RO's and their RO's of document sources, see info_doc_source.
+
+        :param l_src: URI's of the document sources.
+        :return: dictionary with (# documents, # reporting obligations) per document source, that has documents.
+        """
+
+        SRC = "doc_src_id"
+        N_DOC = "n_DOC"
+        N_RO = "n_RO"
+
+        q = f"""
+            SELECT ?{SRC} (COUNT(DISTINCT ?doc_id) AS ?{N_DOC}) (COUNT(DISTINCT ?ro_id) AS ?{N_RO})
+            WHERE {{
+                VALUES ?{SRC} {{ {" ".join(URIRef(src).n3() for src in l_src)} }}
+                ?doc_id {build_rdf.ROGraph.prop_has_doc_src.n3()} ?{SRC} ;
+                    {build_rdf.ROGraph.prop_has_rep_obl.n3()} ?ro_id .
+                ?ro_id a {build_rdf.ROGraph.class_rep_obl.n3()} .
+            }}
+            GROUP BY ?{SRC}
+        """
+
+        l = list(self.graph_wrapper.query(q))
+
+        return {
+            src: (n_doc, n_ro)
+            for src, n_doc, n_ro in zip(
+                self.graph_wrapper.get_column(l, SRC),
+                self.graph_wrapper.get_column(l, N_DOC),
+                self.graph_wrapper.get_column(l, N_RO),
+            )
+            # Aggregating nothing gives an unbound row with rdflib.
+            if src is not None
+        }
+
+    def get_dataset_statistics(self, refresh: bool = False) -> dict:
+        """
+        Size and distribution of the dataset: triples per predicate, RO's per document, entities per type and label
+        lengths, see statistics.compute_statistics. Cached, see statistics.DatasetStatistics.
+        :param refresh: (Optional) compute them again, also when they are still cached.
+        :return: dictionary with the statistics.
+        """
+
+        return self.dataset_statistics.get(refresh=refresh)
@@ -0,0 +1,324 @@
+"""
+Asynchronous access to the reporting obligations RDF.
+
+Allows to fan out several provider queries at once, e.g. all the dropdown facets of a single page,
+such that the latency becomes that of the slowest query instead of the sum of all queries.
+
+    async with AsyncSPARQLGraphWrapper(endpoint) as graph_wrapper:
+        prov = AsyncSPARQLReportingObligationProvider(graph_wrapper)
+
+        l_types = await prov.get_different_entity_types()
+        d = await gather_queries(
+            prov, {type_uri: ("get_filter_entities_from_type_lazy_loading", (type_uri,), {}) for type_uri in l_types}
+        )
+
+The entity types and the entities of the dropdowns (get_different_entity_types and get_filter_entities*) are
+coroutines: their query is built and its results are processed by SPARQLReportingObligationProvider, the query itself is
+awaited by the event loop, without any thread. The other provider methods still run synchronously, in worker threads of
+the provider, while their requests are sent by the event loop. At most max_workers of those calls run at the same time
+(by default the number of connections of the graph wrapper), the others wait for a free worker.
+"""
+import asyncio
+import contextvars
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Tuple
+
+import httpx
+
+from . import deadlines, instrumentation
+from .rdf_parser import GraphWrapper, SPARQLReportingObligationProvider, MAX_CONCURRENT_QUERIES
+
+MIME_SPARQL_JSON = "application/sparql-results+json"
+
+
+class AsyncSPARQLGraphWrapper(GraphWrapper):
+    """
+    Asynchronous SPARQL endpoint access. The HTTP connections are pooled and shared by all queries.
+
+    Unlike the other GraphWrappers, query has to be awaited.
+    """
+
+    def __init__(
+            self, endpoint, max_connections: int = 20, timeout: float = None, default_graph: str = None, **kwargs
+    ):
+        """
+
+        Args:
+            endpoint: URL to the (Fuseki) SPARQL query endpoint.
+            max_connections: maximum number of simultaneous connections to the endpoint.
+            timeout: (Optional) timeout in seconds. By default there is no timeout.
+            default_graph: (Optional) URI of the graph to query, see SPARQLGraphWrapper.
+            **kwargs: passed to httpx.AsyncClient.
+        """
+        super(AsyncSPARQLGraphWrapper, self).__init__()
+
+        self.endpoint = endpoint
+        self.default_graph = default_graph
+        self.max_connections = max_connections
+
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            **kwargs,
+        )
+
+    async def query(self, q: str) -> List[Dict[str, Dict[str, str]]]:
+        t0 = time.perf_counter()
+
+        params = {"query": q}
+        if self.default_graph:
+            params["default-graph-uri"] = self.default_graph
+
+        # Time left for the query, see deadlines.
+        timeouts = deadlines.get_query_timeouts()
+
+        kwargs = {}
+        if timeouts is not None:
+            timeout_fuseki, timeout_client = timeouts
+            params["timeout"] = f"{timeout_fuseki:.3f}"
+            kwargs["timeout"] = timeout_client
+
+        response = await self._get(params, kwargs)
+
+        # Fuseki answers 503 when the query timed out.
+        if timeouts is not None and response.status_code == 503:
+            raise deadlines.QueryTimeout(f"Query timed out on {self.endpoint}.")
+        response.raise_for_status()
+
+        t1 = time.perf_counter()
+
+        results = response.json()
+
+        vars = results["head"]["vars"]
+
+        # Also add variables without results as None.
+        l = [{k_j: binding_i.get(k_j, None) for k_j in vars} for binding_i in results["results"]["bindings"]]
+
+        instrumentation.record_query(q, len(l), len(response.content), t1 - t0, time.perf_counter() - t1)
+
+        return l
+
+    async def _get(self, params: dict, kwargs: dict) -> httpx.Response:
+        """
+        Send the request. When the call is cancelled in the meantime, the request is aborted and its connection closed.
+        """
+        d = deadlines.get_current_deadline()
+
+        request = asyncio.ensure_future(
+            self.client.get(self.endpoint, params=params, headers={"Accept": MIME_SPARQL_JSON}, **kwargs)
+        )
+
+        remove_callback = None
+        if d is not None:
+            loop = asyncio.get_running_loop()
+            remove_callback = d.add_cancel_callback(lambda: loop.call_soon_threadsafe(request.cancel))
+
+        try:
+            return await request
+
+        except asyncio.CancelledError:
+            if d is not None and d.is_cancelled():
+                raise deadlines.QueryCancelled() from None
+            raise
+
+        except httpx.TimeoutException as e:
+            raise deadlines.QueryTimeout(f"No response from {self.endpoint} in time.") from e
+
+        finally:
+            if remove_callback is not None:
+                remove_callback()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.aclose()
+
+
+class _BlockingGraphWrapper(GraphWrapper):
+    """
+    Synchronous view on an AsyncSPARQLGraphWrapper, to be used from a worker thread.
+    The query itself is still executed by the event loop.
+    """
+
+    def __init__(self, async_graph_wrapper: AsyncSPARQLGraphWrapper, loop: asyncio.AbstractEventLoop):
+        self.async_graph_wrapper = async_graph_wrapper
+        # Weak, such that the provider of the loop is forgotten together with the loop, see _get_provider.
+        self._loop = weakref.ref(loop)
+
+    def query(self, q: str) -> List[Dict[str, Dict[str, str]]]:
+        # The query runs in a task of the event loop, which doesn't know the provider method of this thread.
+        call = instrumentation.get_current_call()
+        d = deadlines.get_current_deadline()
+
+        async def query():
+            instrumentation.set_current_call(call)
+            deadlines.set_current_deadline(d)
+            return await self.async_graph_wrapper.query(q)
+
+        return asyncio.run_coroutine_threadsafe(query(), self._loop()).result()
+
+
+def _async_method(name):
+    method = getattr(SPARQLReportingObligationProvider, name)
+
+    async def async_method(self, *args, **kwargs):
+        return await self._run(name, *args, **kwargs)
+
+    async_method.__name__ = name
+    async_method.__doc__ = f"Asynchronous version of SPARQLReportingObligationProvider.{name}\n{method.__doc__ or ''}"
+
+    return async_method
+
+
+def _native_async_method(name):
+    """
+    Same as _async_method, for the methods with a single query. The query is awaited directly instead of occupying a
+    worker thread, see SPARQLReportingObligationProvider._get_q_different_entity_types.
+    """
+    method = getattr(SPARQLReportingObligationProvider, name)
+    get_q = getattr(SPARQLReportingObligationProvider, f"_get_q_{name[len('get_'):]}")
+
+    async def async_method(self, *args, **kwargs):
+        q, parse = get_q(self._prov_queries, *args, **kwargs)
+        if q is None:
+            return parse([])
+
+        return parse(await self.graph_wrapper.query(q))
+
+    async_method.__name__ = name
+    async_method.__doc__ = f"Asynchronous version of SPARQLReportingObligationProvider.{name}\n{method.__doc__ or ''}"
+
+    # Same as the provider methods: recorded with their name, with the default deadline of the provider.
+    return instrumentation.traced_async(deadlines.with_deadline_async(async_method))
+
+
+class AsyncSPARQLReportingObligationProvider:
+    """
+    Asynchronous version of SPARQLReportingObligationProvider, with the same methods, but they have to be awaited.
+
+    The queries are built and the results are processed exactly as in SPARQLReportingObligationProvider,
+    only the requests to the endpoint are done by the (pooled) asynchronous client.
+    Except for the entity types and the entities of the dropdowns, every call occupies one of the max_workers threads
+    of the provider until it is finished.
+    """
+
+    def __init__(self, graph_wrapper: AsyncSPARQLGraphWrapper, timeout: float = None, max_workers: int = None):
+        """
+
+        Args:
+            graph_wrapper:
+            timeout: (Optional) deadline in seconds of every method call, see SPARQLReportingObligationProvider.
+            max_workers: (Optional) maximum number of calls that run at the same time.
+                By default the maximum number of connections of the graph wrapper.
+        """
+        self.graph_wrapper = graph_wrapper
+        self.timeout = timeout
+
+        self._executor = ThreadPoolExecutor(
+            max_workers or graph_wrapper.max_connections, thread_name_prefix="ro_async_provider"
+        )
+        # Only builds the queries and processes their results, see _native_async_method.
+        self._prov_queries = SPARQLReportingObligationProvider(graph_wrapper, timeout=timeout)
+
+        # Per event loop, shared by all calls from the same loop, see _get_provider.
+        self._d_prov = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        """
+        Stop the worker threads.
+        """
+        self._executor.shutdown(wait=False)
+
+    def _get_provider(self, loop: asyncio.AbstractEventLoop) -> SPARQLReportingObligationProvider:
+        """
+        Provider of the calls from an event loop, with its own caches, e.g. of the dataset statistics.
+        """
+        with self._lock:
+            prov = self._d_prov.get(loop)
+            if prov is None:
+                prov = SPARQLReportingObligationProvider(
+                    _BlockingGraphWrapper(self.graph_wrapper, loop), timeout=self.timeout
+                )
+                self._d_prov[loop] = prov
+
+        return prov
+
+    async def _run(self, name, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+
+        method = getattr(self._get_provider(loop), name)
+
+        # The worker thread continues within the context of the caller, e.g. with its deadline.
+        context = contextvars.copy_context()
+
+        return await loop.run_in_executor(self._executor, lambda: context.run(method, *args, **kwargs))
+
+    get_different_entity_types = _native_async_method("get_different_entity_types")
+    get_all_from_type = _async_method("get_all_from_type")
+    get_all_doc_uri = _async_method("get_all_doc_uri")
+    get_all_ro_uri = _async_method("get_all_ro_uri")
+    get_all_ro_str = _async_method("get_all_ro_str")
+    get_filter_ro_id_multiple = _async_method("get_filter_ro_id_multiple")
+    get_ro_details = _async_method("get_ro_details")
+    get_entities = _async_method("get_entities")
+    get_filter_entities = _native_async_method("get_filter_entities")
+    get_filter_entities_top = _native_async_method("get_filter_entities_top")
+    get_filter_entities_from_type = _native_async_method("get_filter_entities_from_type")
+    get_filter_entities_from_type_lazy_loading = _native_async_method("get_filter_entities_from_type_lazy_loading")
+    get_document_and_source_pairs = _async_method("get_document_and_source_pairs")
+    info_doc_source = _async_method("info_doc_source")
+    get_dataset_statistics = _async_method("get_dataset_statistics")
+
+    async def get_filter_entities_from_types(
+            self,
+            l_type_uri: List[str] = None,
+            max_concurrent: int = MAX_CONCURRENT_QUERIES,
+            **kwargs,
+    ) -> Dict[str, List[str]]:
+        """Asynchronous version of SPARQLReportingObligationProvider.get_filter_entities_from_types"""
+
+        if l_type_uri is None:
+            l_type_uri = await self.get_different_entity_types()
+
+        semaphore = asyncio.Semaphore(max_concurrent)
+
+        async def get_values(type_uri):
+            async with semaphore:
+                return await self.get_filter_entities_from_type_lazy_loading(type_uri, **kwargs)
+
+        l_values = await asyncio.gather(*map(get_values, l_type_uri))
+
+        return dict(zip(l_type_uri, l_values))
+
+
+async def gather_queries(
+        provider: AsyncSPARQLReportingObligationProvider,
+        d_calls: Dict[Any, Tuple[str, Iterable, Dict[str, Any]]],
+) -> Dict[Any, Any]:
+    """Run several provider queries concurrently.
+
+    Args:
+        provider:
+        d_calls: {key: (method name, args, kwargs)}
+            e.g. {"types": ("get_different_entity_types", (), {}),
+                  "docs": ("get_all_doc_uri", (), {})}
+
+    Returns:
+        {key: result}
+    """
+
+    l_keys = list(d_calls)
+
+    l_results = await asyncio.gather(
+        *(getattr(provider, name)(*args, **kwargs) for name, args, kwargs in map(d_calls.get, l_keys))
+    )
+
+    return dict(zip(l_keys, l_results))
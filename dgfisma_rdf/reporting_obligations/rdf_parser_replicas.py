@@ -0,0 +1,312 @@
+"""
+Spread the queries over several read replicas of the reporting obligations RDF, e.g. Fuseki nodes with the same data.
+
+    graph_wrapper = ReplicaSPARQLGraphWrapper(["http://fuseki1:3030/RO/query", "http://fuseki2:3030/RO/query"])
+    prov = SPARQLReportingObligationProvider(graph_wrapper)
+
+Every query goes to the replica with the least outstanding queries (or round-robin). A replica that fails max_failures
+times in a row is ejected for eject_time seconds and its queries go to the other replicas. Only connection errors,
+timeouts and 5xx responses count as failures of the replica, errors in the query itself (4xx) are raised right away.
+With hedge=True, a query that takes longer than the 95th percentile of its replica is sent to a second replica as
+well, and the first answer is used.
+"""
+import collections
+import contextvars
+import logging
+import threading
+import time
+import urllib.error
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional
+
+from SPARQLWrapper.SPARQLExceptions import EndPointInternalError
+
+from . import deadlines
+from .rdf_parser import GraphWrapper, SPARQLGraphWrapper
+
+ROUND_ROBIN = "round_robin"
+LEAST_OUTSTANDING = "least_outstanding"
+
+# Number of recent query durations per replica to compute the hedging delay from.
+N_LATENCIES = 1000
+# Minimum number of durations before queries are hedged.
+MIN_LATENCIES_HEDGE = 20
+# Maximum number of queries (including the hedged ones) that run at the same time.
+HEDGE_MAX_WORKERS = 32
+
+# Cheap query to check whether a replica is up.
+Q_HEALTH_CHECK = "SELECT * WHERE { } LIMIT 1"
+
+logger = logging.getLogger(__name__)
+
+
+def _is_replica_failure(e: Exception) -> bool:
+    """
+    Whether the query failed because of the replica (connection error, timeout or 5xx), such that another replica
+    could answer it. Errors in the query itself, e.g. QueryBadFormed (400), fail on every replica.
+    """
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code >= 500
+
+    # URLError, ConnectionError and socket.timeout are OSError's.
+    return isinstance(e, (EndPointInternalError, OSError))
+
+
+class _Replica:
+    """
+    A read replica and its state. Is only changed while holding the lock of the ReplicaSPARQLGraphWrapper.
+    """
+
+    def __init__(self, graph_wrapper: GraphWrapper):
+        self.graph_wrapper = graph_wrapper
+
+        self.n_outstanding = 0
+        # Consecutive failures
+        self.n_failures = 0
+        self.ejected_until = 0.0
+        self.latencies = collections.deque(maxlen=N_LATENCIES)
+
+    def is_healthy(self, t: float) -> bool:
+        return t >= self.ejected_until
+
+    def get_p95(self) -> Optional[float]:
+        if len(self.latencies) < MIN_LATENCIES_HEDGE:
+            return None
+
+        l = sorted(self.latencies)
+        return l[min(int(0.95 * len(l)), len(l) - 1)]
+
+
+class ReplicaSPARQLGraphWrapper(GraphWrapper):
+    """
+    Routes every query to one of several read replicas of the same dataset. Can be shared between threads.
+    """
+
+    def __init__(
+            self,
+            endpoints: Iterable[str],
+            default_graph: str = None,
+            policy: str = LEAST_OUTSTANDING,
+            max_failures: int = 3,
+            eject_time: float = 30.0,
+            hedge: bool = False,
+            health_check_interval: float = None,
+    ):
+        """
+
+        Args:
+            endpoints: URL's to the (Fuseki) SPARQL query endpoints of the replicas.
+            default_graph: (Optional) URI of the graph to query, see SPARQLGraphWrapper.
+            policy: LEAST_OUTSTANDING or ROUND_ROBIN.
+            max_failures: number of failures in a row after which a replica is ejected.
+            eject_time: time in seconds a replica is ejected. Afterwards it gets queries again.
+            hedge: (Optional) send slow queries to a second replica as well.
+            health_check_interval: (Optional) check the ejected replicas every so many seconds in the background,
+                such that they get queries again as soon as they are back up. See check_health.
+        """
+        super(ReplicaSPARQLGraphWrapper, self).__init__()
+
+        endpoints = list(endpoints)
+        if not endpoints:
+            raise ValueError("Expected at least one endpoint.")
+
+        if policy not in (LEAST_OUTSTANDING, ROUND_ROBIN):
+            raise ValueError(f"Unknown policy: {policy}. Expected {LEAST_OUTSTANDING} or {ROUND_ROBIN}.")
+
+        self.replicas = [_Replica(SPARQLGraphWrapper(endpoint, default_graph=default_graph)) for endpoint in endpoints]
+        self.policy = policy
+        self.max_failures = max_failures
+        self.eject_time = eject_time
+
+        self._lock = threading.Lock()
+        self._i_next = 0
+
+        self._executor = ThreadPoolExecutor(HEDGE_MAX_WORKERS, thread_name_prefix="ro_hedge") if hedge else None
+
+        self._stop = threading.Event()
+        self._health_check_thread = None
+        if health_check_interval is not None:
+            self._health_check_thread = threading.Thread(
+                target=self._run_health_checks, args=(health_check_interval,), name="ro_health_check", daemon=True
+            )
+            self._health_check_thread.start()
+
+    def query(self, q: str) -> List[Dict[str, Dict[str, str]]]:
+        replica = self._acquire()
+
+        if self._executor is None or len(self.replicas) < 2:
+            return self._query_failover(replica, q)
+
+        return self._query_hedged(replica, q)
+
+    def check_health(self) -> Dict[str, bool]:
+        """Send a cheap query to every replica. Replicas that answer are no longer ejected, the others are ejected.
+
+        Returns:
+            Whether the replica is up, per endpoint.
+        """
+        d = {}
+        for replica in self.replicas:
+            try:
+                replica.graph_wrapper.query(Q_HEALTH_CHECK)
+            except Exception as e:
+                logger.warning(f"Health check of {replica.graph_wrapper.endpoint} failed: {e}")
+                b_up = False
+            else:
+                b_up = True
+
+            with self._lock:
+                if b_up:
+                    replica.n_failures = 0
+                    replica.ejected_until = 0.0
+                else:
+                    replica.n_failures = max(replica.n_failures, self.max_failures)
+                    replica.ejected_until = time.monotonic() + self.eject_time
+
+            d[replica.graph_wrapper.endpoint] = b_up
+
+        return d
+
+    def close(self) -> None:
+        """
+        Stop the health checks and the threads of the hedged queries.
+        """
+        self._stop.set()
+        if self._health_check_thread is not None:
+            self._health_check_thread.join()
+            self._health_check_thread = None
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def _acquire(self, exclude: Iterable[_Replica] = ()) -> Optional[_Replica]:
+        """Pick the replica for the next query and count it as outstanding.
+
+        Args:
+            exclude: replicas that should not be used, e.g. because they already failed for this query.
+
+        Returns:
+            The replica. When all of them are ejected, one of them is still tried. None if all are excluded.
+        """
+        with self._lock:
+            t = time.monotonic()
+
+            l_candidates = [replica for replica in self.replicas if replica not in exclude]
+            l_candidates = [replica for replica in l_candidates if replica.is_healthy(t)] or l_candidates
+            if not l_candidates:
+                return None
+
+            # Rotate, such that ties are spread as well.
+            i = self._i_next % len(l_candidates)
+            self._i_next += 1
+            l_candidates = l_candidates[i:] + l_candidates[:i]
+
+            if self.policy == LEAST_OUTSTANDING:
+                replica = min(l_candidates, key=lambda replica_i: replica_i.n_outstanding)
+            else:
+                replica = l_candidates[0]
+
+            replica.n_outstanding += 1
+
+            return replica
+
+    def _query(self, replica: _Replica, q: str):
+        """
+        Query an acquired replica and keep track of its latency and failures.
+        """
+        t0 = time.monotonic()
+
+        try:
+            l = replica.graph_wrapper.query(q)
+
+        except (deadlines.QueryCancelled, deadlines.QueryTimeout):
+            # Not the replica's fault, the deadline of the call has passed or it was cancelled.
+            with self._lock:
+                replica.n_outstanding -= 1
+            raise
+
+        except Exception as e:
+            with self._lock:
+                replica.n_outstanding -= 1
+                if not _is_replica_failure(e):
+                    # E.g. a bad query, the replica is fine.
+                    raise
+
+                replica.n_failures += 1
+                if replica.n_failures >= self.max_failures:
+                    replica.ejected_until = time.monotonic() + self.eject_time
+                    logger.warning(f"Ejected {replica.graph_wrapper.endpoint} for {self.eject_time} s")
+            raise
+
+        with self._lock:
+            replica.n_outstanding -= 1
+            replica.n_failures = 0
+            replica.latencies.append(time.monotonic() - t0)
+
+        return l
+
+    def _query_failover(self, replica: _Replica, q: str):
+        """
+        Query the replica, when it fails retry the query on the others, one by one.
+        """
+        l_tried = []
+
+        while True:
+            try:
+                return self._query(replica, q)
+            except (deadlines.QueryCancelled, deadlines.QueryTimeout):
+                raise
+            except Exception as e:
+                if not _is_replica_failure(e):
+                    raise
+
+                l_tried.append(replica)
+
+                replica = self._acquire(exclude=l_tried)
+                if replica is None:
+                    raise
+
+                logger.info(f"Retrying on {replica.graph_wrapper.endpoint}: {e}")
+
+    def _query_hedged(self, replica: _Replica, q: str):
+        """
+        When the query takes longer than the 95th percentile of the replica, also send it to another replica.
+        The slower one still finishes in the background.
+        """
+        delay = replica.get_p95()
+
+        futures = [self._submit(self._query_failover, replica, q)]
+
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            replica_hedge = self._acquire(exclude=[replica])
+            if replica_hedge is not None:
+                futures.append(self._submit(self._query_failover, replica_hedge, q))
+
+        while True:
+            done, not_done = wait(futures, return_when=FIRST_COMPLETED)
+
+            # The first successful answer. Only fails if all of them failed, or if the query itself is wrong.
+            for future in done:
+                e = future.exception()
+                if isinstance(e, (deadlines.QueryCancelled, deadlines.QueryTimeout)):
+                    # Checked first, as QueryTimeout is an OSError. Waiting for the other replica doesn't help.
+                    raise e
+
+                if e is None or not not_done or not _is_replica_failure(e):
+                    return future.result()
+
+            futures = list(not_done)
+
+    def _submit(self, fn, *args):
+        # Within the same context, such that the query is instrumented with the provider method that sent it.
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    def _run_health_checks(self, interval: float):
+        while not self._stop.wait(interval):
+            t = time.monotonic()
+            with self._lock:
+                b_ejected = any(not replica.is_healthy(t) for replica in self.replicas)
+
+            if b_ejected:
+                self.check_health()
@@ -0,0 +1,313 @@
+"""
+Statistics of the reporting obligations dataset: how large it is and how the data is distributed, for capacity planning
+and to generate realistic data for the benchmarks.
+
+    stats = DatasetStatistics(SPARQLGraphWrapper(endpoint))
+    stats.get()  # Computed once, afterwards cached for max_age seconds.
+    stats.invalidate()  # E.g. after ingesting, a later call computes them again.
+
+The counts (triples per predicate, entities per type, number of documents and RO's) are exact SPARQL aggregates over
+the whole dataset, which scan all triples. They are only computed again after max_age_counts seconds, not when the
+dataset changes. The distributions (RO's per document, label lengths) follow the changes, but at most every
+min_interval seconds. They are computed on a window of sample_size consecutive documents/labels, at a random offset
+within the counts. Skipping to the offset still reads the rows before it, but nothing is sorted nor aggregated over
+the whole dataset, such that it costs at most one pass over the documents/labels. The window is not a uniform sample:
+documents/labels that are next to each other in the index end up in the same one. Works on any GraphWrapper, both a
+local graph and Fuseki.
+"""
+import math
+import random
+import threading
+import time
+from typing import Dict, List, TYPE_CHECKING
+
+from rdflib.namespace import RDF, RDFS, SKOS
+
+from .build_rdf import ROGraph
+
+if TYPE_CHECKING:
+    from .rdf_parser import GraphWrapper
+
+# Number of documents/labels the distributions are computed on.
+SAMPLE_SIZE = 1000
+# Time in seconds before the cached statistics are computed again.
+MAX_AGE = 3600.0
+# Minimum time in seconds between computing the statistics again because the dataset changed.
+MIN_INTERVAL = 60.0
+# Time in seconds before the counts over the whole dataset are computed again.
+MAX_AGE_COUNTS = 24 * 3600.0
+
+PERCENTILES = (50, 90, 99)
+
+
+def compute_statistics(graph_wrapper: "GraphWrapper", sample_size: int = SAMPLE_SIZE) -> dict:
+    """Compute the statistics of the RDF.
+
+    Args:
+        graph_wrapper: RDF to compute the statistics of.
+        sample_size: number of documents/labels to compute the distributions on.
+
+    Returns:
+        Dictionary with the counts (see compute_counts) and the distributions (see compute_distributions).
+    """
+
+    counts = compute_counts(graph_wrapper)
+
+    return dict(counts, **compute_distributions(graph_wrapper, sample_size=sample_size, counts=counts))
+
+
+def compute_counts(graph_wrapper: "GraphWrapper") -> dict:
+    """Count the triples, documents, RO's and entities of the whole RDF. Is expensive on a large dataset.
+
+    Args:
+        graph_wrapper: RDF to compute the statistics of.
+
+    Returns:
+        Dictionary with
+            n_triples: total number of triples.
+            triples_per_predicate: number of triples per predicate URI.
+            n_documents: number of catalogue documents.
+            n_reporting_obligations: number of RO's.
+            entities_per_type: number of entities per entity class URI.
+    """
+
+    triples_per_predicate = _get_counts(
+        graph_wrapper,
+        """
+        SELECT ?key (COUNT(*) AS ?n)
+        WHERE { ?s ?key ?o . }
+        GROUP BY ?key
+        """,
+    )
+
+    entities_per_type = _get_counts(
+        graph_wrapper,
+        f"""
+        SELECT ?key (COUNT(DISTINCT ?ent) AS ?n)
+        WHERE {{
+            ?ent {RDF.type.n3()} ?key .
+            ?key {RDFS.subClassOf.n3()} {SKOS.Concept.n3()} .
+        }}
+        GROUP BY ?key
+        """,
+    )
+
+    return {
+        "n_triples": sum(triples_per_predicate.values()),
+        "triples_per_predicate": triples_per_predicate,
+        "n_documents": _count_instances(graph_wrapper, ROGraph.class_cat_doc),
+        "n_reporting_obligations": _count_instances(graph_wrapper, ROGraph.class_rep_obl),
+        "entities_per_type": entities_per_type,
+    }
+
+
+def compute_distributions(graph_wrapper: "GraphWrapper", sample_size: int = SAMPLE_SIZE, counts: dict = None) -> dict:
+    """Compute the distributions on a window of sample_size documents/labels, see the module docstring.
+
+    Args:
+        graph_wrapper: RDF to compute the statistics of.
+        sample_size: number of documents/labels to compute the distributions on.
+        counts: (Optional) counts of the RDF (see compute_counts), to pick a random offset within.
+            Without, the first documents/labels are used.
+
+    Returns:
+        Dictionary with
+            ro_per_document: distribution of the number of RO's per document, see get_distribution.
+            label_length: distribution of the number of characters of the entity labels, see get_distribution.
+    """
+
+    n_documents = counts["n_documents"] if counts else 0
+    n_labels = counts["triples_per_predicate"].get(str(SKOS.prefLabel), 0) if counts else 0
+
+    l_n_ro = _get_values(
+        graph_wrapper,
+        f"""
+        SELECT ?doc (COUNT(?ro) AS ?value)
+        WHERE {{
+            {{
+                SELECT ?doc
+                WHERE {{ ?doc {RDF.type.n3()} {ROGraph.class_cat_doc.n3()} . }}
+                OFFSET {_get_random_offset(n_documents, sample_size)}
+                LIMIT {int(sample_size)}
+            }}
+            OPTIONAL {{ ?doc {ROGraph.prop_has_rep_obl.n3()} ?ro . }}
+        }}
+        GROUP BY ?doc
+        """,
+    )
+
+    l_label_length = _get_values(
+        graph_wrapper,
+        f"""
+        SELECT (STRLEN(STR(?label)) AS ?value)
+        WHERE {{
+            {{
+                SELECT ?label
+                WHERE {{ ?ent {SKOS.prefLabel.n3()} ?label . }}
+                OFFSET {_get_random_offset(n_labels, sample_size)}
+                LIMIT {int(sample_size)}
+            }}
+        }}
+        """,
+    )
+
+    return {
+        "ro_per_document": get_distribution(l_n_ro),
+        "label_length": get_distribution(l_label_length),
+    }
+
+
+def get_distribution(l_values: List[float]) -> dict:
+    """Summary of a sample of values.
+
+    Args:
+        l_values: sample.
+
+    Returns:
+        Dictionary with the number of values in the sample (n), min, max, mean and the percentiles (p50, p90, p99).
+        Everything but n is None for an empty sample.
+    """
+
+    l_values = sorted(l_values)
+    n = len(l_values)
+
+    d = {"n": n, "min": None, "max": None, "mean": None, **{f"p{p}": None for p in PERCENTILES}}
+
+    if n:
+        d.update(min=l_values[0], max=l_values[-1], mean=sum(l_values) / n)
+        for p in PERCENTILES:
+            # Nearest rank
+            d[f"p{p}"] = l_values[max(math.ceil(p / 100 * n) - 1, 0)]
+
+    return d
+
+
+def _get_random_offset(n: int, sample_size: int) -> int:
+    """
+    Random offset of a window of sample_size rows within n rows.
+    """
+    return random.randint(0, max(int(n) - int(sample_size), 0))
+
+
+def _get_counts(graph_wrapper: "GraphWrapper", q: str) -> Dict[str, int]:
+    l = list(graph_wrapper.query(q))
+
+    return {
+        key: int(n)
+        for key, n in zip(graph_wrapper.get_column(l, "key"), graph_wrapper.get_column(l, "n"))
+        # Aggregating nothing gives an unbound row with rdflib.
+        if key is not None
+    }
+
+
+def _get_values(graph_wrapper: "GraphWrapper", q: str) -> List[int]:
+    l = list(graph_wrapper.query(q))
+
+    return [int(value) for value in graph_wrapper.get_column(l, "value") if value is not None]
+
+
+def _count_instances(graph_wrapper: "GraphWrapper", class_uri) -> int:
+    l = list(graph_wrapper.query(f"SELECT (COUNT(?s) AS ?n) WHERE {{ ?s {RDF.type.n3()} {class_uri.n3()} . }}"))
+
+    l_n = [n for n in graph_wrapper.get_column(l, "n") if n is not None]
+
+    # Empty with rdflib when there are none.
+    return int(l_n[0]) if l_n else 0
+
+
+class DatasetStatistics:
+    """
+    Cache of the statistics of a dataset. The statistics are stamped with the generation they were computed for,
+    the generation goes up when the dataset is known to have changed (see invalidate). Changing the dataset doesn't
+    compute anything, the statistics are only computed again when they are needed.
+    """
+
+    def __init__(
+            self,
+            graph_wrapper: "GraphWrapper",
+            sample_size: int = SAMPLE_SIZE,
+            max_age: float = MAX_AGE,
+            min_interval: float = MIN_INTERVAL,
+            max_age_counts: float = MAX_AGE_COUNTS,
+    ):
+        """
+
+        Args:
+            graph_wrapper: RDF to compute the statistics of.
+            sample_size: number of documents/labels to compute the distributions on.
+            max_age: time in seconds before the statistics are computed again, also without invalidate.
+            min_interval: time in seconds the statistics are kept after they were computed, also after invalidate.
+            max_age_counts: time in seconds before the counts over the whole dataset are computed again,
+                see compute_counts. They are not computed again after invalidate.
+        """
+        self.graph_wrapper = graph_wrapper
+        self.sample_size = sample_size
+        self.max_age = max_age
+        self.min_interval = min_interval
+        self.max_age_counts = max_age_counts
+
+        self.generation = 0
+        self._generation_lock = threading.Lock()
+
+        self._stats = None
+        self._counts = None
+        self._counts_computed_at = None
+        # Only compute once at a time.
+        self._lock = threading.Lock()
+
+    def get(self, refresh: bool = False) -> dict:
+        """The statistics, see compute_statistics. Are only computed when they are outdated.
+
+        Args:
+            refresh: (Optional) compute them again anyhow, including the counts over the whole dataset.
+                Is expensive, don't expose it to clients.
+
+        Returns:
+            Dictionary with the statistics, with the generation they were computed for, when (computed_at and
+            counts_computed_at, UNIX time) and how long it took in seconds (duration).
+        """
+        with self._lock:
+            t0 = time.time()
+
+            b_counts = refresh or self._counts is None or t0 - self._counts_computed_at >= self.max_age_counts
+            if b_counts:
+                self._counts = compute_counts(self.graph_wrapper)
+                self._counts_computed_at = t0
+
+            if b_counts or not self._is_valid(t0):
+                generation = self.generation
+
+                stats = compute_distributions(self.graph_wrapper, sample_size=self.sample_size, counts=self._counts)
+
+                self._stats = dict(
+                    self._counts,
+                    **stats,
+                    generation=generation,
+                    computed_at=t0,
+                    counts_computed_at=self._counts_computed_at,
+                    duration=time.time() - t0,
+                )
+
+            return self._stats
+
+    def invalidate(self) -> int:
+        """The dataset has changed, the statistics are computed again the next time they are needed.
+
+        Returns:
+            The new generation.
+        """
+        with self._generation_lock:
+            self.generation += 1
+
+            return self.generation
+
+    def _is_valid(self, t: float) -> bool:
+        if self._stats is None:
+            return False
+
+        age = t - self._stats["computed_at"]
+
+        if age >= self.max_age:
+            return False
+
+        return age < self.min_interval or self._stats["generation"] == self.generation
@@ -0,0 +1,131 @@
+"""
+Cached loading of the UIMA typesystem of the CAS files.
+
+Parsing the typesystem XML is slow compared to the rest of the start-up. Loaded typesystems are kept in memory and,
+optionally, also pickled to a cache directory, keyed by the version of cassis and the hash of the XML file, such that a
+new process (e.g. a new container) can load it a lot faster:
+
+    RO_TYPESYSTEM_CACHE_DIR=/tmp/ro_typesystem python -m dgfisma_rdf.reporting_obligations.typesystem <typesystem.xml>
+"""
+import argparse
+import copyreg
+import hashlib
+import importlib.metadata
+import logging
+import os
+import pickle
+import threading
+
+import attr
+from cassis import TypeSystem, load_typesystem
+from cassis.typesystem import Type
+
+PATH_TYPESYSTEM = os.path.join(os.path.dirname(__file__), "output_reporting_obligations/typesystem_tmp.xml")
+
+# (Optional) directory to save the pickled typesystems to.
+CACHE_DIR = os.environ.get("RO_TYPESYSTEM_CACHE_DIR") or None
+
+# The pickles depend on the internals of cassis, see _reduce_type, so they are only used with the same version.
+CASSIS_VERSION = importlib.metadata.version("dkpro-cassis")
+
+logger = logging.getLogger(__name__)
+
+_LOCK = threading.Lock()
+# path -> (modification time and size of the file, typesystem)
+_TYPESYSTEMS = {}
+
+
+def get_typesystem(path_typesystem: str = PATH_TYPESYSTEM, cache_dir: str = CACHE_DIR) -> TypeSystem:
+    """Load a typesystem, only the first time it is requested or when the file has changed since.
+
+    Args:
+        path_typesystem: path to the typesystem XML.
+        cache_dir: (Optional) directory with pickled typesystems, to use and update. By default RO_TYPESYSTEM_CACHE_DIR.
+
+    Returns:
+        The typesystem. It is shared, so it should not be changed.
+    """
+    key = os.path.abspath(path_typesystem)
+    stat = os.stat(key)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _TYPESYSTEMS.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _LOCK:
+        cached = _TYPESYSTEMS.get(key)
+        if cached is None or cached[0] != version:
+            cached = _TYPESYSTEMS[key] = (version, _load(path_typesystem, cache_dir))
+
+    return cached[1]
+
+
+def _load(path_typesystem: str, cache_dir: str = None) -> TypeSystem:
+    with open(path_typesystem, "rb") as f:
+        b = f.read()
+
+    if cache_dir is None:
+        return load_typesystem(b.decode("utf-8"))
+
+    path_cache = os.path.join(cache_dir, f"typesystem_{CASSIS_VERSION}_{hashlib.sha256(b).hexdigest()}.pickle")
+
+    try:
+        with open(path_cache, "rb") as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.warning(f"Could not load the cached typesystem {path_cache}: {e}")
+
+    typesystem = load_typesystem(b.decode("utf-8"))
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # Write to a temporary file first, such that other processes never read an incomplete file.
+        path_tmp = f"{path_cache}.{os.getpid()}.tmp"
+        with open(path_tmp, "wb") as f:
+            pickle.dump(typesystem, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path_tmp, path_cache)
+
+    except Exception as e:
+        logger.warning(f"Could not cache the typesystem to {path_cache}: {e}")
+
+    return typesystem
+
+
+# cassis Types have a lambda to build their class lazily, which can't be pickled. It is rebuilt when unpickling.
+_TYPE_FIELDS = tuple(a.name for a in attr.fields(Type) if a.name not in ("_constructor_fn", "_constructor"))
+
+
+def _restore_type(state: dict) -> Type:
+    t = object.__new__(Type)
+    for k, v in state.items():
+        object.__setattr__(t, k, v)
+    object.__setattr__(t, "_constructor", None)
+
+    t.__attrs_post_init__()
+
+    return t
+
+
+def _reduce_type(t: Type):
+    return _restore_type, ({k: getattr(t, k) for k in _TYPE_FIELDS},)
+
+
+copyreg.pickle(Type, _reduce_type)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Pre-build the typesystem cache, e.g. when building an image.")
+    parser.add_argument("path_typesystem", nargs="?", default=PATH_TYPESYSTEM, help="Path to the typesystem.")
+    parser.add_argument("--cache-dir", default=CACHE_DIR, required=CACHE_DIR is None, help="Cache directory.")
+
+    args = parser.parse_args(args)
+
+    get_typesystem(args.path_typesystem, cache_dir=args.cache_dir)
+
+
+if __name__ == "__main__":
+    main()
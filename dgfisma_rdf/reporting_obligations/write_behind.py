@@ -0,0 +1,476 @@
+"""
+Write-behind ingestion of cas content.
+
+Instead of committing every upload to Fuseki on its own, the SPARQL update of an upload is built right away and
+appended to a local SQLite journal. A background committer sends the pending updates in coalesced batches, a single
+request per update endpoint, when there are batch_size of them or after max_delay seconds:
+
+    committer = WriteBehindCommitter(UpdateJournal("/data/ro_journal.sqlite"), auth=(user, password))
+    committer.start()
+
+    q, stats = build_update(cas_content, doc_id, update_endpoint)
+    committer.enqueue(update_endpoint, doc_id, q)
+
+The updates are built with deterministic URI's, so nothing has to be read from the RDF first and the ID's of the RO's
+are known immediately. An update is only removed from the journal once it is committed. After a crash, the pending
+updates are sent again when the committer is started. Updates replace the content of a document, so sending one twice
+gives the same result.
+
+When a batch fails, its updates are sent one by one. An update that is refused by Fuseki max_attempts times is moved
+to the dead_letters table of the journal, such that it doesn't hold up the uploads after it. When Fuseki can't be
+reached, nothing is counted and the batch is retried as a whole.
+"""
+import logging
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+import requests
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore
+
+from .build_rdf import ROGraph
+from .cas_parser import CasContent
+
+# Maximum number of uploads per commit.
+BATCH_SIZE = 100
+# Maximum time in seconds that an upload waits before it is committed.
+MAX_DELAY = 1.0
+# Time in seconds before retrying when a commit failed.
+RETRY_DELAY = 5.0
+# Number of times an update is sent on its own before it is moved to the dead letters.
+MAX_ATTEMPTS = 3
+
+# Responses that mean Fuseki is (temporarily) unavailable, instead of that the update is wrong.
+STATUS_UNAVAILABLE = (502, 503, 504)
+
+logger = logging.getLogger(__name__)
+
+
+class UpdateJournal:
+    """
+    Durable, ordered queue of SPARQL updates, saved in a SQLite database. Can be shared between threads.
+    A journal should only be opened once at a time, as the number of pending entries is counted in memory.
+    """
+
+    def __init__(self, path: str):
+        """
+
+        Args:
+            path: path to the SQLite database. Is created if it doesn't exist yet.
+        """
+        self.path = path
+
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS updates (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                update_endpoint TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                q TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                id INTEGER PRIMARY KEY,
+                update_endpoint TEXT NOT NULL,
+                doc_id TEXT NOT NULL,
+                q TEXT NOT NULL,
+                created REAL NOT NULL,
+                attempts INTEGER NOT NULL,
+                error TEXT NOT NULL,
+                failed REAL NOT NULL
+            )
+            """
+        )
+
+        # Journals of before the attempts were counted.
+        if "attempts" not in [row[1] for row in self._conn.execute("PRAGMA table_info(updates)")]:
+            self._conn.execute("ALTER TABLE updates ADD COLUMN attempts INTEGER NOT NULL DEFAULT 0")
+
+        # Number of pending entries, kept in memory such that it is cheap to check.
+        self._n_pending = self._conn.execute("SELECT COUNT(*) FROM updates").fetchone()[0]
+
+    def append(self, update_endpoint: str, doc_id: str, q: str) -> int:
+        """Add a SPARQL update to the end of the journal. It is saved to disk before returning.
+
+        Args:
+            update_endpoint: URL to the update endpoint to send the update to.
+            doc_id: ID of the document that is updated.
+            q: SPARQL update.
+
+        Returns:
+            ID of the entry.
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO updates (update_endpoint, doc_id, q, created) VALUES (?, ?, ?, ?)",
+                (update_endpoint, doc_id, q, time.time()),
+            )
+            self._n_pending += 1
+
+        return cursor.lastrowid
+
+    def pending(self, limit: int = None) -> List[Tuple[int, str, str]]:
+        """The oldest entries that are not committed yet, in order.
+
+        Args:
+            limit: (Optional) maximum number of entries.
+
+        Returns:
+            List with (ID, update endpoint, SPARQL update)
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, update_endpoint, q FROM updates ORDER BY id LIMIT ?", (-1 if limit is None else limit,)
+            ).fetchall()
+
+    def remove(self, l_id: List[int]) -> None:
+        with self._lock:
+            cursor = self._conn.executemany("DELETE FROM updates WHERE id = ?", [(id_i,) for id_i in l_id])
+            self._n_pending -= cursor.rowcount
+
+    def add_attempt(self, id_entry: int) -> int:
+        """Count a failed attempt to commit an entry on its own.
+
+        Returns:
+            Number of failed attempts of the entry so far.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE updates SET attempts = attempts + 1 WHERE id = ?", (id_entry,))
+            return self._conn.execute("SELECT attempts FROM updates WHERE id = ?", (id_entry,)).fetchone()[0]
+
+    def move_to_dead_letters(self, id_entry: int, error: str) -> None:
+        """Move an entry that can't be committed out of the pending ones, to the dead_letters table.
+
+        Args:
+            id_entry: ID of the entry.
+            error: why it failed.
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.execute(
+                """
+                INSERT INTO dead_letters (id, update_endpoint, doc_id, q, created, attempts, error, failed)
+                SELECT id, update_endpoint, doc_id, q, created, attempts, ?, ? FROM updates WHERE id = ?
+                """,
+                (error, time.time(), id_entry),
+            )
+            cursor = self._conn.execute("DELETE FROM updates WHERE id = ?", (id_entry,))
+            self._conn.execute("COMMIT")
+
+            self._n_pending -= cursor.rowcount
+
+    def dead_letters(self) -> List[Tuple[int, str, str, str]]:
+        """
+        Returns:
+            List with (ID, update endpoint, document ID, error) of the entries that could not be committed.
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, update_endpoint, doc_id, error FROM dead_letters ORDER BY id"
+            ).fetchall()
+
+    def count_dead_letters(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM dead_letters").fetchone()[0]
+
+    def __len__(self):
+        """
+        Number of pending entries.
+        """
+        return self._n_pending
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class WriteBehindCommitter:
+    """
+    Commits the updates of an UpdateJournal to Fuseki in a background thread.
+    """
+
+    def __init__(
+            self,
+            journal: UpdateJournal,
+            auth: Optional[Tuple[str, str]] = None,
+            batch_size: int = BATCH_SIZE,
+            max_delay: float = MAX_DELAY,
+            retry_delay: float = RETRY_DELAY,
+            max_attempts: int = MAX_ATTEMPTS,
+    ):
+        """
+
+        Args:
+            journal: journal with the pending updates.
+            auth: (Optional) user and password of the update endpoints.
+            batch_size: maximum number of updates per commit. A full batch is committed right away.
+            max_delay: maximum time in seconds before pending updates are committed.
+            retry_delay: time in seconds to wait before retrying a failed commit.
+            max_attempts: number of times an update is refused before it is moved to the dead letters.
+        """
+        self.journal = journal
+        self.auth = auth
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+
+        # Only one flush at a time, to keep the updates in order.
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enqueue(self, update_endpoint: str, doc_id: str, q: str) -> int:
+        """Add an update to the journal, it will be committed in the background.
+
+        Returns:
+            ID of the journal entry.
+        """
+        id_entry = self.journal.append(update_endpoint, doc_id, q)
+
+        if len(self.journal) >= self.batch_size:
+            self._wake.set()
+
+        return id_entry
+
+    def start(self) -> None:
+        """
+        Start committing in the background. Updates that were still pending (e.g. after a crash) are committed first.
+        """
+        if self._thread is not None:
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ro_write_behind", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None) -> None:
+        """
+        Stop the background thread, after committing what is still pending.
+        """
+        if self._thread is None:
+            return
+
+        self._stop.set()
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+        try:
+            self.flush_all()
+        except Exception as e:
+            logger.warning(f"Could not commit the pending updates, they are kept in {self.journal.path}: {e}")
+
+    def flush(self) -> int:
+        """Commit a single batch of pending updates, one request per update endpoint.
+        If that fails, the updates of the endpoint are sent one by one, see _flush_entries.
+
+        Returns:
+            Number of updates committed or moved to the dead letters.
+
+        Raises:
+            The error of the first endpoint that failed, after trying all endpoints.
+                What could not be committed is kept in the journal.
+        """
+        with self._flush_lock:
+            l_pending = self.journal.pending(self.batch_size)
+
+            # Every endpoint is a different dataset, within an endpoint the order is kept.
+            d_endpoint = {}
+            for id_entry, update_endpoint, q in l_pending:
+                d_endpoint.setdefault(update_endpoint, []).append((id_entry, q))
+
+            l_errors = []
+            for update_endpoint, l_entry in d_endpoint.items():
+                try:
+                    if len(l_entry) > 1:
+                        try:
+                            self._send(update_endpoint, "\n;\n".join(q for _, q in l_entry))
+                        except Exception as e:
+                            if _is_unavailable(e):
+                                raise
+
+                            logger.warning(f"Commit of {len(l_entry)} updates failed, sending them one by one: {e}")
+                        else:
+                            self.journal.remove([id_entry for id_entry, _ in l_entry])
+                            continue
+
+                    self._flush_entries(update_endpoint, l_entry)
+
+                except Exception as e:
+                    l_errors.append(e)
+
+            if l_errors:
+                raise l_errors[0]
+
+            return len(l_pending)
+
+    def flush_all(self) -> int:
+        """Commit everything that is pending, e.g. before removing documents.
+
+        Returns:
+            Number of updates committed.
+        """
+        n = 0
+        while True:
+            n_batch = self.flush()
+            n += n_batch
+            if n_batch < self.batch_size:
+                return n
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.max_delay)
+            self._wake.clear()
+
+            try:
+                self.flush_all()
+            except Exception as e:
+                logger.warning(f"Could not commit the pending updates, retrying in {self.retry_delay} s: {e}")
+                self._stop.wait(self.retry_delay)
+
+    def _flush_entries(self, update_endpoint: str, l_entry: List[Tuple[int, str]]) -> None:
+        """Commit updates one by one, in order. An update that is refused max_attempts times is moved to the dead
+        letters, otherwise it stops at the first one that fails, such that the order is kept.
+        """
+        for id_entry, q in l_entry:
+            try:
+                self._send(update_endpoint, q)
+
+            except Exception as e:
+                if _is_unavailable(e):
+                    raise
+
+                n_attempts = self.journal.add_attempt(id_entry)
+                if n_attempts < self.max_attempts:
+                    raise
+
+                logger.error(f"Update {id_entry} failed {n_attempts} times, it is moved to the dead letters: {e}")
+                self.journal.move_to_dead_letters(id_entry, str(e))
+
+            else:
+                self.journal.remove([id_entry])
+
+    def _send(self, update_endpoint: str, q: str) -> None:
+        store = SPARQLUpdateStore(update_endpoint=update_endpoint, auth=self.auth, context_aware=False, autocommit=True)
+
+        store.update(q)
+
+
+def _is_unavailable(e: Exception) -> bool:
+    """
+    Whether an update failed because Fuseki couldn't be reached, instead of because of the update itself.
+    """
+    if isinstance(e, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True
+
+    response = getattr(e, "response", None)
+    return response is not None and response.status_code in STATUS_UNAVAILABLE
+
+
+class _RecordingUpdateStore(SPARQLUpdateStore):
+    """
+    SPARQL update store that records the updates and added triples, instead of sending them.
+
+    The added triples are inserted at the end, after all the updates, with a single INSERT DATA, see get_update.
+    ROGraph only adds triples after the updates of the same call, see ROGraph.add_cas_content.
+    """
+
+    def __init__(self):
+        super(_RecordingUpdateStore, self).__init__(context_aware=False)
+
+        self.l_q = []
+        self.l_add = []
+
+    def update(self, query, initNs={}, initBindings={}, queryGraph=None, DEBUG=False):
+        self.l_q.append(query)
+
+    def add(self, spo, context=None, quoted=False):
+        self.l_add.append(spo)
+
+    def remove(self, spo, context=None):
+        # Triples that were added before aren't inserted yet.
+        self.l_add = [triple for triple in self.l_add if not _matches(spo, triple)]
+
+        if None in spo:
+            pattern = " ".join(f"?{var}" if term is None else term.n3() for term, var in zip(spo, "spo"))
+            self.l_q.append(f"DELETE WHERE {{ {pattern} . }}")
+        else:
+            s, p, o = spo
+            self.l_q.append(f"DELETE DATA {{ {s.n3()} {p.n3()} {o.n3()} . }}")
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        self.l_q = []
+        self.l_add = []
+
+    def get_update(self) -> Optional[str]:
+        """
+        Returns:
+            The recorded updates followed by the insert of the added triples, as a single SPARQL update.
+            None if nothing was recorded.
+        """
+        l_q = list(self.l_q)
+
+        if self.l_add:
+            lines = "\n".join(f"{s.n3()} {p.n3()} {o.n3()} ." for s, p, o in self.l_add)
+            l_q.append(f"INSERT DATA {{\n{lines}\n}}")
+
+        return "\n;\n".join(l_q) if l_q else None
+
+
+def _matches(pattern, triple) -> bool:
+    return all(term is None or term == term_triple for term, term_triple in zip(pattern, triple))
+
+
+def build_update(
+        cas_content: CasContent,
+        doc_id: str,
+        update_endpoint: str,
+        named_graphs: bool = False,
+        source_id: str = None,
+        source_name: str = None,
+        b_source_link_only: bool = False,
+) -> Tuple[Optional[str], dict]:
+    """Build the SPARQL update that replaces the reporting obligations of a document, see ROGraph.update_cas_content.
+    The ID's are added to the cas content.
+
+    Is built with deterministic URI's, as the RDF isn't read to find the URI's that are already in use.
+
+    Args:
+        cas_content:
+        doc_id:
+        update_endpoint: URL to the update endpoint the update is meant for.
+        named_graphs: (Optional) build the update for the named graph per document layout.
+        source_id: (Optional) also add the document source, see ROGraph.add_doc_source.
+        source_name: (Optional) label of the document source.
+        b_source_link_only: (Optional) only add the link to the document source.
+
+    Returns:
+        (SPARQL update, ingestion statistics, see ROGraph.ingestion_stats).
+        The update is None if there is nothing to update.
+    """
+    store = _RecordingUpdateStore()
+
+    g = ROGraph(store, DATASET_DEFAULT_GRAPH_ID, deterministic_uri=True, named_graphs=named_graphs)
+
+    g.update_cas_content(cas_content, doc_id)
+
+    if source_id is not None:
+        g.add_doc_source(doc_id, source_id, source_name, b_link_only=b_source_link_only)
+
+    return store.get_update(), g.ingestion_stats
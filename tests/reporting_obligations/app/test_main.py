@@ -1,7 +1,9 @@
 import base64
 import os
+import tempfile
 import time
 import unittest
+from unittest import mock
 
 import requests
 from cassis import load_typesystem, load_cas_from_xmi
@@ -14,9 +16,13 @@ from rdflib.plugins.stores.sparqlstore import SPARQLUpdateStore, SPARQLStore
 from rdflib.store import Store
 from rdflib.term import Variable
 
-from dgfisma_rdf.reporting_obligations import cas_parser
+from dgfisma_rdf.reporting_obligations import cas_parser, instrumentation
+from dgfisma_rdf.reporting_obligations.app import main
 from dgfisma_rdf.reporting_obligations.app.main import update_rdf_from_cas_content, app
 from dgfisma_rdf.reporting_obligations.build_rdf import ROGraph, D_ENTITIES
+from dgfisma_rdf.reporting_obligations.rdf_parser import RDFLibGraphWrapper
+from dgfisma_rdf.reporting_obligations.statistics import DatasetStatistics
+from tests.reporting_obligations.build_rdf_example import ExampleCasContent
 
 ROOT = os.path.join(os.path.dirname(__file__), "../../..")
 
@@ -105,6 +111,26 @@ class TestUpdateRDFFromCasContent(unittest.TestCase):
                 except Exception as e:
                     self.fail((e, cas_content_i))
 
+    def test_send_empty_cas_after_reporting_obligations(self):
+        """
+        A document that is uploaded again without reporting obligations should lose its previous ones.
+        """
+        doc_id = "example.com/doc/1"
+
+        g = ROGraph()
+        g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+
+        with mock.patch.object(main, "get_sparql_update_graph", return_value=g):
+            cas_content = update_rdf_from_cas_content(
+                cas_parser.CasContent.from_list([]), URL_ENDPOINT, UPDATE_ENDPOINT, doc_id
+            )
+
+        with self.subTest("Response"):
+            self.assertEqual([], cas_content["children"])
+
+        with self.subTest("Removed"):
+            self.assertEqual(set(ROGraph()), set(g), "The RO's and the document should be removed.")
+
 
 class TestUploadCas(unittest.TestCase):
     def test_upload_file(self):
@@ -273,6 +299,95 @@ class TestUploadCasB64(unittest.TestCase):
         return r
 
 
+class TestMetrics(unittest.TestCase):
+    def test_request(self):
+        TEST_CLIENT.get("/")
+
+        r = TEST_CLIENT.get("/metrics")
+
+        with self.subTest("status code"):
+            self.assertEqual(200, r.status_code)
+
+        with self.subTest("Request"):
+            self.assertIn('ro_api_request_seconds_count{path="/",method="GET",status="200"}', r.text)
+
+        with self.subTest("In progress"):
+            self.assertIn('ro_api_requests_in_progress{path="/metrics"} 1.0', r.text.splitlines())
+
+    def test_stages(self):
+        """
+        Stages that were executed should be measured, even if the request fails in a later stage.
+        """
+
+        client = TestClient(app, raise_server_exceptions=False)
+
+        values = {"content": base64.b64encode(b"<not a CAS/>").decode()}
+        headers = {"endpoint": URL_ENDPOINT, "updateendpoint": UPDATE_ENDPOINT, "docid": "test_metrics"}
+
+        client.post("/ro_cas/base64", json=values, headers=headers)
+
+        s = client.get("/metrics").text
+
+        for stage in ("base64_decode", "xmi_load"):
+            with self.subTest(stage):
+                self.assertIn(f'ro_api_stage_seconds_count{{path="/ro_cas/base64",stage="{stage}"}}', s)
+
+
+    def test_query_metrics(self):
+        with TestClient(app) as client:
+            with self.subTest("Installed"):
+                self.assertTrue(instrumentation.is_enabled())
+
+            instrumentation.record_query("SELECT * WHERE { ?s ?p ?o }", 1, 100, 0.1, 0.01)
+
+            r = client.get("/metrics")
+
+            with self.subTest("Metrics"):
+                self.assertIn('ro_sparql_queries_total{method=""}', r.text)
+
+        with self.subTest("Removed"):
+            self.assertFalse(instrumentation.is_enabled())
+
+
+class TestStats(unittest.TestCase):
+    def setUp(self) -> None:
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+
+        self.g = ROGraph(include_schema=True)
+        self.g.add_cas_content(ExampleCasContent.build(), doc_id="doc1")
+
+        filename = os.path.join(tmp_dir.name, "ro.nt")
+        self.g.serialize(filename, format="nt")
+
+        main.get_dataset_statistics.cache_clear()
+        self.addCleanup(main.get_dataset_statistics.cache_clear)
+
+        self.stats = DatasetStatistics(RDFLibGraphWrapper(filename))
+
+        patcher = mock.patch.object(main, "get_dataset_statistics", return_value=self.stats)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stats(self):
+        r = TEST_CLIENT.get("/stats", headers={"endpoint": URL_ENDPOINT})
+
+        with self.subTest("status code"):
+            self.assertEqual(200, r.status_code, r.text)
+
+        with self.subTest("Statistics"):
+            self.assertEqual(1, r.json()["n_documents"])
+            self.assertEqual(len(self.g), r.json()["n_triples"])
+
+    def test_invalidated(self):
+        with mock.patch.object(main, "get_sparql_update_graph", return_value=ROGraph()):
+            update_rdf_from_cas_content(ExampleCasContent.build(), URL_ENDPOINT, UPDATE_ENDPOINT, "doc2")
+
+        r = TEST_CLIENT.get("/stats", headers={"endpoint": URL_ENDPOINT})
+
+        self.assertEqual(1, r.json()["generation"])
+
+
 class TestUID(unittest.TestCase):
     """Unique identifiers should be added and retrieved by the RDF to get the different catalogue documents and reporting obligations."""
 
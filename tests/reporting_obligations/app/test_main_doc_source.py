@@ -2,13 +2,18 @@
 Tests for accessing create RDF API, with focus on adding document source info
 """
 
+import base64
 import os
 import unittest
+from unittest import mock
 
 from dotenv import load_dotenv
 from fastapi.testclient import TestClient
 
+from dgfisma_rdf.reporting_obligations.app import main
 from dgfisma_rdf.reporting_obligations.app.main import app, get_sparql_update_graph
+from dgfisma_rdf.reporting_obligations.build_rdf import ROGraph
+from tests.reporting_obligations.build_rdf_example import ExampleCasContent
 
 ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../.."))
 
@@ -53,6 +58,100 @@ else:
 TEST_CLIENT = TestClient(app)
 
 
+class TestRemoveDocuments(unittest.TestCase):
+    """
+    The endpoints are run against a local graph.
+    """
+
+    def setUp(self) -> None:
+        self.g = ROGraph(include_schema=True)
+        self.n_start = len(self.g)
+
+        for doc_id in ("doc1", "doc2"):
+            self.g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+            self.g.add_doc_source(doc_id, "https://eba.europa.eu/", source_name="EBA")
+
+        patcher = mock.patch.object(main, "get_sparql_update_graph", return_value=self.g)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.headers = {"endpoint": URL_ENDPOINT, "updateendpoint": UPDATE_ENDPOINT}
+
+    def test_delete(self):
+        r = TEST_CLIENT.post("/doc/delete", json={"doc_ids": ["doc1", "doc2"]}, headers=self.headers)
+
+        self.assertEqual(200, r.status_code, r.text)
+        self.assertEqual(2, r.json()["n_doc"])
+        self.assertEqual(self.n_start + 2, len(self.g), "Only the document source should be left.")
+
+    def test_purge(self):
+        r = TEST_CLIENT.post(
+            "/doc_source/purge", headers={"source-url": "https://eba.europa.eu/", "batch-size": "1", **self.headers}
+        )
+
+        self.assertEqual(200, r.status_code, r.text)
+        self.assertEqual(2, r.json()["n_doc"])
+        self.assertEqual(self.n_start, len(self.g))
+
+    def test_purge_no_source(self):
+        r = TEST_CLIENT.post("/doc_source/purge", headers=self.headers)
+
+        self.assertEqual(400, r.status_code)
+
+
+class TestUploadWithDocSource(unittest.TestCase):
+    """
+    The document source is added within the same commit as the reporting obligations.
+    """
+
+    def setUp(self) -> None:
+        self.g = ROGraph(include_schema=True)
+
+        for patcher in (
+            mock.patch.object(main, "get_sparql_update_graph", return_value=self.g),
+            mock.patch.object(self.g, "commit"),
+            mock.patch.object(self.g, "add_doc_source", wraps=self.g.add_doc_source),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        main.get_doc_source_cache.cache_clear()
+        self.addCleanup(main.get_doc_source_cache.cache_clear)
+
+        with open(os.path.join(os.path.dirname(__file__), "data_test", "ro_cas_1.xml"), "rb") as f:
+            self.cas_base64 = base64.b64encode(f.read()).decode("utf-8")
+
+    def _upload(self, doc_id):
+        headers = {
+            "docid": doc_id,
+            "source-url": "https://eba.europa.eu/",
+            "source-name": "EBA",
+            "endpoint": URL_ENDPOINT,
+            "updateendpoint": UPDATE_ENDPOINT,
+        }
+
+        r = TEST_CLIENT.post("/ro_cas/base64", json={"content": self.cas_base64}, headers=headers)
+        self.assertEqual(200, r.status_code, r.text)
+
+    def test_single_commit(self):
+        self._upload("doc1")
+
+        self.g.commit.assert_called_once()
+
+        source_uri = ROGraph._get_source_uri("https://eba.europa.eu/")
+        self.assertIn((ROGraph._get_cat_doc_uri("doc1"), ROGraph.prop_has_doc_src, source_uri), self.g)
+
+    def test_known_source(self):
+        self._upload("doc1")
+        self._upload("doc2")
+
+        self.assertEqual(
+            [False, True],
+            [call.kwargs["b_link_only"] for call in self.g.add_doc_source.call_args_list],
+            "The document source triples should only be added once.",
+        )
+
+
 class TestAddDocSource(unittest.TestCase):
     URL_DOC_SOURCE_ADD = "/doc_source/add"
 
@@ -1,9 +1,29 @@
+import io
+import math
 import os
 import tempfile
 import unittest
-
-from dgfisma_rdf.reporting_obligations.build_rdf import ROGraph, RO_BASE, OWL, RDFS, RDF
-from tests.reporting_obligations.build_rdf_example import ExampleCasContent
+from unittest import mock
+
+from rdflib import ConjunctiveGraph, Literal, URIRef
+
+from dgfisma_rdf.reporting_obligations import cas_parser
+from dgfisma_rdf.reporting_obligations.build_rdf import (
+    ROGraph,
+    RO_BASE,
+    OWL,
+    RDFS,
+    RDF,
+    PROP_SORT_KEY,
+    PROP_N_DOC,
+    PROP_N_RO,
+    PROP_N_RO_DOC,
+    GRAPH_DOC_SOURCES,
+    GRAPH_SCHEMA,
+    DocSourceCache,
+    get_sort_key,
+)
+from tests.reporting_obligations.build_rdf_example import ExampleCasContent, PATH_CAS, PATH_TYPESYSTEM
 
 HAS_DOC_SRC = RO_BASE.hasDocumentSource
 
@@ -153,6 +173,489 @@ class TestBuild(unittest.TestCase):
             )
 
 
+class TestUpdateCasContent(unittest.TestCase):
+    """
+    Re-ingesting a document should only change what is different.
+    """
+
+    def setUp(self) -> None:
+        self.g = ROGraph(include_schema=True)
+        self.doc_id = "https://example.com/doc1"
+
+    @staticmethod
+    def _get_cas_content(l_ro):
+        return cas_parser.CasContent.from_list(
+            [
+                {
+                    cas_parser.KEY_VALUE: value,
+                    cas_parser.KEY_CHILDREN: [
+                        {cas_parser.KEY_VALUE: v, cas_parser.KEY_SENTENCE_FRAG_CLASS: c} for c, v in l_ent
+                    ],
+                }
+                for value, l_ent in l_ro
+            ]
+        )
+
+    def test_identical(self):
+        cas_content = ExampleCasContent.build()
+        self.g.update_cas_content(cas_content, doc_id=self.doc_id)
+
+        set_triples = set(self.g)
+
+        cas_content_again = ExampleCasContent.build()
+        l_add, l_remove = self.g._get_triples_update_cas_content(
+            cas_content_again, self.g._get_cat_doc_uri(self.doc_id)
+        )
+
+        with self.subTest("Nothing to write"):
+            self.assertFalse(l_add)
+            self.assertFalse(l_remove)
+
+        with self.subTest("Stable ID's"):
+            self.assertEqual(cas_content[cas_parser.KEY_CHILDREN], cas_content_again[cas_parser.KEY_CHILDREN])
+
+        self.g.update_cas_content(cas_content_again, doc_id=self.doc_id)
+        with self.subTest("Unchanged graph"):
+            self.assertEqual(set_triples, set(self.g))
+
+    def test_changed_entity(self):
+        cas_content0 = self._get_cas_content(
+            [("RO 1", [("ARG0", "reporter"), ("V", "report")]), ("RO 2", [("ARG1", "report")])]
+        )
+        cas_content1 = self._get_cas_content(
+            [("RO 1", [("ARG0", "other reporter"), ("V", "report")]), ("RO 3", [("ARG1", "report")])]
+        )
+
+        self.g.update_cas_content(cas_content0, doc_id=self.doc_id)
+        self.g.update_cas_content(cas_content1, doc_id=self.doc_id)
+
+        ro1_0, ro2_0 = cas_content0[cas_parser.KEY_CHILDREN]
+        ro1_1, ro3_1 = cas_content1[cas_parser.KEY_CHILDREN]
+
+        with self.subTest("Same RO"):
+            self.assertEqual(ro1_0["id"], ro1_1["id"])
+
+        with self.subTest("Unchanged entity"):
+            self.assertEqual(ro1_0[cas_parser.KEY_CHILDREN][1]["id"], ro1_1[cas_parser.KEY_CHILDREN][1]["id"])
+
+        with self.subTest("Changed entity"):
+            ent_old = ro1_0[cas_parser.KEY_CHILDREN][0]["id"]
+            self.assertNotEqual(ent_old, ro1_1[cas_parser.KEY_CHILDREN][0]["id"])
+            self.assertFalse(list(self.g.triples((URIRef(ent_old), None, None))))
+
+        with self.subTest("Removed RO"):
+            self.assertFalse(list(self.g.triples((URIRef(ro2_0["id"]), None, None))))
+            self.assertFalse(list(self.g.triples((None, None, URIRef(ro2_0["id"])))))
+
+        with self.subTest("Content"):
+            g_expected = ROGraph(include_schema=True)
+            g_expected.add_cas_content(cas_content1, doc_id=self.doc_id)
+
+            self.assertEqual(len(g_expected), len(self.g))
+
+    def test_empty(self):
+        self.g.update_cas_content(ExampleCasContent.build(), doc_id=self.doc_id)
+        self.g.update_cas_content(self._get_cas_content([]), doc_id=self.doc_id)
+
+        self.assertEqual(set(ROGraph(include_schema=True)), set(self.g), "All RO's of the document should be removed.")
+
+    def test_ingestion_stats(self):
+        cas_content0 = self._get_cas_content([("RO 1", [("ARG0", "reporter"), ("V", "report")])])
+        cas_content1 = self._get_cas_content([("RO 1", [("ARG0", "other reporter"), ("V", "report")])])
+
+        self.g.update_cas_content(cas_content0, doc_id=self.doc_id)
+        stats0 = self.g.ingestion_stats
+
+        self.g.update_cas_content(cas_content1, doc_id=self.doc_id)
+        stats1 = self.g.ingestion_stats
+
+        with self.subTest("RO's"):
+            self.assertEqual(1, stats0["n_ro"])
+            self.assertEqual(1, stats1["n_ro"])
+
+        with self.subTest("Triples"):
+            # The number of RO's of the document is stored by the SPARQL update of the statistics.
+            self.assertEqual(len(self.g) - len(ROGraph(include_schema=True)) - 1, stats0["n_triples_added"])
+            self.assertEqual(0, stats0["n_triples_removed"])
+            self.assertLess(stats1["n_triples_added"], stats0["n_triples_added"], "Only the changed entity.")
+            self.assertGreater(stats1["n_triples_removed"], 0)
+
+        with self.subTest("Times"):
+            self.assertGreater(stats1["t_reconcile"], 0)
+            self.assertGreater(stats1["t_build"], 0)
+
+
+class TestDeterministicURI(unittest.TestCase):
+    def setUp(self) -> None:
+        self.doc_id = "https://example.com/doc1"
+
+    def test_same_uri(self):
+        g0 = ROGraph(deterministic_uri=True)
+        g1 = ROGraph(deterministic_uri=True)
+
+        cas_content0 = g0.add_cas_content(ExampleCasContent.build(), doc_id=self.doc_id)
+        cas_content1 = g1.add_cas_content(ExampleCasContent.build(), doc_id=self.doc_id)
+
+        with self.subTest("ID's"):
+            self.assertEqual(cas_content0, cas_content1)
+
+        with self.subTest("Graph"):
+            self.assertEqual(set(g0), set(g1))
+
+    def test_unique(self):
+        g = ROGraph(deterministic_uri=True)
+
+        cas_content = g.add_cas_content(ExampleCasContent.build(), doc_id=self.doc_id)
+
+        l_id = [ro_i["id"] for ro_i in cas_content[cas_parser.KEY_CHILDREN]] + [
+            ent_j["id"] for ro_i in cas_content[cas_parser.KEY_CHILDREN] for ent_j in ro_i[cas_parser.KEY_CHILDREN]
+        ]
+
+        self.assertEqual(len(l_id), len(set(l_id)), "Every RO and entity should get its own URI.")
+
+    def test_update(self):
+        g = ROGraph(deterministic_uri=True)
+        g_expected = ROGraph(deterministic_uri=True)
+
+        cas_content0 = TestUpdateCasContent._get_cas_content(
+            [("RO 1", [("ARG0", "reporter"), ("V", "report")]), ("RO 2", [("ARG1", "report")])]
+        )
+        cas_content1 = TestUpdateCasContent._get_cas_content(
+            [("RO 1", [("ARG0", "other reporter"), ("V", "report")]), ("RO 3", [("ARG1", "report")])]
+        )
+
+        g.update_cas_content(cas_content0, doc_id=self.doc_id)
+        g.update_cas_content(cas_content1, doc_id=self.doc_id)
+
+        g_expected.add_cas_content(
+            TestUpdateCasContent._get_cas_content(
+                [("RO 1", [("ARG0", "other reporter"), ("V", "report")]), ("RO 3", [("ARG1", "report")])]
+            ),
+            doc_id=self.doc_id,
+        )
+
+        self.assertEqual(set(g_expected), set(g), "Outdated RO's and entities should be removed.")
+
+    def test_update_empty(self):
+        g = ROGraph(deterministic_uri=True)
+
+        g.update_cas_content(ExampleCasContent.build(), doc_id=self.doc_id)
+        g.update_cas_content(TestUpdateCasContent._get_cas_content([]), doc_id=self.doc_id)
+
+        self.assertEqual(set(), set(g))
+
+
+class TestWriteCompactCasContent(unittest.TestCase):
+    def setUp(self) -> None:
+        self.doc_id = "https://example.com/doc1"
+
+    def _assert_same_as_graph(self, compact: cas_parser.CompactCasContent, graph_name=None):
+        g = ROGraph(deterministic_uri=True)
+        g.add_cas_content(compact.to_cas_content(), doc_id=self.doc_id)
+        # The statistics are rebuilt after a bulk load.
+        g.remove((None, PROP_N_RO_DOC, None))
+
+        lines_expected = set(g.serialize(format="nt").decode("utf-8").splitlines()) - {""}
+        if graph_name is not None:
+            lines_expected = {f"{line[:-2]} {graph_name.n3()} ." for line in lines_expected}
+
+        buffer = io.StringIO()
+        n_lines = ROGraph(deterministic_uri=True).write_compact_cas_content(
+            compact, self.doc_id, buffer, graph_name=graph_name
+        )
+        lines = buffer.getvalue().splitlines()
+
+        self.assertEqual(n_lines, len(lines))
+        self.assertEqual(lines_expected, set(lines))
+
+    def test_same_as_graph(self):
+        compact = cas_parser.CompactCasContent.from_cas_file(PATH_CAS, PATH_TYPESYSTEM)
+
+        with self.subTest("N-Triples"):
+            self._assert_same_as_graph(compact)
+
+        with self.subTest("N-Quads"):
+            self._assert_same_as_graph(compact, graph_name=URIRef("http://example.com/graph"))
+
+    def test_escape(self):
+        text = 'The "reporter" \\ shall\nreport é€😀 ARG9\r'
+        compact = cas_parser.CompactCasContent(text)
+        compact.add_ro(0, len(text))
+        compact.add_fragment(0, 14, "ARG0")
+        compact.add_fragment(24, 30, "V")
+        compact.add_fragment(30, len(text), "ARG9")  # Unknown class
+
+        self._assert_same_as_graph(compact)
+
+    def test_empty(self):
+        buffer = io.StringIO()
+
+        self.assertEqual(0, ROGraph().write_compact_cas_content(cas_parser.CompactCasContent(""), self.doc_id, buffer))
+        self.assertEqual("", buffer.getvalue())
+
+
+class TestRemoveReportingObligations(unittest.TestCase):
+    def setUp(self) -> None:
+        self.g = ROGraph(include_schema=True)
+        self.n_g_start = len(self.g)
+
+        self.cas_content = self.g.add_cas_content(ExampleCasContent.build(), doc_id="https://example.com/doc1")
+
+        self.l_ro = [URIRef(ro_i["id"]) for ro_i in self.cas_content[cas_parser.KEY_CHILDREN]]
+
+    def _get_triples(self, ro_i: dict) -> set:
+        l_node = {URIRef(ro_i["id"])} | {URIRef(ent_j["id"]) for ent_j in ro_i[cas_parser.KEY_CHILDREN]}
+
+        return {(s, p, o) for s, p, o in self.g if s in l_node or o in l_node}
+
+    def test_remove(self):
+        ro0, ro1 = self.cas_content[cas_parser.KEY_CHILDREN][:2]
+        triples_ro1 = self._get_triples(ro1)
+
+        self.g.remove_reporting_obligations([ro0["id"]])
+
+        with self.subTest("Removed"):
+            self.assertEqual(set(), self._get_triples(ro0))
+
+        with self.subTest("Other RO's untouched"):
+            self.assertEqual(triples_ro1, self._get_triples(ro1))
+
+    def test_keep_value(self):
+        ro0 = self.cas_content[cas_parser.KEY_CHILDREN][0]
+
+        self.g.remove_reporting_obligations([ro0["id"]], keep_value=True)
+
+        self.assertEqual({(URIRef(ro0["id"]), RDF.value, Literal(ro0[cas_parser.KEY_VALUE]))}, self._get_triples(ro0))
+
+    def test_batches(self):
+        l_update = []
+
+        update = self.g.update
+        with mock.patch.object(self.g, "update", side_effect=lambda q: l_update.append(q) or update(q)):
+            self.g.remove_reporting_obligations(self.l_ro, batch_size=5)
+
+        with self.subTest("Number of updates"):
+            self.assertEqual(math.ceil(len(self.l_ro) / 5), len(l_update))
+
+        with self.subTest("Everything removed"):
+            self.assertEqual(self.n_g_start + 1, len(self.g), "Only the catalogue document should be left.")
+
+
+class TestRemoveDocuments(unittest.TestCase):
+    def setUp(self) -> None:
+        self.g = ROGraph(include_schema=True)
+        self.triples_start = set(self.g)
+
+        self.source_id = "https://eba.europa.eu/"
+
+        self.l_doc_id = [f"https://example.com/doc{i}" for i in range(3)]
+        for doc_id in self.l_doc_id:
+            self.g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+            self.g.add_doc_source(doc_id, self.source_id, source_name="EBA")
+
+    def test_remove_documents(self):
+        l_progress = []
+
+        n = self.g.remove_documents(self.l_doc_id, batch_size=2, progress=l_progress.append)
+
+        with self.subTest("Number of documents"):
+            self.assertEqual(len(self.l_doc_id), n)
+
+        with self.subTest("Progress"):
+            self.assertEqual([2, 3], l_progress)
+
+        with self.subTest("Removed"):
+            # The document source is shared with other documents, so it is kept.
+            source_uri = URIRef(self.source_id)
+            self.assertEqual(
+                {(source_uri, RDF.type, RO_BASE.DocumentSource), (source_uri, RDF.value, Literal("EBA", lang="en"))},
+                set(self.g) - self.triples_start,
+            )
+
+    def test_remove_single_document(self):
+        triples = set(self.g)
+
+        g_expected = ROGraph(include_schema=True)
+        for doc_id in self.l_doc_id[1:]:
+            g_expected.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+            g_expected.add_doc_source(doc_id, self.source_id, source_name="EBA")
+
+        self.g.remove_documents(self.l_doc_id[:1])
+
+        def without_stats(triples_i):
+            # The statistics of the document source are updated, see TestSourceStats.
+            return {triple for triple in triples_i if triple[1] not in (PROP_N_DOC, PROP_N_RO)}
+
+        self.assertEqual(len(g_expected), len(self.g))
+        self.assertLess(without_stats(self.g), without_stats(triples))
+
+    def test_purge_doc_source(self):
+        self.g.add_cas_content(ExampleCasContent.build(), doc_id="other")
+
+        g_expected = ROGraph(include_schema=True)
+        g_expected.add_cas_content(ExampleCasContent.build(), doc_id="other")
+
+        n = self.g.purge_doc_source(self.source_id, batch_size=2)
+
+        with self.subTest("Number of documents"):
+            self.assertEqual(len(self.l_doc_id), n)
+
+        with self.subTest("Only the other document is left"):
+            self.assertEqual(len(g_expected), len(self.g))
+
+    def test_purge_resume(self):
+        def progress(n):
+            raise RuntimeError("Interrupted")
+
+        with self.assertRaises(RuntimeError):
+            self.g.purge_doc_source(self.source_id, batch_size=2, progress=progress)
+
+        with self.subTest("First batch removed"):
+            self.assertEqual(len(self.l_doc_id) - 2, len(list(self.g.subjects(RO_BASE.hasDocumentSource, None))))
+
+        self.assertEqual(len(self.l_doc_id) - 2, self.g.purge_doc_source(self.source_id, batch_size=2))
+        self.assertEqual(self.triples_start, set(self.g))
+
+
+class TestNamedGraphs(unittest.TestCase):
+    def setUp(self) -> None:
+        self.source_id = "https://eba.europa.eu/"
+        self.l_doc_id = [f"https://example.com/doc{i}" for i in range(2)]
+
+        self.g = ROGraph(include_schema=True, named_graphs=True)
+        # Union of all the named graphs.
+        self.dataset = ConjunctiveGraph(self.g.store)
+
+        self.g_default = ROGraph(include_schema=True, deterministic_uri=True)
+
+        for g in (self.g, self.g_default):
+            for doc_id in self.l_doc_id:
+                g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+                g.add_doc_source(doc_id, self.source_id, source_name="EBA")
+
+    def _get_graph(self, graph_name):
+        return set(self.dataset.get_context(graph_name))
+
+    def test_graphs(self):
+        self.assertEqual(
+            {GRAPH_SCHEMA, GRAPH_DOC_SOURCES, *map(ROGraph._get_cat_doc_uri, self.l_doc_id)},
+            {graph.identifier for graph in self.dataset.contexts()},
+        )
+
+    def test_union(self):
+        self.assertEqual(set(self.g_default), set(self.dataset), "Union should be the same as the default layout.")
+
+    def test_reingest(self):
+        cat_doc0, cat_doc1 = map(ROGraph._get_cat_doc_uri, self.l_doc_id)
+        triples_doc1 = self._get_graph(cat_doc1)
+
+        cas_content = TestUpdateCasContent._get_cas_content([("RO 1", [("ARG0", "reporter"), ("V", "report")])])
+        self.g.add_cas_content(cas_content, doc_id=self.l_doc_id[0])
+
+        g_expected = ROGraph(deterministic_uri=True)
+        g_expected.add_cas_content(
+            TestUpdateCasContent._get_cas_content([("RO 1", [("ARG0", "reporter"), ("V", "report")])]),
+            doc_id=self.l_doc_id[0],
+        )
+        # Stored with the links to the document sources.
+        g_expected.remove((None, PROP_N_RO_DOC, None))
+
+        with self.subTest("Replaced"):
+            self.assertEqual(set(g_expected), self._get_graph(cat_doc0))
+
+        with self.subTest("Other document unchanged"):
+            self.assertEqual(triples_doc1, self._get_graph(cat_doc1))
+
+    def test_reingest_empty(self):
+        cat_doc0, cat_doc1 = map(ROGraph._get_cat_doc_uri, self.l_doc_id)
+        triples_doc1 = self._get_graph(cat_doc1)
+
+        self.g.add_cas_content(TestUpdateCasContent._get_cas_content([]), doc_id=self.l_doc_id[0])
+
+        with self.subTest("Removed"):
+            self.assertFalse(self._get_graph(cat_doc0))
+
+        with self.subTest("Other document unchanged"):
+            self.assertEqual(triples_doc1, self._get_graph(cat_doc1))
+
+        with self.subTest("Link to the source kept"):
+            self.assertIn((cat_doc0, HAS_DOC_SRC, ROGraph._get_source_uri(self.source_id)), self.dataset)
+
+    def test_remove_documents(self):
+        self.g.remove_documents(self.l_doc_id[:1])
+        self.g_default.remove_documents(self.l_doc_id[:1])
+
+        self.assertEqual(set(self.g_default), set(self.dataset))
+
+    def test_remove_reporting_obligations(self):
+        l_ro_uri = list(self.g_default.subjects(RDF.type, ROGraph.class_rep_obl))[:3]
+
+        self.g.remove_reporting_obligations(l_ro_uri)
+        self.g_default.remove_reporting_obligations(l_ro_uri)
+
+        self.assertEqual(set(self.g_default), set(self.dataset))
+
+    def test_purge_doc_source(self):
+        self.assertEqual(len(self.l_doc_id), self.g.purge_doc_source(self.source_id, batch_size=1))
+
+        self.assertEqual(set(ROGraph(include_schema=True)), set(self.dataset))
+
+
+class TestSortKey(unittest.TestCase):
+    def test_same_as_sparql(self):
+        """
+        The stored sort key should be identical to the one that used to be computed within the SPARQL queries.
+        """
+
+        l_label = ["Competent authority", " 2. the institution", "Article 5(1)", "ÉSMA", "1234", "\tmember  State "]
+
+        g = ROGraph()
+
+        for label in l_label:
+            q = f"""
+                SELECT ?special_sort
+                WHERE {{
+                    BIND (LCASE({Literal(label).n3()}) AS ?value_ent_lower)
+                    BIND (REPLACE(REPLACE(?value_ent_lower,'[^a-zA-Z\\\\s]+', ''), '^[ \\t]+|[ \\t]+$','') AS ?special_sort)
+                }}
+            """
+            (special_sort,), = g.query(q)
+
+            with self.subTest(label):
+                self.assertEqual(str(special_sort), get_sort_key(label))
+
+    def test_add_cas_content(self):
+        g = ROGraph()
+        cas_content = ExampleCasContent.build()
+        g.add_cas_content(cas_content, "doc_sort_key")
+
+        for ro_i in cas_content[cas_parser.KEY_CHILDREN]:
+            for ent_j in ro_i[cas_parser.KEY_CHILDREN]:
+                with self.subTest(ent_j[cas_parser.KEY_VALUE]):
+                    self.assertEqual(
+                        Literal(get_sort_key(ent_j[cas_parser.KEY_VALUE])),
+                        g.value(URIRef(ent_j["id"]), PROP_SORT_KEY),
+                    )
+
+    def test_backfill(self):
+        g = ROGraph()
+        g.add_cas_content(ExampleCasContent.build(), "doc_sort_key")
+
+        l_sort_key = sorted(g.triples((None, PROP_SORT_KEY, None)))
+        g.remove((None, PROP_SORT_KEY, None))
+
+        n = g.add_sort_keys(batch_size=2)
+
+        with self.subTest("Number of entities"):
+            self.assertEqual(len(l_sort_key), n)
+
+        with self.subTest("Identical"):
+            self.assertEqual(l_sort_key, sorted(g.triples((None, PROP_SORT_KEY, None))))
+
+        with self.subTest("Nothing left"):
+            self.assertEqual(0, g.add_sort_keys())
+
+
 class TestAddDocSource(unittest.TestCase):
     def setUp(self) -> None:
         self.g = ROGraph(include_schema=True)
@@ -247,6 +750,166 @@ class TestAddDocSource(unittest.TestCase):
         self.assertEqual(n_g_update, len(self.g), "Graph should be restored to previous state.")
 
 
+class TestDocSourceCache(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cache = DocSourceCache(maxsize=2)
+        self.dataset = "http://fuseki:3030/RO/update"
+
+    def test_known(self):
+        self.cache.add(self.dataset, "https://eba.europa.eu/", "EBA")
+
+        with self.subTest("Same source"):
+            self.assertTrue(self.cache.is_known(self.dataset, "https://eba.europa.eu/", "EBA"))
+            self.assertTrue(self.cache.is_known(self.dataset, "https://eba.europa.eu/"))
+
+        with self.subTest("New label"):
+            self.assertFalse(self.cache.is_known(self.dataset, "https://eba.europa.eu/", "European Banking Authority"))
+
+        with self.subTest("Other dataset"):
+            self.assertFalse(self.cache.is_known("http://other:3030/RO/update", "https://eba.europa.eu/", "EBA"))
+
+        self.cache.discard(self.dataset, "https://eba.europa.eu/")
+        with self.subTest("Discarded"):
+            self.assertFalse(self.cache.is_known(self.dataset, "https://eba.europa.eu/", "EBA"))
+
+    def test_maxsize(self):
+        for source_id in ("a", "b", "c"):
+            self.cache.add(self.dataset, source_id)
+
+        self.assertEqual([False, True, True], [self.cache.is_known(self.dataset, source_id) for source_id in "abc"])
+
+    def test_link_only(self):
+        g = ROGraph()
+        g.add_doc_source("doc1", "https://eba.europa.eu/", "EBA", b_link_only=True)
+
+        self.assertEqual(
+            {(ROGraph._get_cat_doc_uri("doc1"), ROGraph.prop_has_doc_src, URIRef("https://eba.europa.eu/"))}, set(g)
+        )
+
+
+class TestSourceStats(unittest.TestCase):
+    def setUp(self) -> None:
+        self.source_id = "https://eba.europa.eu/"
+        self.l_doc_id = [f"https://example.com/doc{i}" for i in range(3)]
+
+        self.n_ro = len(ExampleCasContent.build()[cas_parser.KEY_CHILDREN])
+
+    def _get_graph(self, named_graphs):
+        g = ROGraph(named_graphs=named_graphs)
+
+        for doc_id in self.l_doc_id[:2]:
+            g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+            g.add_doc_source(doc_id, self.source_id, source_name="EBA")
+
+        return g
+
+    def _get_stats(self, g: ROGraph):
+        source_uri = URIRef(self.source_id)
+
+        return [
+            [int(o) for o in ConjunctiveGraph(g.store).objects(source_uri, prop)] for prop in (PROP_N_DOC, PROP_N_RO)
+        ]
+
+    def _assert_stats(self, g: ROGraph, n_doc: int, n_ro: int):
+        stats = self._get_stats(g)
+
+        with self.subTest("Stats"):
+            self.assertEqual([[n_doc], [n_ro]] if n_doc else [[], []], stats)
+
+        with self.subTest("Same as rebuild"):
+            g.rebuild_source_stats()
+            self.assertEqual(stats, self._get_stats(g))
+
+    def test_ingest(self):
+        for named_graphs in (False, True):
+            with self.subTest(named_graphs=named_graphs):
+                g = self._get_graph(named_graphs)
+                self._assert_stats(g, 2, 2 * self.n_ro)
+
+                # Link first, content afterwards.
+                g.add_doc_source(self.l_doc_id[2], self.source_id)
+                g.add_cas_content(ExampleCasContent.build(), doc_id=self.l_doc_id[2])
+                self._assert_stats(g, 3, 3 * self.n_ro)
+
+    def test_reingest(self):
+        for deterministic_uri in (False, True):
+            with self.subTest(deterministic_uri=deterministic_uri):
+                g = ROGraph(deterministic_uri=deterministic_uri)
+                for doc_id in self.l_doc_id[:2]:
+                    g.update_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+                    g.add_doc_source(doc_id, self.source_id)
+
+                cas_content = TestUpdateCasContent._get_cas_content([("RO 1", [("ARG0", "reporter"), ("V", "report")])])
+                g.update_cas_content(cas_content, doc_id=self.l_doc_id[0])
+
+                self._assert_stats(g, 2, self.n_ro + 1)
+
+                g.update_cas_content(TestUpdateCasContent._get_cas_content([]), doc_id=self.l_doc_id[0])
+
+                self._assert_stats(g, 1, self.n_ro)
+
+    def test_remove(self):
+        for named_graphs in (False, True):
+            with self.subTest(named_graphs=named_graphs):
+                g = self._get_graph(named_graphs)
+                dataset = ConjunctiveGraph(g.store)
+
+                l_ro_uri = list(dataset.subjects(RDF.type, ROGraph.class_rep_obl))[:3]
+                cat_doc1 = ROGraph._get_cat_doc_uri(self.l_doc_id[1])
+                n_removed_doc1 = sum((cat_doc1, ROGraph.prop_has_rep_obl, ro_uri) in dataset for ro_uri in l_ro_uri)
+
+                g.remove_reporting_obligations(l_ro_uri)
+                self._assert_stats(g, 2, 2 * self.n_ro - 3)
+
+                g.remove_documents(self.l_doc_id[:1])
+                self._assert_stats(g, 1, self.n_ro - n_removed_doc1)
+
+    def test_unlink(self):
+        for named_graphs in (False, True):
+            with self.subTest(named_graphs=named_graphs):
+                g = self._get_graph(named_graphs)
+
+                g.remove_doc_source(self.l_doc_id[0])
+                self._assert_stats(g, 1, self.n_ro)
+
+                g.remove_doc_source(self.l_doc_id[1])
+                self._assert_stats(g, 0, 0)
+
+    def test_purge(self):
+        g = self._get_graph(False)
+        g.purge_doc_source(self.source_id)
+
+        self._assert_stats(g, 0, 0)
+
+    def test_stored_doc_stats(self):
+        """
+        The statistics change by the stored number of RO's of a document, its RO's are not counted again.
+        """
+        for named_graphs in (False, True):
+            with self.subTest(named_graphs=named_graphs):
+                g = self._get_graph(named_graphs)
+                dataset = ConjunctiveGraph(g.store)
+                cat_doc0 = ROGraph._get_cat_doc_uri(self.l_doc_id[0])
+
+                with self.subTest("Stored"):
+                    self.assertEqual([self.n_ro], [int(o) for o in dataset.objects(cat_doc0, PROP_N_RO_DOC)])
+
+                # Drift
+                (dataset.get_context(GRAPH_DOC_SOURCES) if named_graphs else g).set(
+                    (cat_doc0, PROP_N_RO_DOC, Literal(1))
+                )
+
+                g.remove_documents(self.l_doc_id[:1])
+
+                with self.subTest("Removed"):
+                    self.assertEqual([[1], [2 * self.n_ro - 1]], self._get_stats(g))
+                    self.assertEqual([], list(dataset.objects(cat_doc0, PROP_N_RO_DOC)))
+
+                with self.subTest("Rebuild"):
+                    g.rebuild_source_stats()
+                    self.assertEqual([[1], [self.n_ro]], self._get_stats(g))
+
+
 class TestGetDocSource(unittest.TestCase):
     def setUp(self) -> None:
         self.g = ROGraph(include_schema=True)
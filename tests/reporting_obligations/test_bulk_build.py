@@ -0,0 +1,74 @@
+import gzip
+import os
+import tempfile
+import unittest
+
+import rdflib
+
+from dgfisma_rdf.reporting_obligations import bulk_build
+from dgfisma_rdf.reporting_obligations.build_rdf import ROGraph
+from dgfisma_rdf.reporting_obligations.rdf_parser import SPARQLReportingObligationProvider, RDFLibGraphWrapper
+
+ROOT = os.path.join(os.path.dirname(__file__), "../..")
+FOLDER_CAS = os.path.join(ROOT, "tests/reporting_obligations/app/data_test")
+
+
+class TestBuild(unittest.TestCase):
+    def test_build(self):
+        with tempfile.TemporaryDirectory() as d:
+            stats = bulk_build.build(FOLDER_CAS, d, n_workers=2)
+
+            with self.subTest("Statistics"):
+                self.assertGreater(stats["n_doc"], 0)
+                self.assertGreater(stats["n_ro"], 0)
+                self.assertGreater(stats["n_triples"], 0)
+
+            g = ROGraph()
+            for filename in sorted(os.listdir(d)):
+                g.parse(os.path.join(d, filename), format="nt")
+
+            with self.subTest("Number of triples"):
+                self.assertGreater(len(g), stats["n_triples"], "Should contain the RO's and the schema.")
+
+            with self.subTest("Readable by the provider"):
+                path_rdf = os.path.join(d, "merged.rdf")
+                g.serialize(destination=path_rdf, format="xml")
+
+                prov = SPARQLReportingObligationProvider(RDFLibGraphWrapper(path_rdf))
+                self.assertEqual(stats["n_ro"], len(prov.get_all_ro_uri()))
+
+    def test_idempotent(self):
+        with tempfile.TemporaryDirectory() as d0, tempfile.TemporaryDirectory() as d1:
+            # Several shards, which should contain the same documents.
+            bulk_build.build(FOLDER_CAS, d0, n_workers=1, shard_size=100)
+            bulk_build.build(FOLDER_CAS, d1, n_workers=2, shard_size=100)
+
+            with self.subTest("Shards"):
+                self.assertGreater(len(os.listdir(d0)), 2)
+                self.assertEqual(sorted(os.listdir(d0)), sorted(os.listdir(d1)))
+
+            for filename in os.listdir(d0):
+                with self.subTest(filename):
+                    with open(os.path.join(d0, filename)) as f0, open(os.path.join(d1, filename)) as f1:
+                        self.assertEqual(f0.read(), f1.read())
+
+    def test_nquads_gzip(self):
+        with tempfile.TemporaryDirectory() as d:
+            stats = bulk_build.build(FOLDER_CAS, d, fmt=bulk_build.NQ, b_gzip=True, include_schema=False)
+
+            filename = "ro_00000.nq.gz"
+            self.assertIn(filename, os.listdir(d))
+
+            g = rdflib.ConjunctiveGraph()
+            with gzip.open(os.path.join(d, filename), "rb") as f:
+                g.parse(f, format="nquads")
+
+            self.assertEqual(stats["n_triples"], len(g))
+            # Documents without reporting obligations have no triples.
+            n_graphs = len(list(g.contexts()))
+            self.assertGreater(n_graphs, 1, "One named graph per document.")
+            self.assertLessEqual(n_graphs, stats["n_doc"], "One named graph per document.")
+
+
+if __name__ == "__main__":
+    unittest.main()
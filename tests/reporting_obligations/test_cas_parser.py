@@ -1,8 +1,13 @@
+import json
 import os
+import pickle
 import unittest
+from unittest import mock
+
+import cassis
 
 import tests.reporting_obligations.build_rdf_example
-from dgfisma_rdf.reporting_obligations import cas_parser
+from dgfisma_rdf.reporting_obligations import cas_parser, typesystem
 
 ROOT = os.path.join(os.path.dirname(__file__), "../..")
 # fixed example.
@@ -99,5 +104,115 @@ class TestMain(unittest.TestCase):
                 self.assertIn(seg[KEY_VALUE], s)
 
 
+class TestCompactCasContent(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cas_content = cas_parser.CasContent.from_cas_file(path_cas, path_typesystem)
+        self.compact = cas_parser.CompactCasContent.from_cas_file(path_cas, path_typesystem)
+
+    def test_to_cas_content(self):
+        cas_content = self.compact.to_cas_content()
+
+        with self.subTest("Same content"):
+            self.assertEqual(self.cas_content, cas_content)
+            self.assertEqual(json.dumps(self.cas_content), json.dumps(cas_content), "Same JSON, including the order.")
+
+        with self.subTest("Types"):
+            ro0 = cas_content[KEY_CHILDREN][0]
+            self.assertIsInstance(cas_content, cas_parser.CasContent)
+            self.assertIsInstance(ro0, cas_parser.ROContent)
+            self.assertIsInstance(ro0[KEY_CHILDREN][0], cas_parser.SentenceFragment)
+
+    def test_compact(self):
+        self.assertEqual(len(self.cas_content[KEY_CHILDREN]), len(self.compact))
+
+        with self.subTest("Classes only saved once"):
+            l_class = [
+                frag[KEY_SENTENCE_FRAG_CLASS] for ro in self.cas_content[KEY_CHILDREN] for frag in ro[KEY_CHILDREN]
+            ]
+            self.assertEqual(sorted(set(l_class)), sorted(self.compact.classes))
+
+        with self.subTest("Spans"):
+            for i, ro in enumerate(self.cas_content[KEY_CHILDREN]):
+                self.assertEqual(ro[KEY_VALUE], self.compact.get_ro_value(i))
+                self.assertEqual(
+                    [(frag[KEY_VALUE], frag[KEY_SENTENCE_FRAG_CLASS]) for frag in ro[KEY_CHILDREN]],
+                    list(self.compact.iter_fragments(i)),
+                )
+
+    def test_pickle(self):
+        compact = pickle.loads(pickle.dumps(self.compact))
+
+        self.assertEqual(self.cas_content, compact.to_cas_content())
+
+
+class TestParseAttributes(unittest.TestCase):
+    def test_attributes(self):
+        for str_attr, expected in [
+            ("class='ARG0'", {"class": "ARG0"}),
+            ("class='ARGM-TMP' id='ro_1' confidence='0.93'", {"class": "ARGM-TMP", "id": "ro_1", "confidence": "0.93"}),
+            ("id='ro_1' class='super note-tag'", {"id": "ro_1", "class": "super note-tag"}),
+            ('class="V" id = \'a=b\'', {"class": "V", "id": "a=b"}),
+            ("", {}),
+        ]:
+            with self.subTest(str_attr):
+                self.assertEqual(expected, dict(cas_parser.parse_attributes(str_attr)))
+
+    def test_get_span_class(self):
+        self.assertEqual("ARG1", cas_parser.get_span_class("class='ARG1' id='x'"))
+
+        with self.subTest("No class"):
+            for str_attr in ("", "id='x'"):
+                with self.assertRaises(ValueError):
+                    cas_parser.get_span_class(str_attr)
+
+    def test_cached(self):
+        cas_parser.parse_attributes.cache_clear()
+
+        attributes = cas_parser.parse_attributes("class='ARG2'")
+
+        self.assertIs(attributes, cas_parser.parse_attributes("class='ARG2'"))
+        self.assertEqual(1, cas_parser.parse_attributes.cache_info().hits)
+
+        with self.assertRaises(TypeError, msg="Should be read-only, as it is shared."):
+            attributes["class"] = "ARG3"
+
+
+class TestFromCasFiles(unittest.TestCase):
+    def setUp(self) -> None:
+        folder_cas = os.path.join(ROOT, "tests/reporting_obligations/app/data_test")
+        self.l_path_cas = [path_cas] + [
+            os.path.join(folder_cas, filename) for filename in ("ro_cas_1.xml", "ro_cas_2.xml", "ro_cas_1.xml")
+        ]
+
+    def test_same_as_from_cas_file(self):
+        l_expected = [cas_parser.CasContent.from_cas_file(path, path_typesystem) for path in self.l_path_cas]
+
+        for n_workers in (None, 2):
+            with self.subTest(n_workers=n_workers):
+                l_cas_content = cas_parser.CasContent.from_cas_files(self.l_path_cas, path_typesystem, n_workers)
+
+                self.assertEqual(l_expected, l_cas_content, "Should be in the same order.")
+                for cas_content in l_cas_content:
+                    self.assertIsInstance(cas_content, cas_parser.CasContent)
+
+    def test_compact(self):
+        l_compact = cas_parser.CasContent.from_cas_files(self.l_path_cas, path_typesystem, compact=True)
+
+        self.assertEqual(
+            cas_parser.CasContent.from_cas_files(self.l_path_cas, path_typesystem),
+            [compact.to_cas_content() for compact in l_compact],
+        )
+
+    def test_typesystem_loaded_once(self):
+        with mock.patch("dgfisma_rdf.reporting_obligations.typesystem.load_typesystem") as load_typesystem:
+            load_typesystem.side_effect = cassis.load_typesystem
+
+            # Not loaded yet by the other tests.
+            typesystem._TYPESYSTEMS.clear()
+            cas_parser.CasContent.from_cas_files(self.l_path_cas, path_typesystem)
+
+        self.assertEqual(1, load_typesystem.call_count)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest import mock
+
+import httpx
+
+from dgfisma_rdf.reporting_obligations import deadlines
+from dgfisma_rdf.reporting_obligations.rdf_parser import SPARQLGraphWrapper, SPARQLReportingObligationProvider
+from dgfisma_rdf.reporting_obligations.rdf_parser_async import AsyncSPARQLGraphWrapper
+
+ENDPOINT = "http://fuseki.test/RO/query"
+
+
+class TestDeadline(unittest.TestCase):
+    def test_nested(self):
+        with deadlines.deadline(10) as d_outer:
+            with deadlines.deadline(100) as d_inner:
+                with self.subTest("Earliest applies"):
+                    self.assertLessEqual(d_inner.remaining(), 10)
+
+                d_outer.cancel()
+
+                with self.subTest("Cancelled with the outer one"):
+                    self.assertRaises(deadlines.QueryCancelled, d_inner.check)
+
+            self.assertIs(d_outer, deadlines.get_current_deadline())
+
+        self.assertIsNone(deadlines.get_current_deadline())
+
+    def test_timeout(self):
+        with deadlines.deadline(0):
+            self.assertRaises(deadlines.QueryTimeout, deadlines.get_query_timeouts)
+
+        with self.subTest("No deadline"):
+            self.assertIsNone(deadlines.get_query_timeouts())
+
+        with self.subTest("Client margin"):
+            with deadlines.deadline(5):
+                timeout_fuseki, timeout_client = deadlines.get_query_timeouts()
+
+                self.assertAlmostEqual(timeout_fuseki + deadlines.CLIENT_TIMEOUT_MARGIN, timeout_client)
+
+    def test_cancel_callback(self):
+        callback = mock.Mock()
+
+        d_parent = deadlines.Deadline()
+        d = deadlines.Deadline(parent=d_parent)
+
+        remove = d.add_cancel_callback(callback)
+        d_parent.cancel()
+
+        with self.subTest("Called"):
+            callback.assert_called_once()
+
+        with self.subTest("Removed"):
+            d = deadlines.Deadline()
+            d.add_cancel_callback(callback)()
+            d.cancel()
+
+            callback.assert_called_once()
+
+        with self.subTest("Already cancelled"):
+            remove()
+            d.add_cancel_callback(callback)
+
+            self.assertEqual(2, callback.call_count)
+
+
+class TestSuperseder(unittest.TestCase):
+    def test_latest(self):
+        superseder = deadlines.Superseder()
+
+        with superseder.latest("user/type") as d_old:
+            with self.subTest("Other key"):
+                with superseder.latest("user/other_type"):
+                    self.assertFalse(d_old.is_cancelled())
+
+            def newer_call():
+                with superseder.latest("user/type") as d_new:
+                    l_new.append(d_new.is_cancelled())
+
+            # E.g. from the thread of the request with the next character.
+            l_new = []
+            thread = threading.Thread(target=newer_call)
+            thread.start()
+            thread.join()
+
+            self.assertRaises(deadlines.QueryCancelled, deadlines.get_query_timeouts)
+
+            with self.subTest("Newer call"):
+                self.assertEqual([False], l_new)
+
+
+class TestProviderTimeout(unittest.TestCase):
+    def setUp(self) -> None:
+        self.l_deadline = []
+
+        graph_wrapper = mock.Mock()
+        graph_wrapper.query.side_effect = lambda q: self.l_deadline.append(deadlines.get_current_deadline()) or []
+        graph_wrapper.get_column.return_value = []
+
+        self.graph_wrapper = graph_wrapper
+
+    def test_default(self):
+        prov = SPARQLReportingObligationProvider(self.graph_wrapper, timeout=10)
+
+        prov.get_all_ro_uri()
+
+        self.assertLessEqual(self.l_deadline[0].remaining(), 10)
+
+        with self.subTest("Per call"):
+            with deadlines.deadline(1):
+                prov.get_all_ro_uri()
+
+            self.assertLessEqual(self.l_deadline[1].remaining(), 1)
+
+    def test_no_timeout(self):
+        prov = SPARQLReportingObligationProvider(self.graph_wrapper)
+
+        prov.get_all_ro_uri()
+
+        self.assertIsNone(self.l_deadline[0])
+
+    def test_worker_threads(self):
+        prov = SPARQLReportingObligationProvider(self.graph_wrapper)
+
+        with deadlines.deadline(10) as d:
+            prov.get_filter_entities_from_types(["type1", "type2"])
+
+        self.assertEqual([d, d], self.l_deadline)
+
+
+class TestSPARQLGraphWrapper(unittest.TestCase):
+    def setUp(self) -> None:
+        self.graph_wrapper = SPARQLGraphWrapper(ENDPOINT)
+
+        ret = mock.Mock()
+        ret.response.read.return_value = b'{"head": {"vars": []}, "results": {"bindings": []}}'
+
+        patcher = mock.patch.object(self.graph_wrapper.sparql, "query", return_value=ret)
+        self.query = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_timeout_parameter(self):
+        with deadlines.deadline(5):
+            self.graph_wrapper.query("SELECT * WHERE { } LIMIT 1")
+
+        with self.subTest("Fuseki"):
+            timeout_fuseki = float(self.graph_wrapper.sparql.parameters["timeout"][0])
+            self.assertTrue(4 < timeout_fuseki <= 5)
+
+        with self.subTest("Client"):
+            self.assertEqual(6, self.graph_wrapper.sparql.timeout)
+
+        with self.subTest("Cleared"):
+            self.graph_wrapper.query("SELECT * WHERE { } LIMIT 1")
+
+            self.assertNotIn("timeout", self.graph_wrapper.sparql.parameters)
+            self.assertIsNone(self.graph_wrapper.sparql.timeout)
+
+    def test_cancelled(self):
+        with deadlines.deadline() as d:
+            d.cancel()
+
+            with self.assertRaises(deadlines.QueryCancelled):
+                self.graph_wrapper.query("SELECT * WHERE { } LIMIT 1")
+
+        self.query.assert_not_called()
+
+
+class TestAsyncCancel(unittest.IsolatedAsyncioTestCase):
+    async def test_cancel_running(self):
+        async def handler(request: httpx.Request):
+            with self.subTest("Fuseki timeout"):
+                self.assertIn("timeout", request.url.params)
+
+            await asyncio.sleep(10)
+
+        async with AsyncSPARQLGraphWrapper(ENDPOINT, transport=httpx.MockTransport(handler)) as graph_wrapper:
+            with deadlines.deadline(30) as d:
+                # Cancelled from another thread, e.g. by a newer call.
+                threading.Timer(0.1, d.cancel).start()
+
+                t0 = time.monotonic()
+                with self.assertRaises(deadlines.QueryCancelled):
+                    await graph_wrapper.query("SELECT * WHERE { } LIMIT 1")
+
+                self.assertLess(time.monotonic() - t0, 5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import logging
+import os
+import unittest
+
+from prometheus_client import CollectorRegistry, generate_latest
+
+from dgfisma_rdf.reporting_obligations import instrumentation
+from dgfisma_rdf.reporting_obligations.build_rdf import D_ENTITIES
+from dgfisma_rdf.reporting_obligations.rdf_parser import SPARQLReportingObligationProvider, RDFLibGraphWrapper
+
+ROOT = os.path.join(os.path.dirname(__file__), "../..")
+MOCKUP_FILENAME = os.path.join(ROOT, "data/examples", "reporting_obligations_mockup.rdf")
+
+
+class RecordingHook(instrumentation.QueryHook):
+    def __init__(self):
+        self.records = []
+
+    def on_query(self, record):
+        self.records.append(record)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self) -> None:
+        self.prov = SPARQLReportingObligationProvider(RDFLibGraphWrapper(MOCKUP_FILENAME))
+
+        self.hook = instrumentation.add_hook(RecordingHook())
+
+    def tearDown(self) -> None:
+        instrumentation.remove_hook(self.hook)
+
+    def test_record(self):
+        l_ro = self.prov.get_all_ro_uri()
+
+        self.assertEqual(1, len(self.hook.records))
+        record = self.hook.records[0]
+
+        with self.subTest("Method"):
+            self.assertEqual("get_all_ro_uri", record.method)
+
+        with self.subTest("Rows"):
+            self.assertEqual(len(l_ro), record.n_rows)
+
+        with self.subTest("Times"):
+            self.assertGreater(record.t_network, 0)
+            self.assertGreaterEqual(record.t_decode, 0)
+            self.assertGreaterEqual(record.t_post, 0)
+
+        with self.subTest("Hash"):
+            self.assertEqual(record.query_hash, instrumentation.get_query_hash(record.query))
+            self.assertEqual(record.query_hash, instrumentation.get_query_hash("  " + record.query.replace(" ", "\n")))
+
+    def test_nested(self):
+        """
+        Queries of methods that are called by other methods are recorded with the inner method.
+        """
+        self.prov.get_filter_entities_from_types([D_ENTITIES["V"][0], D_ENTITIES["ARG0"][0]], max_concurrent=1)
+
+        self.assertEqual(
+            ["get_filter_entities_from_type_lazy_loading"] * 2, [record.method for record in self.hook.records]
+        )
+
+    def test_no_hooks(self):
+        instrumentation.remove_hook(self.hook)
+
+        self.prov.get_all_ro_uri()
+        self.assertFalse(instrumentation.is_enabled())
+
+        instrumentation.add_hook(self.hook)
+        self.assertEqual([], self.hook.records)
+
+    def test_slow_query_logger(self):
+        logger = logging.getLogger("test_slow_query_logger")
+
+        slow_logger = instrumentation.add_hook(instrumentation.SlowQueryLogger(threshold=0, logger=logger))
+        fast_logger = instrumentation.add_hook(instrumentation.SlowQueryLogger(threshold=3600, logger=logger))
+        try:
+            with self.assertLogs(logger, level=logging.WARNING) as cm:
+                self.prov.get_all_ro_uri()
+        finally:
+            instrumentation.remove_hook(slow_logger)
+            instrumentation.remove_hook(fast_logger)
+
+        self.assertEqual(1, len(cm.output), "Only the logger with the low threshold should log.")
+        self.assertIn("get_all_ro_uri", cm.output[0])
+        self.assertIn(self.hook.records[0].query_hash, cm.output[0])
+
+    def test_prometheus(self):
+        registry = CollectorRegistry()
+        hook = instrumentation.add_hook(instrumentation.PrometheusQueryMetrics(registry))
+        try:
+            self.prov.get_all_ro_uri()
+            self.prov.get_all_ro_uri()
+        finally:
+            instrumentation.remove_hook(hook)
+
+        l_lines = generate_latest(registry).decode().splitlines()
+
+        for line in [
+            'ro_sparql_queries_total{method="get_all_ro_uri"} 2.0',
+            'ro_sparql_query_seconds_count{method="get_all_ro_uri"} 2.0',
+            'ro_sparql_query_stage_seconds_count{method="get_all_ro_uri",stage="network"} 2.0',
+        ]:
+            with self.subTest(line):
+                self.assertIn(line, l_lines)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import os
+import pstats
+import tempfile
+import unittest
+from unittest import mock
+
+from dgfisma_rdf.reporting_obligations import profiling
+
+
+def fib(n):
+    return n if n < 2 else fib(n - 1) + fib(n - 2)
+
+
+class TestProfiled(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def _patch(self, mode):
+        patcher = mock.patch.multiple(profiling, MODE=mode, PROFILE_DIR=self.tmp_dir.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_off(self):
+        self._patch(profiling.OFF)
+
+        self.assertIs(fib, profiling.profiled(fib), "Should not add any overhead.")
+
+    def test_all(self):
+        self._patch(profiling.ALL)
+
+        f = profiling.profiled(fib, name="fib")
+
+        self.assertEqual(fib(10), f(10))
+
+        l_files = os.listdir(self.tmp_dir.name)
+
+        with self.subTest("Single file"):
+            self.assertEqual(1, len(l_files))
+            self.assertTrue(l_files[0].endswith("_fib.prof"))
+
+        with self.subTest("Readable"):
+            stats = pstats.Stats(os.path.join(self.tmp_dir.name, l_files[0]))
+            self.assertIn("fib", {func_name for _, _, func_name in stats.stats})
+
+    def test_request(self):
+        self._patch(profiling.REQUEST)
+
+        f = profiling.profiled(fib)
+
+        f(5)
+        with self.subTest("Not requested"):
+            self.assertEqual([], os.listdir(self.tmp_dir.name))
+
+        with profiling.requested():
+            f(5)
+        with self.subTest("Requested"):
+            self.assertEqual(1, len(os.listdir(self.tmp_dir.name)))
+
+    def test_nested(self):
+        """
+        Only the outermost profiled function is saved.
+        """
+        self._patch(profiling.ALL)
+
+        inner = profiling.profiled(fib, name="inner")
+        outer = profiling.profiled(lambda n: inner(n) + inner(n), name="outer")
+
+        outer(5)
+
+        l_files = os.listdir(self.tmp_dir.name)
+        self.assertEqual(1, len(l_files))
+        self.assertTrue(l_files[0].endswith("_outer.prof"))
+
+
+if __name__ == "__main__":
+    unittest.main()
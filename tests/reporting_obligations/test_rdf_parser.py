@@ -3,18 +3,31 @@ import random
 import re
 import string
 import tempfile
+import threading
+import time
 import unittest
 from typing import Iterable, List
+from unittest import mock
 
-from rdflib.term import URIRef
+from rdflib import ConjunctiveGraph
+from rdflib.term import Literal, URIRef
 
-from dgfisma_rdf.reporting_obligations import build_rdf, rdf_parser
+from dgfisma_rdf.reporting_obligations import build_rdf, cas_parser, rdf_parser
 from dgfisma_rdf.reporting_obligations.build_rdf import D_ENTITIES, ROGraph
 from dgfisma_rdf.reporting_obligations.rdf_parser import (
     SPARQLReportingObligationProvider,
     RDFLibGraphWrapper,
     SPARQLGraphWrapper,
     URIS,
+    COUNT,
+    VALUE,
+    STARTS_WITH,
+    RO_ID,
+    RO_VALUE,
+    DOC,
+    DOC_SRC,
+    ENTITIES,
+    PRED,
 )
 from tests.reporting_obligations.build_rdf_example import ExampleCasContent
 
@@ -67,6 +80,105 @@ class TestRDFLibGraphWrapper(unittest.TestCase):
             )
 
 
+class TestNamedGraphs(unittest.TestCase):
+    """
+    The provider gives the same results when every document is in its own named graph.
+    """
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        g = ROGraph(include_schema=True, named_graphs=True)
+        g_default = ROGraph(include_schema=True, deterministic_uri=True)
+
+        for g_i in (g, g_default):
+            for doc_id in ("doc1", "doc2"):
+                g_i.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+                g_i.add_doc_source(doc_id, "https://eba.europa.eu/", source_name="EBA")
+
+        filename = os.path.join(self.tmp_dir.name, "named_graphs.nq")
+        ConjunctiveGraph(g.store).serialize(filename, format="nquads")
+
+        filename_default = os.path.join(self.tmp_dir.name, "default.nt")
+        g_default.serialize(filename_default, format="nt")
+
+        self.prov = SPARQLReportingObligationProvider(RDFLibGraphWrapper(filename))
+        self.prov_default = SPARQLReportingObligationProvider(RDFLibGraphWrapper(filename_default))
+
+    def test_same_results(self):
+        for method in ("get_different_entity_types", "get_all_ro_uri", "get_all_doc_uri", "get_entities"):
+            with self.subTest(method):
+                self.assertEqual(
+                    sorted(map(str, getattr(self.prov_default, method)())),
+                    sorted(map(str, getattr(self.prov, method)())),
+                )
+
+        with self.subTest("get_document_and_source_pairs"):
+            self.assertEqual(
+                sorted(self.prov_default.get_document_and_source_pairs()),
+                sorted(self.prov.get_document_and_source_pairs()),
+            )
+
+        with self.subTest("info_doc_source"):
+            self.assertEqual(self.prov_default.info_doc_source(), self.prov.info_doc_source())
+
+    def test_info_doc_source(self):
+        n_ro = len(ExampleCasContent.build()[build_rdf.KEY_CHILDREN])
+
+        self.assertEqual(
+            [("https://eba.europa.eu/", "EBA", 2, 2 * n_ro)],
+            [(str(src), str(name), int(n_doc), int(n)) for src, name, n_doc, n in self.prov.info_doc_source()],
+        )
+
+
+class TestInfoDocSourceStats(unittest.TestCase):
+    """
+    The stored statistics are looked up, only when they are missing the document sources are counted.
+    """
+
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.n_ro = len(ExampleCasContent.build()[build_rdf.KEY_CHILDREN])
+
+        self.g = ROGraph(include_schema=True)
+        for doc_id in ("doc1", "doc2"):
+            self.g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+            self.g.add_doc_source(doc_id, "https://eba.europa.eu/", source_name="EBA")
+
+    def _info_doc_source(self):
+        filename = os.path.join(self.tmp_dir.name, "ro.nt")
+        self.g.serialize(filename, format="nt")
+
+        prov = SPARQLReportingObligationProvider(RDFLibGraphWrapper(filename))
+
+        return [(str(src), str(name), int(n_doc), int(n)) for src, name, n_doc, n in prov.info_doc_source()]
+
+    def test_ingested(self):
+        self.assertEqual([("https://eba.europa.eu/", "EBA", 2, 2 * self.n_ro)], self._info_doc_source())
+
+    def test_stored(self):
+        source_uri = URIRef("https://eba.europa.eu/")
+        self.g.set((source_uri, build_rdf.PROP_N_DOC, Literal(10)))
+
+        self.assertEqual([("https://eba.europa.eu/", "EBA", 10, 2 * self.n_ro)], self._info_doc_source())
+
+    def test_missing(self):
+        self.g.remove((None, build_rdf.PROP_N_DOC, None))
+
+        with self.assertLogs(level="WARNING"):
+            l_info = self._info_doc_source()
+
+        self.assertEqual([("https://eba.europa.eu/", "EBA", 2, 2 * self.n_ro)], l_info)
+
+    def test_no_documents(self):
+        self.g.remove_documents(["doc1", "doc2"])
+
+        self.assertEqual([], self._info_doc_source())
+
+
 class TestSPARQLGraphWrapper(unittest.TestCase):
     def test_query_get_triples(self):
         """Test for non empty query results.
@@ -725,6 +837,52 @@ class TestSPARQLReportingObligationProviderGetFilterMultiple(unittest.TestCase):
             del list_filters, l_ro
 
 
+class TestGetRODetails(unittest.TestCase):
+    def setUp(self) -> None:
+        self.cas_content = ExampleCasContent.build()
+
+        g = ROGraph(include_schema=True)
+        g.add_cas_content(self.cas_content, "test_doc")
+        g.add_doc_source("test_doc", "https://www.esma.europa.eu/", source_name="ESMA")
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "tmp.rdf")
+            g.serialize(destination=filename, format="pretty-xml")
+            graph_wrapper = RDFLibGraphWrapper(filename)
+        self.prov = SPARQLReportingObligationProvider(graph_wrapper)
+
+    def test_page(self):
+        l_ro_id = self.prov.get_filter_ro_id_multiple(limit=3)[URIS]
+
+        l_details = self.prov.get_ro_details(l_ro_id)
+
+        with self.subTest("Order"):
+            self.assertEqual(l_ro_id, [d_ro[RO_ID] for d_ro in l_details])
+
+        d_ro_cas = {ro_i["id"]: ro_i for ro_i in self.cas_content[build_rdf.KEY_CHILDREN]}
+
+        for d_ro in l_details:
+            ro_cas = d_ro_cas[d_ro[RO_ID]]
+
+            with self.subTest(f"Value {d_ro[RO_ID]}"):
+                self.assertEqual(ro_cas[build_rdf.KEY_VALUE], d_ro[RO_VALUE])
+
+            with self.subTest(f"Document {d_ro[RO_ID]}"):
+                self.assertEqual(str(ROGraph._get_cat_doc_uri("test_doc")), d_ro[DOC])
+                self.assertEqual("https://www.esma.europa.eu/", d_ro[DOC_SRC])
+
+            with self.subTest(f"Entities {d_ro[RO_ID]}"):
+                l_ent = {
+                    (str(ROGraph._get_pred_cls(ent[build_rdf.KEY_SENTENCE_FRAG_CLASS])[0]), ent[build_rdf.KEY_VALUE])
+                    for ent in ro_cas[build_rdf.KEY_CHILDREN]
+                }
+                self.assertEqual(l_ent, {(d_ent[PRED], d_ent[VALUE]) for d_ent in d_ro[ENTITIES]})
+
+    def test_unknown(self):
+        self.assertEqual([], self.prov.get_ro_details([]))
+        self.assertEqual([], self.prov.get_ro_details([build_rdf.RO_BASE["unknown"]]))
+
+
 class TestSPARQLPagination(unittest.TestCase):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -1135,6 +1293,89 @@ class TestFilterDropdownAllAtOnce(unittest.TestCase):
                 self.assertTrue(len(l_ent_filtered), "Should return at least one element")
 
 
+class TestFilterEntitiesTop(unittest.TestCase):
+    def setUp(self) -> None:
+        graph_wrapper = RDFLibGraphWrapper(MOCKUP_FILENAME)
+        self.prov = SPARQLReportingObligationProvider(graph_wrapper)
+
+        self.d_all = self.prov.get_filter_entities()
+
+    def test_top_count(self):
+        limit = 3
+
+        d = self.prov.get_filter_entities_top(limit=limit)
+
+        with self.subTest("Types"):
+            self.assertEqual(set(self.d_all), set(d))
+
+        for has_uri, l_ent in d.items():
+            with self.subTest(f"Limit {has_uri}"):
+                self.assertLessEqual(len(l_ent), limit)
+
+            with self.subTest(f"Most common {has_uri}"):
+                l_count_all = sorted((int(d_i[COUNT]) for d_i in self.d_all[has_uri]), reverse=True)
+                self.assertEqual(l_count_all[:limit], [int(d_i[COUNT]) for d_i in l_ent])
+
+            with self.subTest(f"Subset {has_uri}"):
+                for d_i in l_ent:
+                    self.assertIn(d_i, self.d_all[has_uri])
+
+    def test_top_value(self):
+        d = self.prov.get_filter_entities_top(limit=0, d_limit={D_ENTITIES["V"][0]: 5}, order_by=VALUE)
+
+        has_uri = str(D_ENTITIES["V"][0])
+
+        with self.subTest("Only requested types"):
+            self.assertEqual([has_uri], list(d))
+
+        with self.subTest("Same order as the dropdown"):
+            l_value = self.prov.get_filter_entities_from_type_lazy_loading(has_uri)
+            self.assertEqual(l_value[:5], [d_i[VALUE] for d_i in d[has_uri]])
+
+        with self.subTest("Counts"):
+            for d_i in d[has_uri]:
+                self.assertIn(d_i, self.d_all[has_uri])
+
+    def test_top_value_sort_key(self):
+        """
+        Values are ordered on their sort key, e.g. without the leading digits, instead of alphabetically.
+        """
+        cas_content = cas_parser.CasContent.from_list(
+            [
+                {
+                    cas_parser.KEY_VALUE: f"RO {i}",
+                    cas_parser.KEY_CHILDREN: [{cas_parser.KEY_VALUE: v, cas_parser.KEY_SENTENCE_FRAG_CLASS: "V"}],
+                }
+                for i, v in enumerate(["beta", "1 zeta", "alpha"])
+            ]
+        )
+
+        g = ROGraph(include_schema=True)
+        g.add_cas_content(cas_content, doc_id="doc1")
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "ro.nt")
+            g.serialize(filename, format="nt")
+            prov = SPARQLReportingObligationProvider(RDFLibGraphWrapper(filename))
+
+        has_uri = str(D_ENTITIES["V"][0])
+        d = prov.get_filter_entities_top(limit=0, d_limit={has_uri: 5}, order_by=VALUE)
+
+        self.assertEqual(["alpha", "beta", "1 zeta"], [d_i[VALUE] for d_i in d[has_uri]])
+
+    def test_prefix(self):
+        has_uri = str(D_ENTITIES["V"][0])
+        prefix = self.d_all[has_uri][0][VALUE][:2]
+
+        d = self.prov.get_filter_entities_top(str_match=prefix, type_match=STARTS_WITH)
+
+        self.assertTrue(d.get(has_uri))
+        for l_ent in d.values():
+            for d_i in l_ent:
+                with self.subTest(d_i[VALUE]):
+                    self.assertTrue(d_i[VALUE].lower().startswith(prefix.lower()))
+
+
 class TestFilterEntitiesFromTypeLazyLoading(unittest.TestCase):
     def setUp(self) -> None:
 
@@ -1195,6 +1436,112 @@ class TestFilterEntitiesFromTypeLazyLoading(unittest.TestCase):
         return
 
 
+class TestFilterEntitiesFromTypes(unittest.TestCase):
+    def setUp(self) -> None:
+        graph_wrapper = RDFLibGraphWrapper(MOCKUP_FILENAME)
+        self.prov = SPARQLReportingObligationProvider(graph_wrapper)
+
+    def test_equivalence(self):
+        """
+        Should be the same as requesting the entities type per type.
+        """
+
+        l_uri_has = self.prov.get_different_entity_types()
+
+        d = self.prov.get_filter_entities_from_types(max_concurrent=4)
+
+        with self.subTest("Keys"):
+            self.assertEqual(set(l_uri_has), set(d.keys()))
+
+        for uri_type_has in l_uri_has:
+            with self.subTest(uri_type_has):
+                self.assertEqual(self.prov.get_filter_entities_from_type_lazy_loading(uri_type_has), d[uri_type_has])
+
+    def test_filter(self):
+        uri_type_verb = D_ENTITIES["V"][0]
+        l_uri_has = [D_ENTITIES["ARG0"][0], D_ENTITIES["ARG1"][0]]
+
+        verb = self.prov.get_filter_entities_from_type_lazy_loading(uri_type_verb)[0]
+
+        d = self.prov.get_filter_entities_from_types(l_uri_has, list_pred_value=[(uri_type_verb, verb)])
+
+        self.assertEqual(l_uri_has, list(d.keys()))
+
+        for uri_type_has in l_uri_has:
+            with self.subTest(uri_type_has):
+                self.assertEqual(
+                    self.prov.get_filter_entities_from_type_lazy_loading(
+                        uri_type_has, list_pred_value=[(uri_type_verb, verb)]
+                    ),
+                    d[uri_type_has],
+                )
+
+    def test_shared_limit(self):
+        """
+        Concurrent calls together should not send more than MAX_CONCURRENT_QUERIES queries at once.
+        """
+
+        lock = threading.Lock()
+        l_in_flight = [0]
+        l_max_in_flight = [0]
+
+        def query(q):
+            with lock:
+                l_in_flight[0] += 1
+                l_max_in_flight[0] = max(l_max_in_flight[0], l_in_flight[0])
+
+            time.sleep(0.01)
+
+            with lock:
+                l_in_flight[0] -= 1
+
+            return []
+
+        graph_wrapper = mock.Mock()
+        graph_wrapper.query.side_effect = query
+        graph_wrapper.get_column.return_value = []
+        prov = SPARQLReportingObligationProvider(graph_wrapper)
+
+        l_type_uri = [f"type{i}" for i in range(2 * rdf_parser.MAX_CONCURRENT_QUERIES)]
+
+        l_threads = [threading.Thread(target=prov.get_filter_entities_from_types, args=(l_type_uri,)) for _ in range(3)]
+        for thread in l_threads:
+            thread.start()
+        for thread in l_threads:
+            thread.join()
+
+        self.assertEqual(3 * len(l_type_uri), graph_wrapper.query.call_count)
+        self.assertLessEqual(l_max_in_flight[0], rdf_parser.MAX_CONCURRENT_QUERIES)
+
+
+class TestStoredSortKey(unittest.TestCase):
+    def test_same_order(self):
+        """
+        Sorting on the stored sort key should give the same order as computing it within the query.
+        """
+
+        prov_computed = SPARQLReportingObligationProvider(RDFLibGraphWrapper(MOCKUP_FILENAME))
+
+        g = ROGraph()
+        g.parse(MOCKUP_FILENAME)
+        n = g.add_sort_keys()
+
+        with tempfile.TemporaryDirectory() as d:
+            filename = os.path.join(d, "tmp.rdf")
+            g.serialize(destination=filename, format="pretty-xml")
+            prov_stored = SPARQLReportingObligationProvider(RDFLibGraphWrapper(filename))
+
+        with self.subTest("Backfill"):
+            self.assertGreater(n, 0)
+
+        for uri_type_has in prov_computed.get_different_entity_types():
+            with self.subTest(uri_type_has):
+                self.assertEqual(
+                    prov_computed.get_filter_entities_from_type_lazy_loading(uri_type_has),
+                    prov_stored.get_filter_entities_from_type_lazy_loading(uri_type_has),
+                )
+
+
 class TestSorting(unittest.TestCase):
     def setUp(self) -> None:
         graph_wrapper = SPARQLGraphWrapper(URL_STAGING)
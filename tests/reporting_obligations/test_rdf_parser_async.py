@@ -0,0 +1,239 @@
+import asyncio
+import gc
+import os
+import time
+import unittest
+
+import httpx
+import rdflib
+
+from dgfisma_rdf.reporting_obligations import instrumentation
+from dgfisma_rdf.reporting_obligations.build_rdf import D_ENTITIES
+from dgfisma_rdf.reporting_obligations.rdf_parser import SPARQLReportingObligationProvider, RDFLibGraphWrapper
+from dgfisma_rdf.reporting_obligations.rdf_parser_async import (
+    AsyncSPARQLGraphWrapper,
+    AsyncSPARQLReportingObligationProvider,
+    gather_queries,
+)
+
+ROOT = os.path.join(os.path.dirname(__file__), "../..")
+MOCKUP_FILENAME = os.path.join(ROOT, "data/examples", "reporting_obligations_mockup.rdf")
+
+ENDPOINT = "http://fuseki.test/RO/query"
+
+
+def get_mock_transport(g: rdflib.Graph, delay: float = 0):
+    """
+    Mock SPARQL endpoint that answers the queries with a local graph.
+    """
+
+    async def handler(request: httpx.Request):
+        await asyncio.sleep(delay)
+
+        q = request.url.params["query"]
+        return httpx.Response(
+            200,
+            content=g.query(q).serialize(format="json"),
+            headers={"Content-Type": "application/sparql-results+json"},
+        )
+
+    return httpx.MockTransport(handler)
+
+
+class TestAsyncProvider(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.graph_wrapper_local = RDFLibGraphWrapper(MOCKUP_FILENAME)
+        self.prov_local = SPARQLReportingObligationProvider(self.graph_wrapper_local)
+
+    async def test_query(self):
+        async with AsyncSPARQLGraphWrapper(
+                ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g)
+        ) as graph_wrapper:
+            q = """
+            SELECT ?subject ?predicate ?object
+            WHERE {
+              ?subject ?predicate ?object
+            }
+            LIMIT 25
+            """
+
+            l = await graph_wrapper.query(q)
+            l_local = self.graph_wrapper_local.query(q)
+
+            self.assertEqual(len(l_local), len(l))
+            self.assertEqual(l_local[0].keys(), l[0].keys())
+
+    async def test_equivalence(self):
+        async with AsyncSPARQLGraphWrapper(
+                ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g)
+        ) as graph_wrapper:
+            prov = AsyncSPARQLReportingObligationProvider(graph_wrapper)
+
+            with self.subTest("Entity types"):
+                self.assertEqual(
+                    set(self.prov_local.get_different_entity_types()), set(await prov.get_different_entity_types())
+                )
+
+            with self.subTest("RO's"):
+                self.assertEqual(self.prov_local.get_all_ro_uri(), await prov.get_all_ro_uri())
+
+            with self.subTest("Dropdown"):
+                type_uri = D_ENTITIES["V"][0]
+                self.assertEqual(
+                    self.prov_local.get_filter_entities_from_type_lazy_loading(type_uri),
+                    await prov.get_filter_entities_from_type_lazy_loading(type_uri),
+                )
+
+    async def test_gather_queries(self):
+        delay = 0.2
+        async with AsyncSPARQLGraphWrapper(
+                ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g, delay=delay)
+        ) as graph_wrapper:
+            prov = AsyncSPARQLReportingObligationProvider(graph_wrapper)
+
+            l_types = [D_ENTITIES[k][0] for k in ("V", "ARG0", "ARG1", "ARG2")]
+
+            t0 = time.time()
+            d = await gather_queries(
+                prov, {type_uri: ("get_filter_entities_from_type_lazy_loading", (type_uri,), {}) for type_uri in l_types}
+            )
+            delta_t = time.time() - t0
+
+            with self.subTest("Results"):
+                for type_uri in l_types:
+                    self.assertEqual(
+                        self.prov_local.get_filter_entities_from_type_lazy_loading(type_uri), d.get(type_uri)
+                    )
+
+            with self.subTest("Concurrent"):
+                self.assertLess(delta_t, delay * len(l_types), "Queries should run at the same time.")
+
+    async def test_get_filter_entities_from_types(self):
+        delay = 0.2
+        async with AsyncSPARQLGraphWrapper(
+                ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g, delay=delay)
+        ) as graph_wrapper:
+            prov = AsyncSPARQLReportingObligationProvider(graph_wrapper)
+
+            l_types = [D_ENTITIES[k][0] for k in ("V", "ARG0", "ARG1", "ARG2")]
+
+            t0 = time.time()
+            d = await prov.get_filter_entities_from_types(l_types, max_concurrent=2)
+            delta_t = time.time() - t0
+
+            with self.subTest("Results"):
+                self.assertEqual(self.prov_local.get_filter_entities_from_types(l_types), d)
+
+            with self.subTest("Limited concurrency"):
+                self.assertGreaterEqual(delta_t, delay * len(l_types) / 2)
+                self.assertLess(delta_t, delay * len(l_types))
+
+    async def test_max_workers(self):
+        delay = 0.2
+        async with AsyncSPARQLGraphWrapper(
+                ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g, delay=delay)
+        ) as graph_wrapper:
+            prov = AsyncSPARQLReportingObligationProvider(graph_wrapper, max_workers=2)
+            self.addCleanup(prov.close)
+
+            t0 = time.time()
+            await gather_queries(prov, {i: ("get_all_ro_uri", (), {}) for i in range(4)})
+            delta_t = time.time() - t0
+
+            with self.subTest("Limited concurrency"):
+                self.assertGreaterEqual(delta_t, delay * 2)
+
+            with self.subTest("Shared provider"):
+                self.assertIs(await prov.get_dataset_statistics(), await prov.get_dataset_statistics())
+
+    async def test_native(self):
+        """
+        The dropdowns don't need a worker thread, their queries are awaited directly.
+        """
+        # The mock endpoint evaluates the queries within the event loop, the delay should dominate.
+        delay = 0.5
+        async with AsyncSPARQLGraphWrapper(
+                ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g, delay=delay)
+        ) as graph_wrapper:
+            prov = AsyncSPARQLReportingObligationProvider(graph_wrapper, max_workers=1)
+            self.addCleanup(prov.close)
+
+            l_types = [D_ENTITIES[k][0] for k in ("V", "ARG0", "ARG1", "ARG2")]
+
+            t0 = time.time()
+            d = await gather_queries(
+                prov, {type_uri: ("get_filter_entities_from_type_lazy_loading", (type_uri,), {}) for type_uri in l_types}
+            )
+            delta_t = time.time() - t0
+
+            with self.subTest("Not limited by the workers"):
+                self.assertLess(delta_t, delay * len(l_types))
+
+            with self.subTest("Results"):
+                self.assertEqual(self.prov_local.get_filter_entities_from_types(l_types), d)
+
+            with self.subTest("Top"):
+                # The local graph wrapper doesn't give the counts as strings.
+                def get_values(d_top):
+                    return {k: [d_ent["value_ent"] for d_ent in l_ent] for k, l_ent in d_top.items()}
+
+                self.assertEqual(
+                    get_values(self.prov_local.get_filter_entities_top(limit=5)),
+                    get_values(await prov.get_filter_entities_top(limit=5)),
+                )
+                self.assertEqual({}, await prov.get_filter_entities_top(limit=0))
+
+    async def test_instrumentation(self):
+        """
+        The queries are sent by the event loop, but should still be recorded with the provider method.
+        """
+
+        class RecordingHook(instrumentation.QueryHook):
+            def __init__(self):
+                self.records = []
+
+            def on_query(self, record):
+                self.records.append(record)
+
+        hook = instrumentation.add_hook(RecordingHook())
+        try:
+            async with AsyncSPARQLGraphWrapper(
+                    ENDPOINT, transport=get_mock_transport(self.graph_wrapper_local.g)
+            ) as graph_wrapper:
+                prov = AsyncSPARQLReportingObligationProvider(graph_wrapper)
+                l_ro = await prov.get_all_ro_uri()
+                await prov.get_filter_entities_from_type_lazy_loading(D_ENTITIES["V"][0])
+        finally:
+            instrumentation.remove_hook(hook)
+
+        self.assertEqual(
+            ["get_all_ro_uri", "get_filter_entities_from_type_lazy_loading"], [record.method for record in hook.records]
+        )
+        self.assertEqual(len(l_ro), hook.records[0].n_rows)
+        self.assertGreater(hook.records[0].n_bytes, 0)
+
+
+class TestProviderPerLoop(unittest.TestCase):
+    def test_get_provider(self):
+        prov = AsyncSPARQLReportingObligationProvider(AsyncSPARQLGraphWrapper(ENDPOINT))
+        self.addCleanup(prov.close)
+
+        loop0, loop1 = asyncio.new_event_loop(), asyncio.new_event_loop()
+        self.addCleanup(loop1.close)
+
+        with self.subTest("Same loop"):
+            self.assertIs(prov._get_provider(loop0), prov._get_provider(loop0))
+
+        with self.subTest("Other loop"):
+            self.assertIsNot(prov._get_provider(loop0), prov._get_provider(loop1))
+
+        loop0.close()
+        del loop0
+        gc.collect()
+
+        with self.subTest("Forgotten with the loop"):
+            self.assertEqual(1, len(prov._d_prov))
+
+
+if __name__ == "__main__":
+    unittest.main()
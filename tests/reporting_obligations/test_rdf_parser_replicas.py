@@ -0,0 +1,187 @@
+import threading
+import time
+import unittest
+import urllib.error
+from unittest import mock
+
+from SPARQLWrapper.SPARQLExceptions import QueryBadFormed
+
+from dgfisma_rdf.reporting_obligations import deadlines, rdf_parser_replicas
+from dgfisma_rdf.reporting_obligations.rdf_parser_replicas import (
+    LEAST_OUTSTANDING,
+    ROUND_ROBIN,
+    ReplicaSPARQLGraphWrapper,
+)
+
+ENDPOINTS = [f"http://fuseki{i}:3030/RO/query" for i in range(3)]
+
+
+class TestReplicaSPARQLGraphWrapper(unittest.TestCase):
+    def _get_graph_wrapper(self, **kwargs) -> ReplicaSPARQLGraphWrapper:
+        graph_wrapper = ReplicaSPARQLGraphWrapper(ENDPOINTS, **kwargs)
+        self.addCleanup(graph_wrapper.close)
+
+        for replica in graph_wrapper.replicas:
+            replica.graph_wrapper.query = mock.Mock(return_value=[{"x": replica.graph_wrapper.endpoint}])
+
+        return graph_wrapper
+
+    @staticmethod
+    def _get_endpoint(l):
+        return l[0]["x"]
+
+    def test_round_robin(self):
+        graph_wrapper = self._get_graph_wrapper(policy=ROUND_ROBIN)
+
+        self.assertEqual(ENDPOINTS * 2, [self._get_endpoint(graph_wrapper.query("q")) for _ in range(6)])
+
+    def test_least_outstanding(self):
+        graph_wrapper = self._get_graph_wrapper(policy=LEAST_OUTSTANDING)
+
+        graph_wrapper.replicas[0].n_outstanding = 2
+        graph_wrapper.replicas[1].n_outstanding = 1
+
+        self.assertEqual(ENDPOINTS[2], self._get_endpoint(graph_wrapper.query("q")))
+
+    def test_failover(self):
+        graph_wrapper = self._get_graph_wrapper(policy=ROUND_ROBIN, max_failures=2)
+        replica_down = graph_wrapper.replicas[0]
+        replica_down.graph_wrapper.query.side_effect = ConnectionError
+
+        l_endpoint = [self._get_endpoint(graph_wrapper.query("q")) for _ in range(6)]
+
+        with self.subTest("Answered by the others"):
+            self.assertNotIn(ENDPOINTS[0], l_endpoint)
+
+        with self.subTest("Ejected"):
+            self.assertEqual(2, replica_down.graph_wrapper.query.call_count)
+            self.assertFalse(replica_down.is_healthy(time.monotonic()))
+
+        with self.subTest("Outstanding"):
+            self.assertEqual([0, 0, 0], [replica.n_outstanding for replica in graph_wrapper.replicas])
+
+    def test_all_down(self):
+        graph_wrapper = self._get_graph_wrapper()
+        for replica in graph_wrapper.replicas:
+            replica.graph_wrapper.query.side_effect = ConnectionError
+
+        with self.assertRaises(ConnectionError):
+            graph_wrapper.query("q")
+
+    def test_timeout_not_a_failure(self):
+        graph_wrapper = self._get_graph_wrapper(max_failures=1)
+        for replica in graph_wrapper.replicas:
+            replica.graph_wrapper.query.side_effect = deadlines.QueryTimeout
+
+        with self.assertRaises(deadlines.QueryTimeout):
+            graph_wrapper.query("q")
+
+        with self.subTest("Not retried"):
+            self.assertEqual(1, sum(replica.graph_wrapper.query.call_count for replica in graph_wrapper.replicas))
+
+        with self.subTest("Not ejected"):
+            self.assertTrue(all(replica.is_healthy(time.monotonic()) for replica in graph_wrapper.replicas))
+
+    def test_query_error_not_a_failure(self):
+        for error in [QueryBadFormed(), urllib.error.HTTPError(ENDPOINTS[0], 404, "Not Found", {}, None)]:
+            with self.subTest(error=error):
+                graph_wrapper = self._get_graph_wrapper(max_failures=1)
+                for replica in graph_wrapper.replicas:
+                    replica.graph_wrapper.query.side_effect = error
+
+                with self.assertRaises(type(error)):
+                    graph_wrapper.query("q")
+
+                with self.subTest("Not retried"):
+                    self.assertEqual(
+                        1, sum(replica.graph_wrapper.query.call_count for replica in graph_wrapper.replicas)
+                    )
+
+                with self.subTest("Not ejected"):
+                    self.assertTrue(all(replica.is_healthy(time.monotonic()) for replica in graph_wrapper.replicas))
+                    self.assertEqual([0, 0, 0], [replica.n_failures for replica in graph_wrapper.replicas])
+
+    def test_server_error_failover(self):
+        graph_wrapper = self._get_graph_wrapper(policy=ROUND_ROBIN, max_failures=1)
+        replica_down = graph_wrapper.replicas[0]
+        replica_down.graph_wrapper.query.side_effect = urllib.error.HTTPError(
+            ENDPOINTS[0], 503, "Service Unavailable", {}, None
+        )
+
+        self.assertNotEqual(ENDPOINTS[0], self._get_endpoint(graph_wrapper.query("q")))
+        self.assertFalse(replica_down.is_healthy(time.monotonic()))
+
+    def test_check_health(self):
+        graph_wrapper = self._get_graph_wrapper(max_failures=1)
+        replica = graph_wrapper.replicas[0]
+        replica.graph_wrapper.query.side_effect = ConnectionError
+
+        with self.subTest("Down"):
+            self.assertEqual({**dict.fromkeys(ENDPOINTS, True), ENDPOINTS[0]: False}, graph_wrapper.check_health())
+            self.assertFalse(replica.is_healthy(time.monotonic()))
+
+        replica.graph_wrapper.query.side_effect = None
+
+        with self.subTest("Back up"):
+            graph_wrapper.check_health()
+            self.assertTrue(replica.is_healthy(time.monotonic()))
+
+    def test_hedge(self):
+        graph_wrapper = self._get_graph_wrapper(policy=ROUND_ROBIN, hedge=True)
+
+        replica_slow = graph_wrapper.replicas[0]
+        replica_slow.latencies.extend([0.01] * rdf_parser_replicas.MIN_LATENCIES_HEDGE)
+
+        unblock = threading.Event()
+        self.addCleanup(unblock.set)
+
+        def query_slow(q):
+            unblock.wait(10)
+            return [{"x": ENDPOINTS[0]}]
+
+        replica_slow.graph_wrapper.query.side_effect = query_slow
+
+        t0 = time.monotonic()
+        l = graph_wrapper.query("q")
+
+        with self.subTest("Answered by another replica"):
+            self.assertNotEqual(ENDPOINTS[0], self._get_endpoint(l))
+            self.assertLess(time.monotonic() - t0, 5)
+
+        with self.subTest("Sent to both"):
+            l_n_calls = [replica.graph_wrapper.query.call_count for replica in graph_wrapper.replicas]
+            self.assertEqual([0, 1, 1], sorted(l_n_calls))
+
+    def test_hedge_timeout(self):
+        """
+        When the deadline passes on one replica, the call shouldn't wait for the other one.
+        """
+        graph_wrapper = self._get_graph_wrapper(policy=ROUND_ROBIN, hedge=True)
+
+        replica_slow = graph_wrapper.replicas[0]
+        replica_slow.latencies.extend([0.01] * rdf_parser_replicas.MIN_LATENCIES_HEDGE)
+
+        unblock = threading.Event()
+        self.addCleanup(unblock.set)
+
+        def query_slow(q):
+            unblock.wait(10)
+            return [{"x": ENDPOINTS[0]}]
+
+        replica_slow.graph_wrapper.query.side_effect = query_slow
+        for replica in graph_wrapper.replicas[1:]:
+            replica.graph_wrapper.query.side_effect = deadlines.QueryTimeout
+
+        t0 = time.monotonic()
+        with self.assertRaises(deadlines.QueryTimeout):
+            graph_wrapper.query("q")
+
+        self.assertLess(time.monotonic() - t0, 5)
+
+    def test_no_endpoints(self):
+        with self.assertRaises(ValueError):
+            ReplicaSPARQLGraphWrapper([])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -83,6 +83,50 @@ class TestFilterDropdown(unittest.TestCase):
             print(f"T query = {np.mean(l_T):.2f} +- {np.std(l_T):.2f} s")
 
 
+class TestFilterDropdownConcurrent(unittest.TestCase):
+    """
+    Refresh all dropdowns at once, with the queries per entity type sent concurrently.
+    """
+
+    def setUp(self) -> None:
+        graph_wrapper = SPARQLGraphWrapper(URL_FUSEKI_PRD)
+        self.prov = SPARQLReportingObligationProvider(graph_wrapper)
+
+    def test_speed(self):
+        n_samples = 3
+
+        l_types_ent = self.prov.get_different_entity_types()
+
+        s_test = "sequential"
+        with self.subTest(s_test):
+            print(s_test)
+
+            l_T = []
+            for _ in range(n_samples):
+                t0 = time.time()
+                for type_ent_i in l_types_ent:
+                    self.prov.get_filter_entities_from_type_lazy_loading(type_ent_i)
+                t1 = time.time()
+
+                l_T.append(t1 - t0)
+
+            print(f"T query = {np.mean(l_T):.2f} +- {np.std(l_T):.2f} s")
+
+        s_test = "concurrent"
+        with self.subTest(s_test):
+            print(s_test)
+
+            l_T = []
+            for _ in range(n_samples):
+                t0 = time.time()
+                self.prov.get_filter_entities_from_types(l_types_ent)
+                t1 = time.time()
+
+                l_T.append(t1 - t0)
+
+            print(f"T query = {np.mean(l_T):.2f} +- {np.std(l_T):.2f} s")
+
+
 class TestFilterDropdownAllAtOnce(unittest.TestCase):
     def setUp(self) -> None:
         """
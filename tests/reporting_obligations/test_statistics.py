@@ -0,0 +1,170 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from rdflib import RDF, URIRef
+
+from dgfisma_rdf.reporting_obligations import cas_parser, statistics
+from dgfisma_rdf.reporting_obligations.build_rdf import ROGraph
+from dgfisma_rdf.reporting_obligations.rdf_parser import RDFLibGraphWrapper, SPARQLReportingObligationProvider
+from tests.reporting_obligations.build_rdf_example import ExampleCasContent
+
+
+def _get_graph_wrapper(g: ROGraph, tmp_dir: str) -> RDFLibGraphWrapper:
+    filename = os.path.join(tmp_dir, "ro.nt")
+    g.serialize(filename, format="nt")
+
+    return RDFLibGraphWrapper(filename)
+
+
+class TestComputeStatistics(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.n_ro = len(ExampleCasContent.build()[cas_parser.KEY_CHILDREN])
+
+        self.g = ROGraph(include_schema=True)
+        for doc_id in ("doc1", "doc2"):
+            self.g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+
+        self.stats = statistics.compute_statistics(_get_graph_wrapper(self.g, self.tmp_dir.name))
+
+    def test_counts(self):
+        with self.subTest("Triples"):
+            self.assertEqual(len(self.g), self.stats["n_triples"])
+            self.assertEqual(
+                len(list(self.g.triples((None, ROGraph.prop_has_rep_obl, None)))),
+                self.stats["triples_per_predicate"][str(ROGraph.prop_has_rep_obl)],
+            )
+
+        with self.subTest("Documents"):
+            self.assertEqual(2, self.stats["n_documents"])
+
+        with self.subTest("RO's"):
+            self.assertEqual(2 * self.n_ro, self.stats["n_reporting_obligations"])
+
+        with self.subTest("Entities"):
+            for type_uri, n in self.stats["entities_per_type"].items():
+                self.assertEqual(len(set(self.g.subjects(RDF.type, URIRef(type_uri)))), n)
+
+    def test_distributions(self):
+        with self.subTest("RO's per document"):
+            self.assertEqual(
+                {"n": 2, "min": self.n_ro, "max": self.n_ro, "p50": self.n_ro},
+                {k: self.stats["ro_per_document"][k] for k in ("n", "min", "max", "p50")},
+            )
+
+        with self.subTest("Sampled"):
+            graph_wrapper = _get_graph_wrapper(self.g, self.tmp_dir.name)
+            stats = statistics.compute_statistics(graph_wrapper, sample_size=1)
+
+            self.assertEqual(1, stats["ro_per_document"]["n"])
+            self.assertEqual(1, stats["label_length"]["n"])
+
+        with self.subTest("Random offset"):
+            counts = statistics.compute_counts(graph_wrapper)
+
+            l_label_length = {
+                statistics.compute_distributions(graph_wrapper, sample_size=1, counts=counts)["label_length"]["min"]
+                for _ in range(20)
+            }
+
+            self.assertGreater(len(l_label_length), 1)
+
+        with self.subTest("Offset within the counts"):
+            with mock.patch.object(statistics.random, "randint", side_effect=lambda a, b: b):
+                stats = statistics.compute_distributions(graph_wrapper, sample_size=1, counts=counts)
+
+            self.assertEqual(1, stats["ro_per_document"]["n"])
+            self.assertEqual(1, stats["label_length"]["n"])
+
+    def test_empty(self):
+        stats = statistics.compute_statistics(_get_graph_wrapper(ROGraph(), self.tmp_dir.name))
+
+        self.assertEqual(0, stats["n_triples"])
+        self.assertEqual(0, stats["n_reporting_obligations"])
+        self.assertIsNone(stats["ro_per_document"]["mean"])
+
+
+class TestGetDistribution(unittest.TestCase):
+    def test_percentiles(self):
+        d = statistics.get_distribution(list(range(100, 0, -1)))
+
+        self.assertEqual(
+            {"n": 100, "min": 1, "max": 100, "mean": 50.5, "p50": 50, "p90": 90, "p99": 99},
+            d,
+        )
+
+
+class TestDatasetStatistics(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = mock.patch.object(statistics, "compute_counts", return_value={"n_triples": 1, "n_documents": 1})
+        self.compute_counts = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch.object(statistics, "compute_distributions", return_value={"label_length": {}})
+        self.compute_distributions = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.stats = statistics.DatasetStatistics(mock.Mock())
+
+    def test_cached(self):
+        stats = self.stats.get()
+        self.assertIs(stats, self.stats.get())
+
+        self.compute_counts.assert_called_once()
+        self.compute_distributions.assert_called_once()
+
+        with self.subTest("Generation"):
+            self.assertEqual(0, stats["generation"])
+
+    def test_invalidate(self):
+        self.stats.get()
+        self.stats.invalidate()
+
+        with self.subTest("Min interval"):
+            self.assertEqual(0, self.stats.get()["generation"])
+            self.compute_distributions.assert_called_once()
+
+        self.stats.min_interval = 0
+
+        self.assertEqual(1, self.stats.get()["generation"])
+        self.assertEqual(2, self.compute_distributions.call_count)
+
+        with self.subTest("Counts kept"):
+            self.compute_counts.assert_called_once()
+
+    def test_max_age(self):
+        self.stats.max_age = 0
+
+        self.stats.get()
+        self.stats.get()
+
+        self.assertEqual(2, self.compute_distributions.call_count)
+        self.compute_counts.assert_called_once()
+
+        with self.subTest("Counts"):
+            self.stats.max_age_counts = 0
+
+            self.stats.get()
+
+            self.assertEqual(2, self.compute_counts.call_count)
+
+    def test_refresh(self):
+        self.stats.get()
+        self.stats.get(refresh=True)
+
+        self.assertEqual(2, self.compute_counts.call_count)
+        self.assertEqual(2, self.compute_distributions.call_count)
+
+    def test_provider(self):
+        prov = SPARQLReportingObligationProvider(mock.Mock())
+
+        self.assertEqual(1, prov.get_dataset_statistics()["n_triples"])
+        self.assertIs(prov.get_dataset_statistics(), prov.get_dataset_statistics())
+
+
+if __name__ == "__main__":
+    unittest.main()
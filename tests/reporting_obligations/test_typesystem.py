@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from cassis import load_typesystem, load_cas_from_xmi
+
+from dgfisma_rdf.reporting_obligations import typesystem
+
+ROOT = os.path.join(os.path.dirname(__file__), "../..")
+FILENAME_CAS = os.path.join(ROOT, "tests/reporting_obligations/app/data_test", "ro_cas_1.xml")
+
+
+class TestGetTypesystem(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        # Copy, to not share the in-memory cache with other tests.
+        self.path_typesystem = os.path.join(self.tmp_dir.name, "typesystem.xml")
+        shutil.copy(typesystem.PATH_TYPESYSTEM, self.path_typesystem)
+
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+
+        self.addCleanup(typesystem._TYPESYSTEMS.pop, os.path.abspath(self.path_typesystem), None)
+
+    def test_singleton(self):
+        ts = typesystem.get_typesystem(self.path_typesystem, cache_dir=None)
+
+        self.assertIs(ts, typesystem.get_typesystem(self.path_typesystem, cache_dir=None))
+
+    def test_reload_changed(self):
+        ts = typesystem.get_typesystem(self.path_typesystem, cache_dir=None)
+
+        stat = os.stat(self.path_typesystem)
+        os.utime(self.path_typesystem, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        self.assertIsNot(ts, typesystem.get_typesystem(self.path_typesystem, cache_dir=None))
+
+    def test_cache(self):
+        ts = typesystem._load(self.path_typesystem, self.cache_dir)
+
+        with self.subTest("Saved"):
+            self.assertEqual(1, len(os.listdir(self.cache_dir)))
+
+        ts_cached = typesystem._load(self.path_typesystem, self.cache_dir)
+
+        with self.subTest("Same types"):
+            self.assertEqual(
+                {t.name: sorted(f.name for f in t.all_features) for t in ts.get_types()},
+                {t.name: sorted(f.name for f in t.all_features) for t in ts_cached.get_types()},
+            )
+
+        with self.subTest("Same CAS"):
+            with open(FILENAME_CAS, "rb") as f:
+                xmi = f.read().decode("utf-8")
+
+            self.assertEqual(
+                load_cas_from_xmi(xmi, typesystem=ts).to_xmi(),
+                load_cas_from_xmi(xmi, typesystem=ts_cached).to_xmi(),
+            )
+
+    def test_cache_invalidated(self):
+        """
+        A changed typesystem is not loaded from the cache.
+        """
+        typesystem._load(self.path_typesystem, self.cache_dir)
+
+        with open(self.path_typesystem, "a") as f:
+            f.write("\n")
+
+        typesystem._load(self.path_typesystem, self.cache_dir)
+
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def test_cache_cassis_version(self):
+        """
+        A typesystem that was pickled with another version of cassis is not loaded from the cache.
+        """
+        typesystem._load(self.path_typesystem, self.cache_dir)
+
+        with mock.patch.object(typesystem, "CASSIS_VERSION", "0.0.0"):
+            typesystem._load(self.path_typesystem, self.cache_dir)
+
+        self.assertEqual(2, len(os.listdir(self.cache_dir)))
+
+    def test_cache_corrupt(self):
+        typesystem._load(self.path_typesystem, self.cache_dir)
+
+        for filename in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, filename), "wb") as f:
+                f.write(b"corrupt")
+
+        with open(self.path_typesystem, "rb") as f:
+            ts = load_typesystem(f)
+
+        ts_cached = typesystem._load(self.path_typesystem, self.cache_dir)
+
+        self.assertEqual({t.name for t in ts.get_types()}, {t.name for t in ts_cached.get_types()})
+
+
+if __name__ == "__main__":
+    unittest.main()
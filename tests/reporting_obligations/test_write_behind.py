@@ -0,0 +1,296 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import requests
+from rdflib import Literal, URIRef
+
+from dgfisma_rdf.reporting_obligations import cas_parser
+from dgfisma_rdf.reporting_obligations.build_rdf import ROGraph
+from dgfisma_rdf.reporting_obligations.write_behind import (
+    UpdateJournal,
+    WriteBehindCommitter,
+    _RecordingUpdateStore,
+    build_update,
+)
+from tests.reporting_obligations.build_rdf_example import ExampleCasContent
+
+UPDATE_ENDPOINT = "http://fuseki:3030/RO/update"
+
+
+class TestUpdateJournal(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.path = os.path.join(self.tmp_dir.name, "journal.sqlite")
+
+    def test_order(self):
+        journal = UpdateJournal(self.path)
+        self.addCleanup(journal.close)
+
+        for i in range(3):
+            journal.append(UPDATE_ENDPOINT, f"doc{i}", f"q{i}")
+
+        self.assertEqual(["q0", "q1", "q2"], [q for _, _, q in journal.pending()])
+        self.assertEqual(["q0", "q1"], [q for _, _, q in journal.pending(2)])
+
+    def test_durable(self):
+        journal = UpdateJournal(self.path)
+        id_entry = journal.append(UPDATE_ENDPOINT, "doc0", "q0")
+        journal.append(UPDATE_ENDPOINT, "doc1", "q1")
+        journal.remove([id_entry])
+        journal.close()
+
+        journal = UpdateJournal(self.path)
+        self.addCleanup(journal.close)
+
+        self.assertEqual([(UPDATE_ENDPOINT, "q1")], [(endpoint, q) for _, endpoint, q in journal.pending()])
+
+        with self.subTest("Count"):
+            self.assertEqual(1, len(journal))
+
+    def test_dead_letters(self):
+        journal = UpdateJournal(self.path)
+        self.addCleanup(journal.close)
+
+        id_entry = journal.append(UPDATE_ENDPOINT, "doc0", "q0")
+        journal.append(UPDATE_ENDPOINT, "doc1", "q1")
+
+        self.assertEqual(1, journal.add_attempt(id_entry))
+        journal.move_to_dead_letters(id_entry, "Bad request")
+
+        with self.subTest("Pending"):
+            self.assertEqual(["q1"], [q for _, _, q in journal.pending()])
+            self.assertEqual(1, len(journal))
+
+        with self.subTest("Dead letters"):
+            self.assertEqual([(id_entry, UPDATE_ENDPOINT, "doc0", "Bad request")], journal.dead_letters())
+            self.assertEqual(1, journal.count_dead_letters())
+
+
+class TestWriteBehindCommitter(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+        self.path = os.path.join(self.tmp_dir.name, "journal.sqlite")
+
+        self.journal = UpdateJournal(self.path)
+        self.addCleanup(self.journal.close)
+
+    def _get_committer(self, journal=None, **kwargs):
+        committer = WriteBehindCommitter(journal or self.journal, **kwargs)
+
+        patcher = mock.patch.object(committer, "_send")
+        self.send = patcher.start()
+        self.addCleanup(patcher.stop)
+
+        return committer
+
+    def test_coalesced(self):
+        committer = self._get_committer(batch_size=2)
+
+        for i in range(3):
+            committer.enqueue(UPDATE_ENDPOINT, f"doc{i}", f"q{i}")
+        committer.enqueue("http://other:3030/RO/update", "doc3", "q3")
+
+        n = committer.flush_all()
+
+        with self.subTest("Committed"):
+            self.assertEqual(4, n)
+            self.assertEqual(0, len(self.journal))
+
+        with self.subTest("Batches"):
+            self.assertEqual(
+                [
+                    mock.call(UPDATE_ENDPOINT, "q0\n;\nq1"),
+                    mock.call(UPDATE_ENDPOINT, "q2"),
+                    mock.call("http://other:3030/RO/update", "q3"),
+                ],
+                self.send.call_args_list,
+            )
+
+    def test_failed(self):
+        committer = self._get_committer()
+        committer.enqueue(UPDATE_ENDPOINT, "doc0", "q0")
+
+        self.send.side_effect = requests.ConnectionError
+
+        with self.assertRaises(requests.ConnectionError):
+            committer.flush()
+
+        with self.subTest("Kept"):
+            self.assertEqual(1, len(self.journal))
+
+        self.send.side_effect = None
+
+        self.assertEqual(1, committer.flush())
+        self.assertEqual(0, len(self.journal))
+
+    def test_one_by_one(self):
+        """
+        A batch that is refused is sent one by one, such that only the bad update stays behind.
+        """
+        committer = self._get_committer(max_attempts=2)
+
+        for i in range(3):
+            committer.enqueue(UPDATE_ENDPOINT, f"doc{i}", f"q{i}")
+
+        self.send.side_effect = _refuse("q1")
+
+        with self.assertRaises(requests.HTTPError):
+            committer.flush()
+
+        with self.subTest("Kept in order"):
+            self.assertEqual(["q1", "q2"], [q for _, _, q in self.journal.pending()])
+
+        with self.subTest("Dead letter"):
+            self.assertEqual(2, committer.flush())
+
+            self.assertEqual(0, len(self.journal))
+            self.assertEqual(["doc1"], [doc_id for _, _, doc_id, _ in self.journal.dead_letters()])
+            self.assertIn(mock.call(UPDATE_ENDPOINT, "q2"), self.send.call_args_list)
+
+    def test_unavailable(self):
+        """
+        When Fuseki can't be reached, the updates are not sent one by one, nor counted as failed.
+        """
+        committer = self._get_committer(max_attempts=1)
+
+        for i in range(2):
+            committer.enqueue(UPDATE_ENDPOINT, f"doc{i}", f"q{i}")
+
+        for side_effect in [requests.ConnectionError, _refuse("q0", status_code=503)]:
+            with self.subTest(side_effect=side_effect):
+                self.send.reset_mock(side_effect=True)
+                self.send.side_effect = side_effect
+
+                with self.assertRaises(requests.RequestException):
+                    committer.flush()
+
+                self.send.assert_called_once()
+                self.assertEqual(2, len(self.journal))
+                self.assertEqual(0, self.journal.count_dead_letters())
+
+    def test_replay(self):
+        """
+        What was not committed before a crash, is committed when starting again.
+        """
+        self.journal.append(UPDATE_ENDPOINT, "doc0", "q0")
+        self.journal.close()
+
+        committer = self._get_committer(journal=UpdateJournal(self.path), max_delay=0.01)
+        self.addCleanup(committer.journal.close)
+
+        committer.start()
+        committer.stop()
+
+        self.send.assert_called_once_with(UPDATE_ENDPOINT, "q0")
+        self.assertEqual(0, len(committer.journal))
+
+
+def _refuse(q_bad, status_code=400):
+    """
+    Side effect of _send that refuses every update that contains q_bad.
+    """
+
+    def send(update_endpoint, q):
+        if q_bad in q:
+            response = requests.Response()
+            response.status_code = status_code
+            raise requests.HTTPError(f"{status_code} Error", response=response)
+
+    return send
+
+
+class TestBuildUpdate(unittest.TestCase):
+    def test_update(self):
+        doc_id = "https://example.com/doc1"
+
+        g_expected = ROGraph(deterministic_uri=True)
+        cas_content_expected = g_expected.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+
+        cas_content = ExampleCasContent.build()
+        q, stats = build_update(cas_content, doc_id, UPDATE_ENDPOINT)
+
+        with self.subTest("ID's"):
+            self.assertEqual(cas_content_expected, cas_content)
+
+        with self.subTest("Stats"):
+            # Without the number of RO's of the document, which is stored by the SPARQL update of the statistics.
+            self.assertEqual(len(g_expected) - 1, stats["n_triples_added"])
+
+        with self.subTest("Single insert"):
+            self.assertEqual(1, q.count("INSERT DATA"))
+
+        with self.subTest("Same triples"):
+            g = ROGraph()
+            _apply_update(g, q)
+
+            self.assertEqual(set(g_expected), set(g))
+
+    def test_empty(self):
+        doc_id = "https://example.com/doc1"
+
+        g = ROGraph(deterministic_uri=True)
+        g.add_cas_content(ExampleCasContent.build(), doc_id=doc_id)
+
+        q, _ = build_update(cas_parser.CasContent.from_list([]), doc_id, UPDATE_ENDPOINT)
+        _apply_update(g, q)
+
+        self.assertEqual(set(), set(g), "The RO's that were ingested before should be removed.")
+
+
+class TestRecordingUpdateStore(unittest.TestCase):
+    def test_remove(self):
+        s, p = URIRef("https://example.com/s"), URIRef("https://example.com/p")
+
+        g = ROGraph()
+        g.add((s, p, Literal("before")))
+
+        store = _RecordingUpdateStore()
+        store.add((s, p, Literal("added")))
+        store.add((s, p, Literal("removed")))
+        store.remove((s, p, Literal("removed")))
+        store.remove((s, p, Literal("before")))
+
+        _apply_update(g, store.get_update())
+
+        self.assertEqual({(s, p, Literal("added"))}, set(g))
+
+    def test_remove_pattern(self):
+        s, p = URIRef("https://example.com/s"), URIRef("https://example.com/p")
+
+        g = ROGraph()
+        g.add((s, p, Literal("before")))
+
+        store = _RecordingUpdateStore()
+        store.add((s, p, Literal("added")))
+        store.remove((s, p, None))
+
+        self.assertNotIn("INSERT DATA", store.get_update(), "Nothing is left to insert.")
+
+        _apply_update(g, store.get_update())
+
+        self.assertEqual(set(), set(g))
+
+    def test_nothing(self):
+        self.assertIsNone(_RecordingUpdateStore().get_update())
+
+
+def _apply_update(g, q):
+    """
+    rdflib can't parse this many updates or triples at once, so they are applied one by one,
+    and the triples of INSERT DATA are parsed as Turtle.
+    """
+    for q_i in q.split("\n;\n"):
+        if q_i.startswith("INSERT DATA"):
+            g.parse(data=q_i[q_i.index("{") + 1:q_i.rindex("}")], format="turtle")
+        else:
+            g.update(q_i)
+
+
+if __name__ == "__main__":
+    unittest.main()